@@ -1,12 +1,25 @@
 import dash
 from dash import dcc, html
 import dash_bootstrap_components as dbc
+from components import datastore, warmup
+from components.api import register_api
 from components.callbacks import register_callbacks
+from components.health import register_health
+from components.serialization import register_compression
 
 # Create the Dash app with multipage support
 app = dash.Dash(__name__, use_pages=True, external_stylesheets=[dbc.themes.BOOTSTRAP])
 server = app.server
 
+# Gzip callback responses (figures are the bulk of the traffic)
+register_compression(server)
+
+# JSON API next to the dashboard (absenteeism figures)
+register_api(server)
+
+# Liveness and readiness probes for the load balancer (/healthz, /readyz)
+register_health(server)
+
 navbar = dbc.Navbar(
     dbc.Container(
         [
@@ -116,6 +129,8 @@ footer = dbc.Container(
 # Define the layout, which includes the page navigation and content
 app.layout = dbc.Container(
     [
+        # Its query string (?state=GOMBE) scopes the callbacks to a state
+        dcc.Location(id="url"),
         navbar,
         # Content of the current page
         dash.page_container,
@@ -127,5 +142,13 @@ app.layout = dbc.Container(
 # Register the callbacks from the separate file
 register_callbacks(app)
 
+# Compute the charts of the popular views ahead of the requests, at start
+# and after every data refresh (components/warmup.py)
+warmup.register(app)
+
 if __name__ == "__main__":
+    # Pick up changes to data/CSVs/ without a restart (gunicorn workers
+    # start theirs in gunicorn.conf.py, after the fork)
+    datastore.start_refresh_scheduler()
+    warmup.start()
     app.run_server(debug=True)
@@ -0,0 +1,492 @@
+"""Benchmark of the dashboard callbacks.
+
+Runs every figure callback with the inputs a page sends on first load and
+prints its latency and the size of the response it produces. With
+--memory it instead forks N workers the way gunicorn does and reports
+their memory with and without preloading the data in the master. With
+--figures it times building each chart through Plotly against filling
+its prebuilt skeleton (see components/figures.py). With --heatmaps it
+times the weekday x hour kernel of components/heatmaps.py against the
+groupby/pivot it replaced, on all the data. With --threads it times the
+multi-figure callbacks building their charts one after another against
+concurrently on the figure pool (see components/parallel.py). With
+--concurrency N it serves every callback from N threads at once, as a
+threaded (gthread) worker does, and checks each result against the
+callback's serial one and that the data snapshot is left unchanged.
+
+    python benchmark.py [--repeat N] [--memory N] [--figures] [--heatmaps]
+                        [--threads] [--concurrency N]
+"""
+
+import argparse
+import base64
+import dataclasses
+import gzip
+import hashlib
+import json
+import os
+import random
+import shutil
+import signal
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import dash
+import numpy as np
+import pandas as pd
+from dash._utils import to_json
+
+# Time the callbacks themselves, in this process, not a background job queue
+os.environ.setdefault("THWP_BACKGROUND_CALLBACKS", "0")
+
+import components.callbacks as callbacks  # noqa: E402
+from components import (  # noqa: E402
+    coalesce,
+    datastore,
+    figures,
+    heatmaps,
+    ingest,
+    parallel,
+    query,
+)
+from components.memory import process_memory  # noqa: E402
+from components.serialization import compact_figure  # noqa: E402
+
+
+def get_callback(app, output_id):
+    """Return the undecorated function of the callback writing to output_id."""
+    for key, entry in app.callback_map.items():
+        # Multi-output keys look like "..a.figure...b.figure.."
+        if output_id in key.strip(".").split("..."):
+            return entry["callback"].__wrapped__
+    raise KeyError(output_id)
+
+
+# Callbacks sending a Patch to charts the page already draws
+DRAWN_CASES = (
+    "gender-pie-chart.figure",
+    "hourly-traffic-heatmap.figure",
+    "visitation-chart.figure",
+)
+
+
+# Callbacks of the HR page charts
+HR_TREEMAP = "percentage-distribution-by-cadre_treemap.figure"
+HR_CASES = (
+    "employee-counts-by-qualification.figure",
+    "employee-distribution-by-age.figure",
+    HR_TREEMAP,
+    "employee-percentage-by-employment-type_sb.figure",
+)
+
+
+def default_cases():
+    """Callbacks to run, keyed by the first output id, with first-load inputs."""
+    snapshot = datastore.current()
+    visits = query.visit_date_bounds(snapshot)
+    timecard = query.timecard_date_bounds(snapshot)
+    # Facilities, dates, then the gender and age group filters: none selected
+    visitation_inputs = (None, str(visits[0].date()), str(visits[1].date()), None, None)
+    # The charts narrowed by a clicked heatmap cell also read it: none
+    crossfiltered_inputs = visitation_inputs + (None,)
+    attendance_inputs = (None, str(timecard[0].date()), str(timecard[1].date()))
+    # The charts a prior period can be laid over read the comparison
+    # toggle: off
+    uncompared = (None,)
+
+    cases = {
+        "gender-pie-chart.figure": crossfiltered_inputs,
+        "hourly-traffic-heatmap.figure": visitation_inputs + uncompared,
+        "visitation-chart.figure": crossfiltered_inputs + uncompared,
+        "facility-map.figure": ("visits",),
+        "employee-counts-by-qualification.figure": (None,),
+        "employee-distribution-by-age.figure": (None,),
+        "percentage-distribution-by-cadre_treemap.figure": (None,),
+        "employee-percentage-by-employment-type_sb.figure": (None,),
+        "time-series.figure": attendance_inputs + uncompared,
+        "punctuality-ranking.figure": attendance_inputs + ("employee", "08:00"),
+        "absence-facilities.figure": attendance_inputs,
+    }
+    # Every callback also reads the page URL's query string: no state given
+    cases = {output_id: inputs + (None,) for output_id, inputs in cases.items()}
+    # The HR charts then read the clicked cadre tile (all but the treemap
+    # it is clicked on) and the extra roster filters: none selected
+    for output_id in HR_CASES:
+        selection = () if output_id == HR_TREEMAP else (None,)
+        cases[output_id] += selection + (None,) * len(callbacks.HR_FILTERS)
+    # The visitation charts also read what the page already draws: nothing
+    for output_id in DRAWN_CASES:
+        cases[output_id] += (None,)
+    return cases
+
+
+def decode_typed_array(value):
+    arr = np.frombuffer(base64.b64decode(value["bdata"]), dtype=value["dtype"])
+    if "shape" in value:
+        arr = arr.reshape([int(n) for n in value["shape"].split(",")])
+    return arr
+
+
+def plain_figure(figure):
+    """Undo the typed array encoding, giving the plain JSON list payload."""
+    layout = figure.get("layout", {})
+    data = []
+    for trace in figure.get("data", []):
+        trace = dict(trace)
+        for key, value in trace.items():
+            if not (isinstance(value, dict) and "bdata" in value):
+                continue
+            arr = decode_typed_array(value)
+            axis = trace.get(key + "axis", key)
+            axis_name = axis[0] + "axis" + axis[1:]
+            if layout.get(axis_name, {}).get("type") == "date":
+                # Dates go back to the ISO strings pandas would have sent
+                arr = np.datetime_as_string(arr.astype("datetime64[ms]"))
+            trace[key] = arr.tolist()
+        data.append(trace)
+    return {**figure, "data": data}
+
+
+def payload_sizes(result):
+    """Bytes on the wire: plain JSON lists, typed arrays, typed arrays + gzip."""
+    figures = list(result) if isinstance(result, (list, tuple)) else [result]
+    compact = to_json(figures).encode()
+    plain = to_json([plain_figure(fig) for fig in figures]).encode()
+    return len(plain), len(compact), len(gzip.compress(compact, compresslevel=6))
+
+
+def run(repeat):
+    app = dash.Dash(__name__)
+    callbacks.register_callbacks(app)
+
+    print(
+        f"{'callback':<50} {'median ms':>10} {'plain KB':>9} "
+        f"{'typed KB':>9} {'gzip KB':>8}"
+    )
+    totals = np.zeros(3)
+    for output_id, inputs in default_cases().items():
+        func = get_callback(app, output_id)
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func(*inputs)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        sizes = np.array(payload_sizes(result)) / 1024
+        totals += sizes
+        print(
+            f"{output_id:<50} {statistics.median(timings):>10.1f} "
+            f"{sizes[0]:>9.1f} {sizes[1]:>9.1f} {sizes[2]:>8.1f}"
+        )
+        if output_id in DRAWN_CASES:
+            # The same filters again, with the charts drawn: only data is sent
+            patched = to_json(func(*inputs[:-1], result[-1])).encode()
+            print(
+                f"{'  once drawn (Patch)':<50} {'':>10} {'':>9} "
+                f"{len(patched) / 1024:>9.1f} "
+                f"{len(gzip.compress(patched, compresslevel=6)) / 1024:>8.1f}"
+            )
+
+    print(
+        f"{'total':<50} {'':>10} {totals[0]:>9.1f} {totals[1]:>9.1f} {totals[2]:>8.1f}"
+    )
+
+
+# Trace properties the callbacks fill into a skeleton
+FIGURE_DATA_KEYS = ("x", "y", "z", "labels", "values", "ids", "parents", "customdata")
+
+
+def median_ms(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def run_figures(repeat):
+    """Per chart: built through Plotly and styled, vs its skeleton filled in.
+
+    Both sides chart the skeleton's placeholder data and end in
+    compact_figure, as a callback response does.
+    """
+    print(f"{'chart':<24} {'plotly ms':>10} {'skeleton ms':>12} {'saved ms':>9}")
+    totals = np.zeros(2)
+    for name, build in figures.SKELETONS.items():
+        traces = [
+            {key: trace[key] for key in FIGURE_DATA_KEYS if key in trace}
+            for trace in figures.skeleton_of(name)["data"]
+        ]
+        timings = np.array(
+            [
+                median_ms(lambda: compact_figure(build()), repeat),
+                median_ms(
+                    lambda: compact_figure(figures.figure(name, *traces)), repeat
+                ),
+            ]
+        )
+        totals += timings
+        print(
+            f"{name:<24} {timings[0]:>10.2f} {timings[1]:>12.3f} "
+            f"{timings[0] - timings[1]:>9.2f}"
+        )
+    print(
+        f"{'total':<24} {totals[0]:>10.2f} {totals[1]:>12.3f} "
+        f"{totals[0] - totals[1]:>9.2f}"
+    )
+
+
+def visit_heatmap_groupby(visits):
+    """The visitation heatmap frame as a two-key groupby and a pivot."""
+    heatmap_data = visits.groupby(["weekday", "hour"])["count"].sum().reset_index()
+    heatmap_data["weekday"] = heatmap_data["weekday"].map(heatmaps.WEEKDAYS.__getitem__)
+    return heatmap_data.pivot(index="weekday", columns="hour", values="count").reindex(
+        heatmaps.WEEKDAYS
+    )
+
+
+def attendance_heatmap_groupby(weekdays, hours, employees):
+    """The attendance heatmap frame as a distinct count per group and a pivot."""
+    heatmap_data = (
+        pd.DataFrame(
+            {
+                "clockin_hour": hours,
+                "weekday": [heatmaps.WEEKDAYS[day] for day in weekdays],
+                "employee_id": employees,
+            }
+        )
+        .groupby(["clockin_hour", "weekday"])["employee_id"]
+        .nunique()
+        .reset_index()
+    )
+    return heatmap_data.pivot(
+        index="clockin_hour", columns="weekday", values="employee_id"
+    ).reindex(columns=heatmaps.WEEKDAYS)
+
+
+def run_heatmaps(repeat):
+    """Both heatmaps over all the data: groupby/pivot vs the bincount kernel."""
+    snapshot = datastore.current()
+    visits = snapshot.visit_counts_df
+    if visits is None:
+        print("The visit counts are held by the SQL engine, unset THWP_QUERY_BACKEND")
+        return
+    clockins = query.clockins_within(snapshot)
+    seconds = clockins.seconds
+    days, employees = np.nonzero(seconds != ingest.ABSENT)
+    weekdays = (clockins.dates[days].astype(np.int64) + 3) % 7
+    hours = seconds[days, employees] // 3600
+
+    cases = {
+        f"visitation ({len(visits)} count rows)": (
+            lambda: visit_heatmap_groupby(visits),
+            lambda: heatmaps.as_frame(
+                heatmaps.weekday_hour(
+                    visits["weekday"], visits["hour"], visits["count"]
+                )
+            ),
+        ),
+        f"attendance ({len(days)} clock-ins)": (
+            lambda: attendance_heatmap_groupby(weekdays, hours, employees),
+            lambda: heatmaps.as_frame(
+                heatmaps.distinct_weekday_hour(
+                    weekdays, hours, employees, seconds.shape[1]
+                )
+            ).T,
+        ),
+    }
+    print(
+        f"{'heatmap':<34} {'groupby ms':>11} {'kernel ms':>10} {'speedup':>8} "
+        f"{'same':>5}"
+    )
+    for name, (groupby, kernel) in cases.items():
+        same = np.array_equal(
+            groupby().to_numpy(dtype=float), kernel().to_numpy(dtype=float), True
+        )
+        timings = [median_ms(groupby, repeat), median_ms(kernel, repeat)]
+        print(
+            f"{name:<34} {timings[0]:>11.2f} {timings[1]:>10.2f} "
+            f"{timings[0] / timings[1]:>7.1f}x {str(same):>5}"
+        )
+
+
+# Callbacks building several figures, keyed by their first output id
+MULTI_FIGURE_CASES = ("gender-pie-chart.figure", "time-series.figure")
+
+
+def run_threads(repeat):
+    """Multi-figure callbacks: charts built in turn vs on the figure pool."""
+    app = dash.Dash(__name__)
+    callbacks.register_callbacks(app)
+    cases = default_cases()
+    threads = max(parallel.FIGURE_THREADS, 2)
+    print(f"figure pool of {threads} threads, {os.cpu_count()} cores")
+    print(f"{'callback':<34} {'serial ms':>10} {'pool ms':>8} {'speedup':>8}")
+    for output_id in MULTI_FIGURE_CASES:
+        func, inputs = get_callback(app, output_id), cases[output_id]
+        timings = []
+        for figure_threads in (1, threads):
+            parallel.FIGURE_THREADS = figure_threads
+            func(*inputs)  # warm up the pool and the per-snapshot caches
+            timings.append(median_ms(lambda: func(*inputs), repeat))
+        print(
+            f"{output_id:<34} {timings[0]:>10.1f} {timings[1]:>8.1f} "
+            f"{timings[0] / timings[1]:>7.2f}x"
+        )
+
+
+def fingerprint(snapshot):
+    """Hash of every frame and array of a snapshot."""
+    digest = hashlib.sha1()
+    for field in dataclasses.fields(snapshot):
+        value = getattr(snapshot, field.name)
+        if isinstance(value, pd.DataFrame):
+            digest.update(repr(list(value.columns)).encode())
+            digest.update(pd.util.hash_pandas_object(value).to_numpy().tobytes())
+        elif isinstance(value, ingest.ClockIns):
+            for array in dataclasses.astuple(value):
+                digest.update(np.asarray(array).astype(str).tobytes())
+    return digest.hexdigest()
+
+
+def run_concurrency(threads, repeat):
+    """Every callback, repeat times each, from many threads at once.
+
+    Request coalescing (see components/coalesce.py) is turned off, so
+    identical calls really run concurrently.
+    """
+    coalesce.COALESCE = False
+    app = dash.Dash(__name__)
+    callbacks.register_callbacks(app)
+    snapshot = datastore.current()
+    before = fingerprint(snapshot)
+    cases = default_cases()
+    funcs = {output_id: get_callback(app, output_id) for output_id in cases}
+
+    def call(output_id):
+        return output_id, to_json(funcs[output_id](*cases[output_id]))
+
+    start = time.perf_counter()
+    expected = dict(call(output_id) for output_id in cases)
+    serial_ms = (time.perf_counter() - start) * 1000
+
+    calls = [output_id for output_id in cases for _ in range(repeat)]
+    random.Random(0).shuffle(calls)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        results = list(pool.map(call, calls))
+    threaded_ms = (time.perf_counter() - start) * 1000
+
+    mismatched = sorted(
+        {output_id for output_id, result in results if result != expected[output_id]}
+    )
+    print(f"{len(cases)} callbacks, once each serially: {serial_ms:.0f} ms")
+    print(
+        f"{len(calls)} calls from {threads} threads: {threaded_ms:.0f} ms, "
+        f"{len(calls) - len(mismatched) * repeat} of {len(calls)} results as serial"
+    )
+    for output_id in mismatched:
+        print(f"  differs: {output_id}")
+    unchanged = fingerprint(datastore.current()) == before
+    print(f"snapshot unchanged: {unchanged}")
+    return not mismatched and unchanged
+
+
+def run_memory_scenario(workers, mode):
+    """Fork workers, let each serve every callback once, return their memory.
+
+    Runs in its own forked "master" so the scenarios do not share state.
+    """
+    app = dash.Dash(__name__)
+    callbacks.register_callbacks(app)
+    if mode == "preload":
+        datastore._swap(datastore.build_snapshot(version=1, finalize=False))
+    elif mode == "preload-typed":
+        datastore.preload()
+    elif mode == "shared":
+        # Workers attach to memory-mapped segments instead of loading
+        shm = "/dev/shm" if os.path.isdir("/dev/shm") else None
+        datastore.SHARED_DATA_DIR = tempfile.mkdtemp(prefix="thwp-bench-", dir=shm)
+
+    ready_r, ready_w = os.pipe()
+    pids = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                for output_id, inputs in default_cases().items():
+                    get_callback(app, output_id)(*inputs)
+                os.write(ready_w, b".")
+                signal.pause()
+            finally:
+                os._exit(0)
+        pids.append(pid)
+
+    for _ in pids:
+        os.read(ready_r, 1)
+    memory = [process_memory(pid) for pid in pids]
+    for pid in pids:
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
+    if mode == "shared":
+        shutil.rmtree(datastore.SHARED_DATA_DIR, ignore_errors=True)
+    return memory
+
+
+def run_memory(workers):
+    scenarios = [
+        ("each worker loads its own data", "load"),
+        ("preload, data as loaded", "preload"),
+        ("preload, typed columns + gc.freeze", "preload-typed"),
+        ("workers attach shared data segments", "shared"),
+    ]
+    print(f"{workers} workers, MB per worker (mean)")
+    print(f"{'scenario':<40} {'rss':>8} {'pss':>8} {'uss':>8} {'total pss':>10}")
+    for name, mode in scenarios:
+        result_r, result_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                memory = run_memory_scenario(workers, mode)
+                os.write(result_w, json.dumps(memory).encode())
+            finally:
+                os._exit(0)
+        os.close(result_w)
+        with os.fdopen(result_r) as result:
+            memory = json.loads(result.read())
+        os.waitpid(pid, 0)
+
+        mean = {
+            key: statistics.mean(m[key] for m in memory) / 2**20
+            for key in ("rss", "pss", "uss")
+        }
+        print(
+            f"{name:<40} {mean['rss']:>8.1f} {mean['pss']:>8.1f} "
+            f"{mean['uss']:>8.1f} {mean['pss'] * workers:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--memory", type=int, metavar="WORKERS")
+    parser.add_argument("--figures", action="store_true")
+    parser.add_argument("--heatmaps", action="store_true")
+    parser.add_argument("--threads", action="store_true")
+    parser.add_argument("--concurrency", type=int, metavar="THREADS")
+    args = parser.parse_args()
+    if args.memory:
+        run_memory(args.memory)
+    elif args.figures:
+        run_figures(args.repeat)
+    elif args.heatmaps:
+        run_heatmaps(args.repeat)
+    elif args.threads:
+        run_threads(args.repeat)
+    elif args.concurrency:
+        raise SystemExit(0 if run_concurrency(args.concurrency, args.repeat) else 1)
+    else:
+        run(args.repeat)
@@ -0,0 +1,179 @@
+"""Absenteeism: the expected roster against actual clock-ins.
+
+Every employee on the HR roster is expected at work on every working day
+from their date of appointment. ``presence()`` lays this out as dense
+employee x working-day boolean matrices, and absence rates, absence
+streaks and facility coverage gaps are row and column reductions over
+them.
+"""
+
+import os
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+# Weekdays expected at work, Monday = 0
+WORKING_WEEKDAYS = tuple(
+    int(day) for day in os.environ.get("THWP_WORKING_WEEKDAYS", "0,1,2,3,4").split(",")
+)
+
+# A facility day is a coverage gap when fewer than this share of the
+# staff rostered there clocked in
+COVERAGE_THRESHOLD = float(os.environ.get("THWP_COVERAGE_THRESHOLD", "0.5"))
+
+
+@dataclass(frozen=True)
+class Presence:
+    """Roster employees (rows) on the working days (columns)."""
+
+    dates: np.ndarray
+    employee_ids: np.ndarray
+    facilities: np.ndarray
+    # Rostered that day: appointed on or before it
+    expected: np.ndarray
+    present: np.ndarray
+
+    @property
+    def absent(self):
+        return self.expected & ~self.present
+
+    @property
+    def enrolled(self):
+        """Employees with at least one clock-in in the period."""
+        return self.present.any(axis=1)
+
+
+def roster(merged_hr_data):
+    """One row per PSN number with its facility and date of appointment."""
+    roster_df = merged_hr_data.dropna(subset=["psn_number"]).drop_duplicates(
+        "psn_number"
+    )
+    return pd.DataFrame(
+        {
+            "psn_number": roster_df["psn_number"].to_numpy(),
+            "facility": roster_df["facility_stationed"].fillna("Unknown").to_numpy(),
+            "appointed": pd.to_datetime(
+                roster_df["date_of_appointment"], errors="coerce"
+            ).to_numpy(),
+        }
+    )
+
+
+def presence(dates, employee_ids, present, roster_df, weekdays=WORKING_WEEKDAYS):
+    """Presence matrices of the roster from a days x employees clock-in matrix.
+
+    A working day is a day of ``weekdays`` on which anyone clocked in at
+    all; days without a single clock-in (holidays, gaps in the timecard
+    feed) are not counted against anyone.
+    """
+    # Monday is 0: 1970-01-01 was a Thursday
+    weekday = (dates.astype("datetime64[D]").astype(np.int64) + 3) % 7
+    working = np.isin(weekday, weekdays) & present.any(axis=1)
+
+    # Roster employees never seen in the timecard get an all-absent column
+    columns = pd.Index(employee_ids).get_indexer(roster_df["psn_number"])
+    padded = np.concatenate([present[working], np.zeros((working.sum(), 1), bool)], 1)
+    days = dates[working].astype("datetime64[D]")
+
+    appointed = roster_df["appointed"].to_numpy().astype("datetime64[D]")
+    expected = np.isnat(appointed)[:, None] | (appointed[:, None] <= days[None, :])
+    return Presence(
+        dates=days,
+        employee_ids=roster_df["psn_number"].to_numpy(),
+        facilities=roster_df["facility"].to_numpy(),
+        expected=expected,
+        present=padded[:, columns].T & expected,
+    )
+
+
+def streaks(absent):
+    """Longest and current (trailing) run of absent days of every row."""
+    if absent.shape[1] == 0:
+        empty = np.zeros(len(absent), dtype=np.int64)
+        return empty, empty
+    runs = np.cumsum(absent, axis=1)
+    # Subtract the count reached at each row's last non-absent day
+    resets = np.maximum.accumulate(np.where(absent, 0, runs), axis=1)
+    lengths = runs - resets
+    return lengths.max(axis=1), lengths[:, -1]
+
+
+def employee_absence(p):
+    """Expected, present and absent days, absence rate and streaks."""
+    expected = p.expected.sum(axis=1)
+    absent = p.absent.sum(axis=1)
+    longest, current = streaks(p.absent)
+    employees = pd.DataFrame(
+        {
+            "employee_id": p.employee_ids,
+            "facility": p.facilities,
+            "enrolled": p.enrolled,
+            "expected_days": expected,
+            "present_days": p.present.sum(axis=1),
+            "absent_days": absent,
+            "absence_rate": np.divide(
+                absent, expected, out=np.full(len(absent), np.nan), where=expected > 0
+            ),
+            "longest_streak": longest,
+            "current_streak": current,
+        }
+    )
+    return employees[employees["expected_days"] > 0].reset_index(drop=True)
+
+
+def _facility_sums(p, matrix):
+    codes, facilities = pd.factorize(p.facilities)
+    # Rows grouped by facility, then summed per group: facilities x days
+    order = np.argsort(codes, kind="stable")
+    starts = np.searchsorted(codes[order], np.arange(len(facilities)))
+    sums = np.add.reduceat(matrix[order].astype(np.int64), starts, axis=0)
+    return facilities, sums
+
+
+def facility_days(p):
+    """Rostered and present staff of every facility on every working day."""
+    facilities, rostered = _facility_sums(p, p.expected)
+    _, present = _facility_sums(p, p.present)
+    coverage = np.divide(
+        present, rostered, out=np.full(rostered.shape, np.nan), where=rostered > 0
+    )
+    return pd.DataFrame(
+        {
+            "facility": np.repeat(np.asarray(facilities), len(p.dates)),
+            "date": np.tile(p.dates, len(facilities)).astype("datetime64[ns]"),
+            "rostered": rostered.ravel(),
+            "present": present.ravel(),
+            "coverage": coverage.ravel(),
+        }
+    )
+
+
+def facility_coverage(p, threshold=COVERAGE_THRESHOLD):
+    """Per facility: staff, absence rate and the working days left uncovered."""
+    facilities, rostered = _facility_sums(p, p.expected)
+    _, present = _facility_sums(p, p.present)
+    _, enrolled = _facility_sums(p, p.enrolled[:, None])
+    staffed = rostered > 0
+    rostered_days = rostered.sum(axis=1)
+    return (
+        pd.DataFrame(
+            {
+                "facility": np.asarray(facilities),
+                "staff": np.bincount(pd.factorize(p.facilities)[0]),
+                "enrolled": enrolled[:, 0],
+                "absence_rate": 1
+                - np.divide(
+                    present.sum(axis=1),
+                    rostered_days,
+                    out=np.full(len(facilities), np.nan),
+                    where=rostered_days > 0,
+                ),
+                "gap_days": (staffed & (present < threshold * rostered)).sum(axis=1),
+                "unstaffed_days": (staffed & (present == 0)).sum(axis=1),
+                "working_days": staffed.sum(axis=1),
+            }
+        )
+        .sort_values("absence_rate", ascending=False, kind="stable")
+        .reset_index(drop=True)
+    )
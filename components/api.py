@@ -0,0 +1,89 @@
+import pandas as pd
+from flask import Response, abort, request
+
+from components import absenteeism, datastore, query, shards
+
+# /api/absenteeism/<level>: frame builder from an absenteeism.Presence
+ABSENTEEISM_LEVELS = {
+    "employees": absenteeism.employee_absence,
+    "facilities": absenteeism.facility_coverage,
+    "days": absenteeism.facility_days,
+}
+
+
+def _records(df):
+    return Response(
+        df.to_json(orient="records", date_format="iso"),
+        mimetype="application/json",
+    )
+
+
+def _date(args, name):
+    """A date query parameter, None if absent; 400 if it is not a date."""
+    if name not in args:
+        return None
+    date = pd.to_datetime(args[name], errors="coerce")
+    if pd.isna(date):
+        abort(400, f"{name} is not a date: {args[name]!r}")
+    return date
+
+
+def _count(args, name):
+    """A non-negative integer query parameter, None if absent; 400 if it is
+    anything else."""
+    if name not in args:
+        return None
+    value = args.get(name, type=int)
+    if value is None or value < 0:
+        abort(400, f"{name} is not a count: {args[name]!r}")
+    return value
+
+
+def register_api(server):
+    """JSON endpoints for figures the dashboard only draws.
+
+    GET /api/absenteeism/<employees|facilities|days>, filtered by the query
+    parameters state, year, start_date, end_date (as on the attendance
+    page), facility, enrolled (employees: 1 for staff who clock in at all)
+    and limit.
+
+    GET /api/payroll: staff paid and the sum of every pay column per year
+    and month, for the query parameters year and month (see
+    query.payroll_totals; with partitioning on, only the matching
+    partitions are read).
+
+    A year, month, date or limit that does not parse is a 400.
+    """
+
+    @server.route("/api/absenteeism/<level>")
+    def absenteeism_api(level):
+        if level not in ABSENTEEISM_LEVELS:
+            abort(404)
+        args = request.args
+        # Checked before any data is read
+        year, limit = _count(args, "year"), _count(args, "limit")
+        start_date, end_date = _date(args, "start_date"), _date(args, "end_date")
+        presence = query.presence(
+            datastore.current(shards.state_name(args.get("state"))),
+            year,
+            start_date,
+            end_date,
+        )
+        df = ABSENTEEISM_LEVELS[level](presence)
+
+        if "facility" in args:
+            df = df[df["facility"].isin(args.getlist("facility"))]
+        if "enrolled" in args and "enrolled" in df:
+            df = df[df["enrolled"] == (args["enrolled"].lower() in ("1", "true"))]
+        if limit is not None:
+            df = df.head(limit)
+        return _records(df)
+
+    @server.route("/api/payroll")
+    def payroll_api():
+        args = request.args
+        return _records(
+            query.payroll_totals(_count(args, "year"), _count(args, "month"))
+        )
+
+    return absenteeism_api, payroll_api
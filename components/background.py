@@ -0,0 +1,78 @@
+"""Background (job queue) execution for the heavy callbacks.
+
+A wide date range with no facility filter keeps a callback busy for
+seconds. Registered through ``background_callback`` such callbacks run as
+Dash background callbacks: the request returns at once, the work runs in
+a separate process managed by a diskcache-backed job queue, and the page
+polls for progress and the result. A new request for the same callback
+(the user changed the filters again) terminates the job still running.
+
+Without diskcache installed, or with THWP_BACKGROUND_CALLBACKS=0, the
+callbacks run inline in the request as before.
+"""
+
+import functools
+import os
+import tempfile
+
+BACKGROUND_CALLBACKS = os.environ.get("THWP_BACKGROUND_CALLBACKS", "1") != "0"
+
+BACKGROUND_CACHE_DIR = os.environ.get(
+    "THWP_BACKGROUND_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), "thwp-background"),
+)
+
+# Seconds a finished job's result is kept for the polling page to collect
+RESULT_EXPIRY = 600
+
+_manager = None
+
+
+def background_manager():
+    """The shared job queue, or None when callbacks should run inline."""
+    global _manager
+    if not BACKGROUND_CALLBACKS:
+        return None
+    if _manager is None:
+        try:
+            import diskcache
+            from dash import DiskcacheManager
+        except ImportError:
+            return None
+        _manager = DiskcacheManager(
+            diskcache.Cache(BACKGROUND_CACHE_DIR), expire=RESULT_EXPIRY
+        )
+    return _manager
+
+
+def _no_progress(*args):
+    pass
+
+
+def background_callback(app, output, inputs, progress=None, running=None):
+    """``app.callback`` that runs the callback as a background job if it can.
+
+    The decorated function takes ``set_progress`` as its first argument; it
+    receives a no-op when the callback runs inline.
+    """
+
+    def decorator(func):
+        manager = background_manager()
+        if manager is None:
+
+            @functools.wraps(func)
+            def run_inline(*args):
+                return func(_no_progress, *args)
+
+            return app.callback(output, inputs)(run_inline)
+
+        return app.callback(
+            output,
+            inputs,
+            background=True,
+            manager=manager,
+            progress=progress,
+            running=running,
+        )(func)
+
+    return decorator
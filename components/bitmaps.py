@@ -0,0 +1,144 @@
+"""Bitmap indexes over the categorical columns of the HR roster and visits.
+
+Every distinct value of an indexed column has a bitmap of the rows holding
+it, packed eight rows to a byte (np.packbits). A filter such as "cadre is
+A or B, and gender is Female" is the OR of the selected values' bitmaps
+within each column and the AND across columns, byte by byte, and only the
+final selection is unpacked into a row mask. The indexes are built once
+per data snapshot (and state shard), so adding a filter adds a few
+byte-wise ORs and ANDs to a callback instead of another isin() over the
+frame.
+"""
+
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+# The value missing cells are indexed (and offered in the dropdowns) under
+MISSING = "Unknown"
+
+# Indexed columns of merged_hr_data and of the visit counts; weekday and
+# hour select a visitation heatmap cell (see crossfilter.py)
+HR_COLUMNS = (
+    "facility_stationed",
+    "gender",
+    "cadre",
+    "employment_type",
+    "qualification",
+    "age_group",
+)
+VISIT_COLUMNS = (
+    "facility_name",
+    "gender",
+    "marital_status",
+    "age_group",
+    "weekday",
+    "hour",
+)
+
+
+@dataclass(frozen=True)
+class BitmapIndex:
+    """Packed row bitmaps of every value of the indexed columns."""
+
+    rows: int
+    bitmaps: dict
+
+    def values(self, column):
+        """Distinct values of a column, sorted, missing last."""
+        values = sorted(value for value in self.bitmaps[column] if value != MISSING)
+        return values + [MISSING] * (MISSING in self.bitmaps[column])
+
+    def everything(self):
+        return np.packbits(np.ones(self.rows, dtype=bool))
+
+    def select(self, filters):
+        """Packed bitmap of the rows matching the filters.
+
+        ``filters`` maps columns to their selected values: a row matches a
+        column holding any of them, and matches the filters matching every
+        column. Columns without selected values do not filter. A list of
+        such mappings matches the rows matching any of them.
+        """
+        if isinstance(filters, (list, tuple)):
+            selection = np.zeros_like(self.everything())
+            for clause in filters:
+                selection |= self.select(clause)
+            return selection
+        selection = self.everything()
+        for column, values in filters.items():
+            if not values:
+                continue
+            if isinstance(values, str):
+                values = [values]
+            bitmaps = self.bitmaps[column]
+            matching = np.zeros_like(selection)
+            for value in values:
+                bitmap = bitmaps.get(value)
+                if bitmap is not None:
+                    matching |= bitmap
+            selection &= matching
+        return selection
+
+    def mask(self, filters):
+        """Boolean row mask of the rows matching the filters (see select)."""
+        return np.unpackbits(self.select(filters), count=self.rows).view(bool)
+
+    def count(self, filters):
+        """Number of rows matching the filters, counted on the packed bits."""
+        return int(np.bitwise_count(self.select(filters)).sum())
+
+
+def build_index(df, columns):
+    """BitmapIndex of the given columns of a frame."""
+    bitmaps = {}
+    for column in columns:
+        codes, values = pd.factorize(df[column].fillna(MISSING))
+        bitmaps[column] = {
+            value: np.packbits(codes == code) for code, value in enumerate(values)
+        }
+        for bitmap in bitmaps[column].values():
+            # Shared by every request thread: selections OR and AND into
+            # arrays of their own
+            bitmap.flags.writeable = False
+    return BitmapIndex(len(df), bitmaps)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def _cached(name, snapshot, frame, columns):
+    """build_index of a snapshot frame, built once per snapshot and state."""
+    slot, key = (name, snapshot.state), (snapshot.version, snapshot.built_at)
+    cached_key, index = _indexes.get(slot, (None, None))
+    if cached_key != key:
+        with _indexes_lock:
+            cached_key, index = _indexes.get(slot, (None, None))
+            if cached_key != key:
+                index = build_index(frame, columns)
+                # One tuple, so readers never pair a key with another index
+                _indexes[slot] = (key, index)
+    return index
+
+
+def built(snapshot):
+    """Names of the indexes already built for a snapshot."""
+    key = (snapshot.version, snapshot.built_at)
+    return sorted(
+        name
+        for (name, state), (cached_key, _) in list(_indexes.items())
+        if state == snapshot.state and cached_key == key
+    )
+
+
+def hr_index(snapshot):
+    """BitmapIndex of the snapshot's merged_hr_data rows."""
+    return _cached("hr", snapshot, snapshot.merged_hr_data, HR_COLUMNS)
+
+
+def visit_index(snapshot):
+    """BitmapIndex of the snapshot's visit counts rows (pandas backend only)."""
+    return _cached("visits", snapshot, snapshot.visit_counts_df, VISIT_COLUMNS)
@@ -1,78 +1,27 @@
-from dash import Input, Output, dcc
+from dash import Input, Output, State, ctx, dcc
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import numpy as np
 
-
-# Load CSV files into DataFrames
-patients_df = pd.read_csv("data/CSVs/cleaned_patients_data.csv")
-facilities_df = pd.read_csv("data/CSVs/facilities.csv")
-wards_df = pd.read_csv("data/CSVs/wards.csv")
-lgas_df = pd.read_csv("data/CSVs/lgas.csv")
-states_df = pd.read_csv("data/CSVs/states.csv")
-visitation_df = pd.read_csv("data/CSVs/cleaned_visitations_data.csv")
-
-# Merge datasets
-patients_visitation_df = pd.merge(
-    patients_df,
-    visitation_df.drop(columns=["patient_project_number", "facility_name"]),
-    on="patient_id",
-    how="inner",
-)
-
-# Convert date column
-patients_visitation_df["start_date"] = pd.to_datetime(
-    patients_visitation_df["start_date"]
-)
-
-# Extract date parts
-patients_visitation_df["week_number"] = (
-    patients_visitation_df["start_date"].dt.isocalendar().week
-)
-
-# Ensure all values are strings and strip any whitespace
-patients_visitation_df["time_in"] = (
-    patients_visitation_df["time_in"].astype(str).str.strip()
+from components import (
+    absenteeism,
+    bitmaps,
+    coalesce,
+    crossfilter,
+    datastore,
+    facility_map,
+    figures,
+    heatmaps,
+    kpis,
+    parallel,
+    periods,
+    punctuality,
+    query,
+    shards,
 )
-
-
-# Handle inconsistent time formats
-def parse_time(time_str):
-    try:
-        return pd.to_datetime(time_str, format="%H:%M").hour  # Standard case: HH:MM
-    except ValueError:
-        try:
-            return pd.to_datetime(
-                time_str, format="%H:%M:%S"
-            ).hour  # If seconds are present
-        except ValueError:
-            return np.nan  # If neither works, return NaN
-
-
-# Apply function to extract hours
-patients_visitation_df["hour"] = patients_visitation_df["time_in"].apply(parse_time)
-
-# Drop NaN rows if necessary
-patients_visitation_df.dropna(subset=["hour"], inplace=True)
-
-
-patients_visitation_df["day_of_week"] = pd.to_datetime(
-    patients_visitation_df["start_date"]
-).dt.day_name()
-
-
-##### HR Data -------------------------------------------------------------
-hr_personal_df = pd.read_csv("data/CSVs/cleaned_hrh_personal_data.csv")
-employment_df = pd.read_csv("data/CSVs/cleaned_hrh_employment_data.csv")
-
-
-def merge_hr_data(hr_personal_df, employment_df):
-    filtered_df = pd.merge(hr_personal_df, employment_df, on="email", how="inner")
-    return filtered_df
-
-
-merged_hr_data = merge_hr_data(hr_personal_df, employment_df)
+from components.background import background_callback
+from components.serialization import compact_figure
 
 
 # state=None, lga=None, ward=None,
@@ -213,7 +162,9 @@ def prepare_cadre_treemap_data(filtered_df, facility=None):
     # Recalculate the % Distribution after grouping to avoid mean aggregation issues
     top_10_cadres_df["% Distribution"] = (
         (top_10_cadres_df["Total No. of Health Workers"] / total_health_workers) * 100
-    ).round(2)  # Ensure the result is rounded to two decimal places
+    ).round(
+        2
+    )  # Ensure the result is rounded to two decimal places
 
     # Sort by 'Total No. of Health Workers' and take the top 10 cadres
     top_10_cadres_df = top_10_cadres_df.sort_values(
@@ -223,18 +174,31 @@ def prepare_cadre_treemap_data(filtered_df, facility=None):
     return top_10_cadres_df
 
 
-# Load the CSV file
-df = pd.read_csv("data/CSVs/cleaned_hrh_timecard_data.csv")
+# Extra HR page filters: merged_hr_data column and the dropdown selecting it
+HR_FILTERS = {
+    "gender": "hr-gender-filter",
+    "cadre": "hr-cadre-filter",
+    "employment_type": "hr-employment-type-filter",
+    "qualification": "hr-qualification-filter",
+    "age_group": "hr-age-group-filter",
+}
+HR_FILTER_INPUTS = [Input(dropdown, "value") for dropdown in HR_FILTERS.values()]
 
-# Ensure date and time columns are in the correct format
-df["date"] = pd.to_datetime(df["date"])
-df["clockin_time"] = pd.to_datetime(df["clockin_time"], format="%H:%M:%S").dt.time
 
-# Extract hour from clockin_time
-df["clockin_hour"] = pd.to_datetime(df["clockin_time"], format="%H:%M:%S").dt.hour
+def selected_hr_data(search, facility, filters, selection=None):
+    """HR roster rows of the selected facilities and extra filter values.
 
-# Extract day of the week from the date
-df["weekday"] = df["date"].dt.day_name()
+    ``filters`` are the values of the HR_FILTERS dropdowns, in order, and
+    ``selection`` a clicked treemap tile's (see crossfilter.py); they are
+    resolved on the snapshot's bitmap index (see bitmaps.py).
+    """
+    snapshot = datastore.current(shards.state_of(search))
+    selection = {
+        "facility_stationed": facility,
+        **dict(zip(HR_FILTERS, filters)),
+        **(crossfilter.treemap_selection(selection) or {}),
+    }
+    return snapshot.merged_hr_data[bitmaps.hr_index(snapshot).mask(selection)]
 
 
 # Custom color scale
@@ -250,306 +214,426 @@ custom_colorscale = [
 def register_visitation_page_callbacks(app):
     """Registers dropdown callbacks and charts update callback"""
 
-    @app.callback(
+    @background_callback(
+        app,
         [
             # Output("heatmap-chart", "figure"),
             Output("gender-pie-chart", "figure"),
             Output("marital-status-bar-chart", "figure"),
             Output("visitation-by-age-group-bar-chart", "figure"),
+            Output("vs-charts-drawn", "data"),
         ],
         [
             Input("vs-facility-filter", "value"),
             Input("date-picker", "start_date"),
             Input("date-picker", "end_date"),
+            Input("vs-gender-filter", "value"),
+            Input("vs-age-group-filter", "value"),
+            Input("vs-crossfilter", "data"),
+            State("url", "search"),
+            State("vs-charts-drawn", "data"),
+        ],
+        progress=[Output("vs-progress", "value")],
+        running=[
+            (Output("vs-progress", "style"), {"height": "4px"}, {"display": "none"})
         ],
     )
-    def update_charts(selected_facilities, start_date, end_date):
+    @coalesce.single_flight
+    def update_charts(
+        set_progress,
+        selected_facilities,
+        start_date,
+        end_date,
+        genders,
+        age_groups,
+        selection,
+        search,
+        drawn,
+    ):
         """Updates all charts based on selected filters."""
-
-        # Convert dates
-        start_date = pd.to_datetime(start_date)
-        end_date = pd.to_datetime(end_date)
-
-        # Filter data
-        filtered_df = patients_visitation_df[
-            (patients_visitation_df["start_date"] >= start_date)
-            & (patients_visitation_df["start_date"] <= end_date)
-        ]
-
-        # Apply facility filter
-        if selected_facilities:
-            filtered_df = filtered_df[
-                filtered_df["facility_name"].isin(selected_facilities)
-            ]
-
-        # print("Filtered DataFrame Shape:", filtered_df.shape)  # Debugging Output
-
-        # **Handle empty dataset**
-        if filtered_df.empty:
-            empty_fig = px.scatter(title="No Data Available")
-            return empty_fig, empty_fig, empty_fig, empty_fig, empty_fig
-
-        # **2️⃣ Gender Pie Chart**
-        gender_fig = px.pie(
-            filtered_df,
-            names="gender",
-            hole=0.4,
-            color_discrete_sequence=[
-                "#062d14",
-                "#18a145",
-            ],  # Custom colors
-        )
-
-        # Remove background and legend
-        gender_fig.update_layout(
-            plot_bgcolor="rgba(0,0,0,0)",
-            paper_bgcolor="rgba(0,0,0,0)",
-            showlegend=True,
-            legend_title_text="Gender",  # Custom legend title
-            title={
-                "text": "<b><u>Patients by Gender</u></b>",
-                "font": {"color": "#1E1E1E"},
-            },
-        )
-
-        # Customize hover template
-        gender_fig.update_traces(hovertemplate="%{label}: %{percent}")
-
-        # **3️⃣ Marital Status Bar Chart (Fixed)**
-        if "marital_status" in filtered_df.columns:
-            marital_status_counts = (
-                filtered_df["marital_status"]
-                .fillna("Unknown")
-                .value_counts()
-                .reset_index()
+        snapshot = datastore.current(shards.state_of(search))
+        # A clicked heatmap cell (see crossfilter.py) narrows the charts too
+        attributes = {
+            "gender": genders,
+            "age_group": age_groups,
+            **(crossfilter.heatmap_selection(selection) or {}),
+        }
+        filters = (selected_facilities, start_date, end_date, attributes)
+        # Charts the page already draws only receive their new data
+        drawn = dict(drawn or {})
+
+        # The three charts are independent: built concurrently, each in a
+        # thread of the figure pool (see parallel.py)
+        def marital_chart():
+            # Visits per marital status, missing included, so the total is
+            # the number of visits matching the filters
+            marital_status_counts = query.visit_counts(
+                snapshot, "marital_status", *filters
             )
-            marital_status_counts.columns = ["marital_status", "count"]
-
-            marital_fig = px.bar(
-                marital_status_counts,
-                x="marital_status",
-                y="count",
-                labels={"marital_status": "Marital Status", "count": "Count"},
-                color="marital_status",
-                color_discrete_sequence=[
-                    "#062d14",
-                    "#ddfbe6",
-                ],
+            visits = marital_status_counts.sum()
+
+            # **3️⃣ Marital Status Bar Chart (Fixed)**
+            if not marital_status_counts.empty:
+                marital_status_counts = (
+                    marital_status_counts.groupby(
+                        marital_status_counts.index.fillna("Unknown")
+                    )
+                    .sum()
+                    .sort_values(ascending=False)
+                )
+                marital_skeleton = "marital-bar"
+                marital_fig = figures.category_bars(
+                    marital_skeleton,
+                    marital_status_counts.index,
+                    marital_status_counts.to_numpy(),
+                    ["#062d14", "#ddfbe6"],
+                    # Bars in the order of the counts, as px orders a
+                    # color=x bar
+                    xaxis={"categoryarray": list(marital_status_counts.index)},
+                )
+            else:
+                marital_fig = px.bar(title="Marital Status Data Not Available")
+                marital_skeleton = None
+            return visits, marital_skeleton, compact_figure(marital_fig)
+
+        def gender_chart():
+            # **2️⃣ Gender Pie Chart**
+            # Send one slice per gender instead of one label per visit
+            gender_counts = query.visit_counts(snapshot, "gender", *filters)
+            gender_counts = gender_counts[gender_counts.index.notna()].sort_index()
+            gender_fig = figures.figure(
+                "gender-pie",
+                {"labels": gender_counts.index, "values": gender_counts},
             )
-
-            marital_fig.update_layout(
-                plot_bgcolor="rgba(0,0,0,0)",
-                paper_bgcolor="rgba(0,0,0,0)",
-                showlegend=False,
-                legend_title_text="Marital Status",  # Custom legend title
-                title={
-                    "text": "<b><u>Patients by Marital Status</u></b>",
-                    "font": {"color": "#1E1E1E"},
-                },
+            return compact_figure(gender_fig)
+
+        def age_chart():
+            # **4️⃣ Visitation Count by Age Group**
+            # Age group counts in the correct order, missing groups set to
+            # zero
+            age_group_counts = query.visit_counts(snapshot, "age_group", *filters)
+            visitation_age_fig = figures.category_bars(
+                "visit-age-bar",
+                figures.VISIT_AGE_GROUPS,
+                [age_group_counts.get(age, 0) for age in figures.VISIT_AGE_GROUPS],
+                figures.VISIT_AGE_COLORS,
             )
+            return compact_figure(visitation_age_fig)
+
+        (visits, marital_skeleton, marital_fig), gender_fig, visitation_age_fig = (
+            parallel.run(
+                marital_chart,
+                gender_chart,
+                age_chart,
+                done=lambda charts: set_progress((charts,)),
+            )
+        )
 
-            marital_fig.update_traces(
-                hovertemplate="Marital Status: %{x} <br>Count: %{y}"
+        # **Handle empty dataset**
+        if visits == 0:
+            empty_fig = compact_figure(px.scatter(title="No Data Available"))
+            return (
+                *(
+                    figures.client_update(drawn, graph, None, empty_fig)
+                    for graph in (
+                        "gender-pie-chart",
+                        "marital-status-bar-chart",
+                        "visitation-by-age-group-bar-chart",
+                    )
+                ),
+                drawn,
             )
-        else:
-            marital_fig = px.bar(title="Marital Status Data Not Available")
-
-        # **4️⃣ Visitation Count by Age Group**
-        # Define the correct order of age groups
-        desired_order = [
-            "0-4",
-            "5-9",
-            "10-19",
-            "20-29",
-            "30-39",
-            "40-49",
-            "50-59",
-            "60+",
-        ]
 
-        # Create a dictionary of age group counts with missing groups set to zero
-        age_group_counts = filtered_df["age_group"].value_counts().to_dict()
-        age_group_counts = {age: age_group_counts.get(age, 0) for age in desired_order}
-
-        # Create the bar chart
-        visitation_age_fig = px.bar(
-            x=list(age_group_counts.keys()),  # Ensure correct order
-            y=list(age_group_counts.values()),
-            color=list(age_group_counts.keys()),
-            color_discrete_map={
-                "0-4": "#062d14",
-                "5-9": "#15522a",
-                "10-19": "#165e2e",
-                "20-29": "#177e38",
-                "30-39": "#18a145",
-                "40-49": "#25c258",
-                "50-59": "#4cdc7a",
-                "60+": "#88eda7",
-            },
-            labels={"x": "Age Group", "y": "Visit Count"},
+        return (
+            figures.client_update(drawn, "gender-pie-chart", "gender-pie", gender_fig),
+            figures.client_update(
+                drawn, "marital-status-bar-chart", marital_skeleton, marital_fig
+            ),
+            figures.client_update(
+                drawn,
+                "visitation-by-age-group-bar-chart",
+                "visit-age-bar",
+                visitation_age_fig,
+            ),
+            drawn,
         )
 
-        # Apply custom hover template and clean up layout
-        visitation_age_fig.update_traces(
-            hovertemplate="<b>Age Group:</b> %{x}<br><b>Visits:</b> %{y}<extra></extra>"
+    # **5️⃣ heatmap showing visitation count by hour of the day and day of the week.
+    @background_callback(
+        app,
+        [
+            Output("hourly-traffic-heatmap", "figure"),
+            Output("hourly-traffic-heatmap-drawn", "data"),
+        ],
+        [
+            Input("vs-facility-filter", "value"),
+            Input("date-picker", "start_date"),
+            Input("date-picker", "end_date"),
+            Input("vs-gender-filter", "value"),
+            Input("vs-age-group-filter", "value"),
+            Input("vs-compare", "value"),
+            State("url", "search"),
+            State("hourly-traffic-heatmap-drawn", "data"),
+        ],
+    )
+    @coalesce.single_flight
+    def update_hourly_heatmap(
+        set_progress,
+        selected_facilities,
+        start_date,
+        end_date,
+        genders,
+        age_groups,
+        compare,
+        search,
+        drawn,
+    ):
+        """Updates the heatmap showing visitation count by hour of the day and day of the week."""
+        # Visit counts by weekday and hour, with the prior period's when
+        # comparing (one 2 x 7 x 24 array from the same query)
+        _, prior = periods.ranges(start_date, end_date, mode=compare)
+        matrix = query.visits_by_weekday_hour(
+            datastore.current(shards.state_of(search)),
+            selected_facilities,
+            start_date,
+            end_date,
+            {"gender": genders, "age_group": age_groups},
+            prior,
         )
-        visitation_age_fig.update_layout(
-            showlegend=False,  # Remove legend
-            plot_bgcolor="rgba(0,0,0,0)",  # Transparent plot background
-            paper_bgcolor="rgba(0,0,0,0)",  # Transparent figure background
-            title={
-                "text": "<b><u>Visitation by Age Group</u></b>",
-                "font": {"color": "#1E1E1E"},
+
+        # Fill the heatmap skeleton (hours as columns, weekdays as rows), or
+        # the change from the prior period
+        if prior is None:
+            name, pivot_df = "visit-heatmap", heatmaps.as_frame(matrix)
+            trace = {}
+        else:
+            pivot_df, customdata = heatmaps.delta_frame(*matrix)
+            name, trace = "visit-heatmap-delta", {"customdata": customdata}
+        fig = figures.figure(
+            name,
+            {
+                "z": pivot_df.values,
+                "x": pivot_df.columns,
+                "y": pivot_df.index,
+                **trace,
             },
         )
 
-        return gender_fig, marital_fig, visitation_age_fig
+        drawn = dict(drawn or {})
+        update = figures.client_update(
+            drawn, "hourly-traffic-heatmap", name, compact_figure(fig)
+        )
+        return update, drawn
 
-    # **5️⃣ heatmap showing visitation count by hour of the day and day of the week.
     @app.callback(
-        Output("hourly-traffic-heatmap", "figure"),
+        [
+            Output("visitation-chart", "figure"),
+            Output("visitation-chart-drawn", "data"),
+        ],
         [
             Input("vs-facility-filter", "value"),
             Input("date-picker", "start_date"),
             Input("date-picker", "end_date"),
+            Input("vs-gender-filter", "value"),
+            Input("vs-age-group-filter", "value"),
+            Input("vs-crossfilter", "data"),
+            Input("vs-compare", "value"),
+            State("url", "search"),
+            State("visitation-chart-drawn", "data"),
         ],
     )
-    def update_hourly_heatmap(selected_facilities, start_date, end_date):
-        """Updates the heatmap showing visitation count by hour of the day and day of the week."""
-
-        # Filter data based on date range
-        filtered_df = patients_visitation_df[
-            (patients_visitation_df["start_date"] >= pd.to_datetime(start_date))
-            & (patients_visitation_df["start_date"] <= pd.to_datetime(end_date))
-        ]
-
-        # Apply facility filter
-        if selected_facilities:
-            filtered_df = filtered_df[
-                filtered_df["facility_name"].isin(selected_facilities)
-            ]
-
-        # Add hour and weekday name columns
-        filtered_df["hour"] = pd.to_datetime(
-            filtered_df["time_in"], errors="coerce"
-        ).dt.hour
-        filtered_df["weekday"] = pd.to_datetime(
-            filtered_df["start_date"], errors="coerce"
-        ).dt.day_name()
-
-        # Ensure the weekdays are ordered correctly
-        weekday_order = [
-            "Monday",
-            "Tuesday",
-            "Wednesday",
-            "Thursday",
-            "Friday",
-            "Saturday",
-            "Sunday",
-        ]
-
-        # Group by weekday and hour to get counts
-        heatmap_data = (
-            filtered_df.groupby(["weekday", "hour"]).size().reset_index(name="count")
+    @coalesce.single_flight
+    def update_chart(
+        selected_facilities,
+        start_date,
+        end_date,
+        genders,
+        age_groups,
+        selection,
+        compare,
+        search,
+        drawn,
+    ):
+        # Count visits for each visit_date, and for the prior period's when
+        # comparing (one query over both)
+        current, prior = periods.ranges(start_date, end_date, mode=compare)
+        visitations_over_time = query.visits_per_day(
+            datastore.current(shards.state_of(search)),
+            selected_facilities,
+            start_date,
+            end_date,
+            {
+                "gender": genders,
+                "age_group": age_groups,
+                **(crossfilter.heatmap_selection(selection) or {}),
+            },
+            prior,
         )
 
-        # Pivot the data for heatmap (weekday as rows, hour as columns)
-        pivot_df = heatmap_data.pivot(
-            index="weekday", columns="hour", values="count"
-        ).reindex(weekday_order)
-
-        # Create heatmap using go.Heatmap for more control
-        fig = go.Figure(
-            data=go.Heatmap(
-                z=pivot_df.values,
-                x=pivot_df.columns,
-                y=pivot_df.index,
-                colorscale=[
-                    [0.0, "lightgreen"],  # Lighter green for the lowest values
-                    [0.5, "yellow"],  # Yellow for mid-range values
-                    [1.0, "darkred"],  # Dark red for the highest values
-                ],
-                hovertemplate="Hour: %{x}<br>Weekday: %{y}<br>Count: %{z}",
-                hoverinfo="x+y+z",  # Exclude trace name from hover information
-                name="",  # Set name to empty to remove "trace 0"
+        # Fill the line chart skeleton, the prior period laid over it
+        if prior is None:
+            fig = figures.figure(
+                "visit-line",
+                {
+                    "x": visitations_over_time["start_date"],
+                    "y": visitations_over_time["visitation_count"],
+                },
             )
+        else:
+            period = visitations_over_time.pop("period")
+            selected = visitations_over_time[period == 0]
+            before = visitations_over_time[period == 1]
+            fig = figures.period_lines(
+                "visit-line",
+                selected["start_date"],
+                selected["visitation_count"],
+                periods.aligned(before["start_date"], current, prior, compare),
+                before["visitation_count"],
+                before["start_date"],
+                periods.MODES[compare],
+            )
+
+        drawn = dict(drawn or {})
+        update = figures.client_update(
+            drawn, "visitation-chart", "visit-line", compact_figure(fig)
         )
-        # Update layout for better hourly view
-        fig.update_layout(
-            # title={
-            #     # "text": f"Visitation Trends for {selected_facilities}",
-            #     "text": "Visitation Traffic (Time and Day of the Week)",
-            #     "font": {
-            #         "size": 20,  # You can adjust the size if needed
-            #         "color": "#1E1E1E",  # Set title color to green
-            #         "family": "Arial",  # Optionally set font family
-            #         "weight": "bold",  # Set font weight to bold
-            #     },
-            #     "x": 0.5,  # Center the title
-            #     "xanchor": "center",
-            #     "yanchor": "top",
-            # },
-            title={
-                "text": "<b><u>Visitation Traffic (Time and Day of the Week)</u></b>",
-                "font": {"color": "#1E1E1E"},
-            },
-            xaxis_title="Hour of Day (0-23)",
-            yaxis_title="Weekday",
-            xaxis=dict(tickmode="linear", dtick=1),
-        )
+        return update, drawn
 
-        return fig
+    # Cross-filter: a clicked heatmap cell narrows the page's other charts
+    @app.callback(
+        [
+            Output("vs-crossfilter", "data"),
+            Output("vs-crossfilter-label", "children"),
+        ],
+        [
+            Input("hourly-traffic-heatmap", "clickData"),
+            Input("vs-crossfilter-clear", "n_clicks"),
+            State("vs-crossfilter", "data"),
+        ],
+        prevent_initial_call=True,
+    )
+    def select_heatmap_cell(click_data, clear, selection):
+        if ctx.triggered_id == "vs-crossfilter-clear" or not click_data:
+            selection = None
+        else:
+            selection = crossfilter.toggle(
+                crossfilter.heatmap_selection(selection),
+                crossfilter.heatmap_cell(click_data),
+            )
+        return selection, crossfilter.describe(selection)
 
+    # KPI cards: two prefix-sum lookups per facility, no scan of the visits
     @app.callback(
-        Output("visitation-chart", "figure"),
+        [
+            Output("vs-kpi-visits", "children"),
+            Output("vs-kpi-daily-visits", "children"),
+            Output("vs-kpi-facilities", "children"),
+        ],
         [
             Input("vs-facility-filter", "value"),
             Input("date-picker", "start_date"),
             Input("date-picker", "end_date"),
+            Input("vs-gender-filter", "value"),
+            Input("vs-age-group-filter", "value"),
+            Input("vs-crossfilter", "data"),
+            Input("vs-compare", "value"),
+            State("url", "search"),
         ],
     )
-    def update_chart(selected_facilities, start_date, end_date):
-        # Filter data based on date range
-        filtered_df = patients_visitation_df[
-            (patients_visitation_df["start_date"] >= pd.to_datetime(start_date))
-            & (patients_visitation_df["start_date"] <= pd.to_datetime(end_date))
-        ]
-
-        # Apply facility filter
-        if selected_facilities:
-            filtered_df = filtered_df[
-                filtered_df["facility_name"].isin(selected_facilities)
-            ]
-
-        # Count rows for each visit_date
-        visitations_over_time = (
-            filtered_df.groupby("start_date")
-            .size()
-            .reset_index(name="visitation_count")
+    def update_kpis(
+        selected_facilities,
+        start_date,
+        end_date,
+        genders,
+        age_groups,
+        selection,
+        compare,
+        search,
+    ):
+        snapshot = datastore.current(shards.state_of(search))
+        attributes = {
+            "gender": genders,
+            "age_group": age_groups,
+            **(crossfilter.heatmap_selection(selection) or {}),
+        }
+        values = kpis.visit_kpis(
+            snapshot, selected_facilities, start_date, end_date, attributes
         )
-
-        # Create the line chart
-        fig = px.line(
-            visitations_over_time,
-            x="start_date",
-            y="visitation_count",
-            labels={"start_date": "Date", "visitation_count": "Total Visitations"},
-            color_discrete_sequence=["green"],  # Change the line color here
+        # The prior period's totals are two more lookups per facility
+        _, prior = periods.ranges(start_date, end_date, mode=compare)
+        if prior is not None:
+            prior = kpis.visit_kpis(snapshot, selected_facilities, *prior, attributes)
+        return (
+            f"{values['visits']:,}{kpis.change(values, prior, 'visits')}",
+            f"{values['daily_visits']:,.1f}"
+            f"{kpis.change(values, prior, 'daily_visits')}",
+            f"{values['facilities']:,}{kpis.change(values, prior, 'facilities')}",
         )
 
-        # Improve layout
-        fig.update_layout(xaxis_title="Date", yaxis_title="Total Visitations")
-        # Remove background and legend
+    # Facility map, drawn from the per-snapshot facility aggregates
+    @app.callback(
+        Output("facility-map", "figure"),
+        [Input("map-metric", "value"), State("url", "search")],
+    )
+    @coalesce.single_flight
+    def update_facility_map(metric, search):
+        stats = facility_map.facility_stats(datastore.current(shards.state_of(search)))
+        points = facility_map.map_points(stats)
+        label = facility_map.METRICS[metric]
+
+        # Marker area follows the visit volume, colour the selected metric
+        visits = points["visits"].to_numpy(dtype=float)
+        sizes = 8 + 32 * np.sqrt(visits / visits.max()) if visits.any() else 12
+        fig = go.Figure(
+            go.Scattermap(
+                lat=points["latitude"],
+                lon=points["longitude"],
+                mode="markers",
+                marker=dict(
+                    size=sizes,
+                    color=points[metric],
+                    colorscale=custom_colorscale,
+                    colorbar=dict(title=label),
+                ),
+                cluster=dict(enabled=True, color="#18a145", opacity=0.8),
+                customdata=points[["facility", "visits", "staff", "attendance_rate"]],
+                hovertemplate="<b>%{customdata[0]}</b><br>Visits: %{customdata[1]:,}"
+                "<br>Staff: %{customdata[2]}<br>Attendance rate: "
+                "%{customdata[3]:.0%}<extra></extra>",
+            )
+        )
+        if len(points):
+            center = {
+                "lat": points["latitude"].mean(),
+                "lon": points["longitude"].mean(),
+            }
+        else:
+            center = facility_map.DEFAULT_CENTER
         fig.update_layout(
-            plot_bgcolor="rgba(0,0,0,0)",
+            map=dict(style="carto-positron", center=center, zoom=8),
+            margin=dict(l=0, r=0, t=50, b=0),
             paper_bgcolor="rgba(0,0,0,0)",
             title={
-                "text": "<b><u>Visitation Volume Over Time</u></b>",
+                "text": f"<b><u>Facilities by {label}</u></b>",
                 "font": {"color": "#1E1E1E"},
             },
         )
 
-        return fig
+        # Facilities without usable coordinates are listed, not dropped
+        unmapped = stats.loc[~stats["mapped"], "facility"]
+        if len(unmapped):
+            fig.add_annotation(
+                text=f"{len(unmapped)} of {len(stats)} facilities have no "
+                "coordinates in facilities.csv and are not shown",
+                x=0.01,
+                y=0.01,
+                xref="paper",
+                yref="paper",
+                showarrow=False,
+                bgcolor="rgba(255,255,255,0.8)",
+            )
+
+        return compact_figure(fig)
 
 
 def register_hr_page_callbacks(app):
@@ -557,12 +641,16 @@ def register_hr_page_callbacks(app):
         Output("employee-counts-by-qualification", "figure"),
         [
             Input("hr-facility-filter", "value"),
+            State("url", "search"),
+            Input("hr-crossfilter", "data"),
+            *HR_FILTER_INPUTS,
         ],
     )
-    def update_employee_counts_by_qualification(facility):
+    @coalesce.single_flight
+    def update_employee_counts_by_qualification(facility, search, selection, *filters):
         # state, lga, ward,
         qualification_counts = prepare_employee_counts_by_qualification(
-            merged_hr_data, facility
+            selected_hr_data(search, facility, filters, selection)
         )
         if qualification_counts.empty:
             return go.Figure().add_annotation(
@@ -574,92 +662,60 @@ def register_hr_page_callbacks(app):
             "counts", ascending=False
         )
 
-        # Create the bar chart
-        fig = px.bar(
-            qualification_counts,
-            x="counts",
-            y="qualification",
-            labels={"counts": "Employee Count", "qualification": "Qualification"},
-            orientation="h",  # Horizontal bars
-            color_discrete_sequence=[
-                "#18a145"
-            ],  # Set the desired color (green in this case)
-        )
-
-        # Apply custom hover template and clean up layout
-        fig.update_traces(
-            hovertemplate="<b>Qualification:</b> %{y}<br><b>Counts:</b> %{x}<extra></extra>"
-        )
-        fig.update_layout(
-            showlegend=True,  # Remove legend
-            plot_bgcolor="rgba(0,0,0,0)",  # Transparent plot background
-            paper_bgcolor="rgba(0,0,0,0)",  # Transparent figure background
-            title={
-                "text": "<b><u>Employee Counts by Qualification</u></b>",
-                "font": {"color": "#1E1E1E"},
+        # Fill the bar chart skeleton
+        fig = figures.figure(
+            "qualification-bar",
+            {
+                "x": qualification_counts["counts"],
+                "y": qualification_counts["qualification"],
             },
         )
 
-        return fig
+        return compact_figure(fig)
 
     @app.callback(
         Output("employee-distribution-by-age", "figure"),
         [
             Input("hr-facility-filter", "value"),
+            State("url", "search"),
+            Input("hr-crossfilter", "data"),
+            *HR_FILTER_INPUTS,
         ],
     )
-    def update_employee_distribution_by_age(facility):
+    @coalesce.single_flight
+    def update_employee_distribution_by_age(facility, search, selection, *filters):
         age_group_counts = prepare_employee_distribution_by_age_group(
-            merged_hr_data, facility
+            selected_hr_data(search, facility, filters, selection)
         )
         if age_group_counts.empty:
             return go.Figure().add_annotation(
                 text="No data available", x=0.5, y=0.5, showarrow=False
             )
 
-        fig = px.bar(
-            age_group_counts,
-            x="age_group",
-            y="counts",
-            labels={"counts": "Employee Count", "age_group": "Age Group"},
-            color="age_group",  # Use 'age_group' column for color mapping
-            # ["below 20", "20-29", "30-39", "40-49", "50-59", "60+"]
-            color_discrete_map={
-                "< 20": "#062d14",
-                "20-29": "#15522a",
-                "30-39": "#165e2e",
-                "40-49": "#177e38",
-                "50-59": "#18a145",
-                "60+": "#25c258",
-            },
-        )
-
-        # Apply custom hover template and clean up layout
-        fig.update_traces(
-            hovertemplate="<b>Age Group:</b> %{x}<br><b>Counts:</b> %{y}<extra></extra>"
-        )
-        fig.update_layout(
-            showlegend=False,  # Remove legend
-            plot_bgcolor="rgba(0,0,0,0)",  # Transparent plot background
-            paper_bgcolor="rgba(0,0,0,0)",  # Transparent figure background
-            title={
-                "text": "<b><u>Employee Distribution by Age Group</u></b>",
-                "font": {"color": "#1E1E1E"},
-            },
+        fig = figures.category_bars(
+            "hr-age-bar",
+            age_group_counts["age_group"],
+            age_group_counts["counts"],
+            figures.HR_AGE_COLORS,
+            xaxis={"categoryarray": list(age_group_counts["age_group"])},
         )
 
-        return fig
+        return compact_figure(fig)
 
     @app.callback(
         Output("percentage-distribution-by-cadre", "figure"),
         [
             Input("hr-facility-filter", "value"),
+            State("url", "search"),
+            Input("hr-crossfilter", "data"),
+            *HR_FILTER_INPUTS,
         ],
     )
-    def update_percentage_distribution_by_cadre(facility):
+    @coalesce.single_flight
+    def update_percentage_distribution_by_cadre(facility, search, selection, *filters):
         # state, lga, ward,
         cadre_counts = prepare_percentage_distribution_by_cadre(
-            merged_hr_data, facility
+            selected_hr_data(search, facility, filters, selection)
         )
         if cadre_counts.empty:
             return go.Figure().add_annotation(
@@ -672,52 +728,33 @@ def register_hr_page_callbacks(app):
             "percentage", ascending=False
         ).head(10)
 
-        # Create the pie chart using the top 10 rows
-        fig = px.pie(
-            top_10_cadre_counts,
-            names="cadre",
-            values="percentage",
-            labels={"percentage": "Percentage"},
-            color_discrete_sequence=[
-                "#062d14",
-                "#15522a",
-                "#165e2e",
-                "#177e38",
-                "#18a145",
-                "#25c258",
-                "#4cdc7a",
-                "#88eda7",
-                "#bcf6cd",
-                "#ddfbe6",
-            ],
-        )
-
-        # Apply custom hover template and clean up layout
-        fig.update_traces(
-            hovertemplate="<b>Cadre: </b> %{label}<br><b>Percentage: </b> %{percent:.2%}<extra></extra>"
-        )
-        fig.update_layout(
-            showlegend=False,  # Remove legend
-            plot_bgcolor="rgba(0,0,0,0)",  # Transparent plot background
-            paper_bgcolor="rgba(0,0,0,0)",  # Transparent figure background
-            title={
-                "text": "<b><u>Top 10 Percentage Distribution by Cadre</u></b>",
-                "font": {"color": "#1E1E1E"},
+        # Fill the pie chart skeleton with the top 10 rows
+        fig = figures.figure(
+            "cadre-pie",
+            {
+                "labels": top_10_cadre_counts["cadre"],
+                "values": top_10_cadre_counts["percentage"],
             },
         )
 
-        return fig
+        return compact_figure(fig)
 
     @app.callback(
         Output("employee-percentage-by-employment-type", "figure"),
         [
             Input("hr-facility-filter", "value"),
+            State("url", "search"),
+            Input("hr-crossfilter", "data"),
+            *HR_FILTER_INPUTS,
         ],
     )
-    def update_employee_percentage_by_employment_type(facility):
+    @coalesce.single_flight
+    def update_employee_percentage_by_employment_type(
+        facility, search, selection, *filters
+    ):
         # state, lga, ward,
         employment_type_counts = prepare_employee_percentage_by_employment_type(
-            merged_hr_data, facility
+            selected_hr_data(search, facility, filters, selection)
         )
         if employment_type_counts.empty:
             return go.Figure().add_annotation(
@@ -726,44 +763,31 @@ def register_hr_page_callbacks(app):
         if "employment_type" not in employment_type_counts.columns:
             return px.pie(title="Cadre column not found")
 
-        fig = px.pie(
-            employment_type_counts,
-            names="employment_type",
-            values="percentage",
-            labels={"percentage": "Percentage"},
-            color_discrete_sequence=[
-                "#062d14",
-                "#15522a",
-                "#165e2e",
-                "#177e38",
-            ],
-        )
-
-        # Apply custom hover template and clean up layout
-        fig.update_traces(
-            hovertemplate="<b>Employment Type: </b> %{label}<br><b>Percentage: </b> %{percent:.2%}<extra></extra>"
-        )
-        fig.update_layout(
-            showlegend=False,  # Remove legend
-            plot_bgcolor="rgba(0,0,0,0)",  # Transparent plot background
-            paper_bgcolor="rgba(0,0,0,0)",  # Transparent figure background
-            title={
-                "text": "<b><u>Employee Percentage Count by Employment Type</u></b>",
-                "font": {"color": "#1E1E1E"},
+        fig = figures.figure(
+            "employment-pie",
+            {
+                "labels": employment_type_counts["employment_type"],
+                "values": employment_type_counts["percentage"],
             },
         )
 
-        return fig
+        return compact_figure(fig)
 
     @app.callback(
         Output("employee-percentage-by-employment-type_sb", "figure"),
         [
             Input("hr-facility-filter", "value"),
+            State("url", "search"),
+            Input("hr-crossfilter", "data"),
+            *HR_FILTER_INPUTS,
         ],
     )
-    def update_employee_percentage_by_employment_type_stackedbar(facility):
+    @coalesce.single_flight
+    def update_employee_percentage_by_employment_type_stackedbar(
+        facility, search, selection, *filters
+    ):
         employment_counts = prepare_employee_percentage_by_employment_type(
-            merged_hr_data, facility
+            selected_hr_data(search, facility, filters, selection)
         )
 
         # Sort by employment_type to ensure the order is consistent for bars and legend
@@ -827,118 +851,285 @@ def register_hr_page_callbacks(app):
             showgrid=True,  # Optionally, show or hide the gridlines
         )
 
-        return fig
+        return compact_figure(fig)
 
     @app.callback(
         Output("percentage-distribution-by-cadre_treemap", "figure"),
         [
             Input("hr-facility-filter", "value"),
+            State("url", "search"),
+            *HR_FILTER_INPUTS,
         ],
     )
-    def update_percentage_distribution_by_cadre_treemap(facility):
-        top_10_cadres_df = prepare_cadre_treemap_data(merged_hr_data, facility)
-
-        # Create the treemap
-        fig = px.treemap(
-            top_10_cadres_df,
-            path=["cadre"],  # The hierarchy of categories (only 'cadre' here)
-            values="Total No. of Health Workers",  # The metric to represent the size of the treemap areas
-            color="% Distribution",  # The column used to color the treemap
-            color_continuous_scale="BuGn",  # Color scale for the treemap
+    @coalesce.single_flight
+    def update_percentage_distribution_by_cadre_treemap(facility, search, *filters):
+        top_10_cadres_df = prepare_cadre_treemap_data(
+            selected_hr_data(search, facility, filters)
         )
 
-        # Remove grey background by setting plot and paper background to white (or transparent if you prefer)
-        fig.update_layout(
-            plot_bgcolor="white",  # Background color of the plot area
-            paper_bgcolor="white",  # Background color of the entire figure
-            title={
-                "text": "<b><u>% Distribution of Health Workers by Cadre (Top 10)</u></b>",
-                "font": {"color": "#1E1E1E"},
+        # Fill the treemap skeleton: one tile per cadre, coloured by its share
+        values = top_10_cadres_df["Total No. of Health Workers"].astype(float)
+        colors = top_10_cadres_df["% Distribution"]
+        fig = figures.figure(
+            "cadre-treemap",
+            {
+                "ids": top_10_cadres_df["cadre"],
+                "labels": top_10_cadres_df["cadre"],
+                "parents": np.full(len(top_10_cadres_df), "", dtype=object),
+                "values": values,
+                "marker": {"colors": colors},
+                "customdata": colors.to_numpy()[:, np.newaxis],
             },
         )
 
-        # Update the hovertemplate to display both total workers and % distribution
-        fig.update_traces(
-            hovertemplate="<b>%{label}</b><br>Total Workers: %{value}<br>% Distribution: %{color:.2f}%<extra></extra>"
-        )
-        # fig.update_layout(margin=dict(t=50, l=25, r=25, b=25))
+        return compact_figure(fig)
 
-        return fig
+    # Cross-filter: a clicked cadre tile narrows the page's other charts
+    @app.callback(
+        [
+            Output("hr-crossfilter", "data"),
+            Output("hr-crossfilter-label", "children"),
+        ],
+        [
+            Input("percentage-distribution-by-cadre_treemap", "clickData"),
+            Input("hr-crossfilter-clear", "n_clicks"),
+            State("hr-crossfilter", "data"),
+        ],
+        prevent_initial_call=True,
+    )
+    def select_cadre_tile(click_data, clear, selection):
+        if ctx.triggered_id == "hr-crossfilter-clear" or not click_data:
+            selection = None
+        else:
+            selection = crossfilter.toggle(
+                crossfilter.treemap_selection(selection),
+                crossfilter.treemap_tile(click_data),
+            )
+        return selection, crossfilter.describe(selection)
 
 
 def register_attendance_callbacks(app):
     # Callback to update charts based on selected year and date range
     # Callback to update charts based on selected year and date range
-    @app.callback(
+    @background_callback(
+        app,
         [Output("time-series", "figure"), Output("heatmap", "figure")],
         [
             Input("year-dropdown", "value"),
             Input("date-range", "start_date"),
             Input("date-range", "end_date"),
+            Input("att-compare", "value"),
+            State("url", "search"),
+        ],
+        progress=[Output("att-progress", "value")],
+        running=[
+            (Output("att-progress", "style"), {"height": "4px"}, {"display": "none"})
         ],
     )
-    def update_charts(selected_year, start_date, end_date):
-        # Initially use the entire dataset
-        filtered_df = df.copy()
+    @coalesce.single_flight
+    def update_charts(
+        set_progress, selected_year, start_date, end_date, compare, search
+    ):
+        snapshot = datastore.current(shards.state_of(search))
+        current, prior = periods.ranges(start_date, end_date, selected_year, compare)
+        if prior is not None:
+            # The selected year is resolved into the compared date ranges
+            selected_year, (start_date, end_date) = None, current
+
+        set_progress((1,))
+
+        # The time series and the heatmap are independent: built
+        # concurrently, each in a thread of the figure pool (see parallel.py)
+        def time_series_chart():
+            # Prepare time series data (a selected year overrides the date
+            # range), with the prior period's days when comparing
+            time_series_data = query.employees_per_day(
+                snapshot, selected_year, start_date, end_date, prior
+            )
+            if prior is None:
+                time_series_fig = figures.figure(
+                    "attendance-line",
+                    {
+                        "x": time_series_data["date"],
+                        "y": time_series_data["employee_count"],
+                    },
+                )
+            else:
+                period = time_series_data.pop("period")
+                selected = time_series_data[period == 0]
+                before = time_series_data[period == 1]
+                time_series_fig = figures.period_lines(
+                    "attendance-line",
+                    selected["date"],
+                    selected["employee_count"],
+                    periods.aligned(before["date"], current, prior, compare),
+                    before["employee_count"],
+                    before["date"],
+                    periods.MODES[compare],
+                )
+            return compact_figure(time_series_fig)
 
-        # Filter data based on the selected date range
-        filtered_df = filtered_df[
-            (filtered_df["date"] >= start_date) & (filtered_df["date"] <= end_date)
-        ]
+        def heatmap_chart():
+            # Prepare heatmap data (clock-in hours as rows, every weekday as a
+            # column), or its change from the prior period
+            matrix = query.employees_by_weekday_hour(
+                snapshot, selected_year, start_date, end_date, prior
+            )
+            if prior is None:
+                heatmap_data_pivot = heatmaps.as_frame(matrix).T
+                name, trace = "attendance-heatmap", {}
+            else:
+                heatmap_data_pivot, customdata = heatmaps.delta_frame(*matrix)
+                heatmap_data_pivot = heatmap_data_pivot.T
+                name = "attendance-heatmap-delta"
+                trace = {"customdata": customdata.transpose(1, 0, 2)}
+            heatmap_fig = figures.figure(
+                name,
+                {
+                    "z": heatmap_data_pivot.to_numpy(),
+                    "x": heatmaps.WEEKDAYS,
+                    "y": heatmap_data_pivot.index,
+                    **trace,
+                },
+            )
+            return compact_figure(heatmap_fig)
 
-        if selected_year:
-            # Filter data based on selected year
-            filtered_df = df[df["date"].dt.year == selected_year]
+        return tuple(
+            parallel.run(
+                time_series_chart,
+                heatmap_chart,
+                done=lambda charts: set_progress((1 + charts,)),
+            )
+        )
 
-        # Prepare time series data
-        time_series_data = (
-            filtered_df.groupby("date")["employee_id"]
-            .nunique()
-            .reset_index(name="employee_count")
+    # KPI cards: two prefix-sum lookups per facility, no scan of the clock-ins
+    @app.callback(
+        [
+            Output("att-kpi-clockins", "children"),
+            Output("att-kpi-daily-attendees", "children"),
+            Output("att-kpi-late", "children"),
+        ],
+        [
+            Input("year-dropdown", "value"),
+            Input("date-range", "start_date"),
+            Input("date-range", "end_date"),
+            Input("att-compare", "value"),
+            State("url", "search"),
+        ],
+    )
+    def update_kpis(selected_year, start_date, end_date, compare, search):
+        snapshot = datastore.current(shards.state_of(search))
+        values = kpis.attendance_kpis(snapshot, selected_year, start_date, end_date)
+        # The prior period's totals are two more lookups per facility
+        _, prior = periods.ranges(start_date, end_date, selected_year, compare)
+        if prior is not None:
+            prior = kpis.attendance_kpis(snapshot, None, *prior)
+        return (
+            f"{values['clockins']:,}{kpis.change(values, prior, 'clockins')}",
+            f"{values['daily_attendees']:,.1f}"
+            f"{kpis.change(values, prior, 'daily_attendees')}",
+            f"{values['late']:,} ({values['late_rate']:.0%})"
+            f"{kpis.change(values, prior, 'late')}",
         )
 
-        # Prepare heatmap data (group by clockin_hour and weekday)
-        heatmap_data = (
-            filtered_df.groupby(["clockin_hour", "weekday"])["employee_id"]
-            .nunique()
-            .reset_index()
+    # Chronic lateness ranking against the shift start
+    @app.callback(
+        Output("punctuality-ranking", "figure"),
+        [
+            Input("year-dropdown", "value"),
+            Input("date-range", "start_date"),
+            Input("date-range", "end_date"),
+            Input("punctuality-level", "value"),
+            Input("shift-start", "value"),
+            State("url", "search"),
+        ],
+    )
+    @coalesce.single_flight
+    def update_punctuality(
+        selected_year, start_date, end_date, level, shift_start, search
+    ):
+        snapshot = datastore.current(shards.state_of(search))
+        try:
+            punctuality.shift_seconds(shift_start)
+        except (TypeError, ValueError):
+            shift_start = punctuality.SHIFT_START
+
+        employees = query.employee_punctuality(
+            snapshot, selected_year, start_date, end_date, shift_start
+        )
+        ranking = punctuality.rank(
+            employees,
+            level,
+            facilities=punctuality.facility_of(snapshot.merged_hr_data),
+            top=15,
         )
-        heatmap_data_pivot = heatmap_data.pivot(
-            index="clockin_hour", columns="weekday", values="employee_id"
+        label = punctuality.LEVELS[level]
+
+        ranking = ranking.iloc[::-1]  # Most often late at the top
+        fig = figures.figure(
+            "punctuality-bar",
+            {
+                "x": ranking["late_rate"],
+                "y": ranking[label].astype(str),
+                "customdata": ranking[
+                    ["late_days", "days_present", "mean_offset_minutes"]
+                ],
+            },
+            yaxis={"title": {"text": level.title()}},
+            title=figures.title(
+                f"Late Arrivals by {level.title()} (Shift Start {shift_start})"
+            ),
         )
 
-        # Ensure weekdays are ordered correctly
-        weekday_order = [
-            "Monday",
-            "Tuesday",
-            "Wednesday",
-            "Thursday",
-            "Friday",
-            "Saturday",
-            "Sunday",
-        ]
-        heatmap_data_pivot = heatmap_data_pivot[weekday_order]
+        return compact_figure(fig)
 
-        # Create time series plot
-        time_series_fig = px.line(
-            time_series_data,
-            x="date",
-            y="employee_count",
-            title="Employee Count Over Time",
+    # Absence against the HR roster: facility coverage and absence streaks
+    @app.callback(
+        [Output("absence-facilities", "figure"), Output("absence-streaks", "figure")],
+        [
+            Input("year-dropdown", "value"),
+            Input("date-range", "start_date"),
+            Input("date-range", "end_date"),
+            State("url", "search"),
+        ],
+    )
+    @coalesce.single_flight
+    def update_absenteeism(selected_year, start_date, end_date, search):
+        snapshot = datastore.current(shards.state_of(search))
+        presence = query.presence(snapshot, selected_year, start_date, end_date)
+
+        coverage = absenteeism.facility_coverage(presence)
+        facilities_fig = figures.figure(
+            "absence-bar",
+            {
+                "x": coverage["facility"],
+                "y": coverage["absence_rate"],
+                "customdata": coverage[
+                    ["staff", "enrolled", "gap_days", "working_days"]
+                ],
+            },
         )
 
-        # Create heatmap with custom color scale
-        heatmap_fig = px.imshow(
-            heatmap_data_pivot,
-            labels=dict(x="Weekday", y="Hour of Day", color="Employee Count"),
-            x=weekday_order,
-            y=heatmap_data_pivot.index,
-            title="Employee Count Heatmap (Hour vs Weekday)",
-            aspect="auto",
-            color_continuous_scale=custom_colorscale,  # Apply custom color scale
+        # Staff absent the longest, among those who clock in at all
+        employees = absenteeism.employee_absence(presence)
+        streaks = (
+            employees[employees["enrolled"]]
+            .sort_values(
+                ["current_streak", "longest_streak"], ascending=False, kind="stable"
+            )
+            .head(15)
+            .iloc[::-1]  # Longest at the top
+        )
+        streaks_fig = figures.figure(
+            "streaks-bar",
+            {
+                "x": streaks["current_streak"],
+                "y": streaks["employee_id"].astype(str),
+                "customdata": streaks[["facility", "longest_streak", "absence_rate"]],
+            },
         )
 
-        return time_series_fig, heatmap_fig
+        return compact_figure(facilities_fig), compact_figure(streaks_fig)
 
 
 # Define the function for registering callbacks for each page with multiple IDs
@@ -948,6 +1139,8 @@ def register_filter_callbacks(
     # 🏽 **1️⃣ Update LGA dropdown based on selected State**
     @app.callback(Output(lga_filter, "options"), Input(state_filter, "value"))
     def update_lga_options(selected_state):
+        snapshot = datastore.current()
+        states_df, lgas_df = snapshot.states_df, snapshot.lgas_df
         if selected_state:
             state_id = states_df.loc[
                 states_df["state_name"] == selected_state, "id"
@@ -962,6 +1155,8 @@ def register_filter_callbacks(
     # 🏽 **2️⃣ Update Ward dropdown based on selected LGA**
     @app.callback(Output(ward_filter, "options"), Input(lga_filter, "value"))
     def update_ward_options(selected_lga):
+        snapshot = datastore.current()
+        lgas_df, wards_df = snapshot.lgas_df, snapshot.wards_df
         if selected_lga:
             lga_id = lgas_df.loc[lgas_df["lga_name"] == selected_lga, "id"].values[0]
             wards_in_lga = wards_df[wards_df["lga_id"] == lga_id]
@@ -973,6 +1168,8 @@ def register_filter_callbacks(
     # 🏽 **3️⃣ Update Facility dropdown based on selected Ward**
     @app.callback(Output(facility_filter, "options"), Input(ward_filter, "value"))
     def update_facility_options(selected_ward):
+        snapshot = datastore.current()
+        wards_df, facilities_df = snapshot.wards_df, snapshot.facilities_df
         if selected_ward:
             ward_id = wards_df.loc[wards_df["name"] == selected_ward, "id"].values[0]
             facilities_in_ward = facilities_df[facilities_df["ward_id"] == ward_id]
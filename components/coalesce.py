@@ -0,0 +1,287 @@
+"""Single-flight coalescing of identical concurrent callback requests.
+
+At the start of the day many supervisors open the same default views at
+once, and every request would compute the same figures in parallel. A
+callback wrapped in ``single_flight`` runs once per distinct set of
+inputs in flight: a request arriving while an identical one (the same
+callback with the same normalized inputs) is running waits for it and
+returns its result. Nothing is kept once the computation finishes,
+except the results the warm-up (see warmup.py) computes ahead of the
+requests with ``warm``: those are kept, a bounded number of them, until
+the data changes.
+
+Within a worker the waiting is on a threading.Event. With
+THWP_COALESCE_DIR set, workers, and background callback jobs (which run
+in processes of their own), also coalesce with each other: the first
+takes an flock on a file named after the inputs and the data version
+and publishes its result next to it for the ones blocked on the lock.
+
+With THWP_WARMUP_LOG set, every call is also appended to that file as a
+JSON line of the callback's name and inputs: the access log the warm-up
+ranks the most requested views by.
+"""
+
+import fcntl
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from components import datastore
+
+logger = logging.getLogger(__name__)
+
+# THWP_COALESCE=0 turns coalescing off
+COALESCE = os.environ.get("THWP_COALESCE", "1") != "0"
+
+COALESCE_DIR = os.environ.get("THWP_COALESCE_DIR")
+
+# Seconds a published result is kept on disk for workers waiting on it
+RESULT_EXPIRY = 60
+
+# Warmed results kept per worker (0 keeps none, which turns warming off)
+WARM_RESULTS = int(os.environ.get("THWP_WARM_RESULTS", "1000"))
+
+ACCESS_LOG = os.environ.get("THWP_WARMUP_LOG")
+
+
+def _normalized(value):
+    """An input as it goes into the key.
+
+    Multi-select values, whose order does not change a filter, are sorted,
+    and an empty selection (or query string) is the same as none.
+    Callables (a background callback's set_progress) are left out.
+    """
+    if callable(value) or (isinstance(value, str) and not value):
+        return None
+    if isinstance(value, dict):
+        return {str(key): _normalized(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if not value:
+            return None
+        items = [_normalized(item) for item in value]
+        if all(isinstance(item, (str, int, float)) for item in items):
+            return sorted(items, key=lambda item: (type(item).__name__, item))
+        return items
+    return value
+
+
+def key_of(name, args):
+    """The key of a call: the callback's name and its normalized inputs."""
+    return json.dumps([name, _normalized(args)], sort_keys=True, default=str)
+
+
+class _Flight:
+    """A computation in flight, and what it came to."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def _read(path, since):
+    """A result published at path since a time, or None if there is none."""
+    try:
+        if os.stat(path).st_mtime < since:
+            return None
+        with open(path, "rb") as published:
+            return pickle.load(published)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+
+
+def _publish(path, result):
+    """Write a result for the waiting workers, pruning expired ones."""
+    staging = f"{path}.{os.getpid()}.{threading.get_ident()}"
+    try:
+        with open(staging, "wb") as published:
+            pickle.dump((result,), published, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(staging, path)
+    except (OSError, pickle.PicklingError, TypeError, AttributeError):
+        # The waiting workers compute it themselves
+        logger.debug("Could not publish coalesced result %s", path, exc_info=True)
+        if os.path.exists(staging):
+            os.remove(staging)
+    expired = time.time() - RESULT_EXPIRY
+    for entry in os.scandir(os.path.dirname(path)):
+        # The lock files stay: removing one a worker waits on would let
+        # the next worker lock a new file alongside it
+        try:
+            if entry.name.endswith(".result") and entry.stat().st_mtime < expired:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def _across_workers(key, compute, directory):
+    """compute(), or the result of an identical computation another worker
+    finished while this one waited for it.
+
+    The files are named after the data too, so a worker never takes a
+    result computed on another version of it; and the directory is the
+    user's own, as the results are unpickled.
+    """
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    # Of a directory that already existed, too
+    os.chmod(directory, 0o700)
+    snapshot = datastore.current()
+    data_key = json.dumps([snapshot.version, snapshot.built_at, key])
+    path = os.path.join(directory, hashlib.sha1(data_key.encode()).hexdigest())
+    started = time.time()
+    with open(path + ".lock", "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            # Another worker is computing it: wait, then take its result
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            published = _read(path + ".result", started)
+            if published is not None:
+                return published[0]
+        result = compute()
+        _publish(path + ".result", result)
+        return result
+
+
+def _shared(key, compute):
+    """compute(), or the result of the identical one in flight."""
+    with _flights_lock:
+        flight = _flights.get(key)
+        leading = flight is None
+        if leading:
+            flight = _flights[key] = _Flight()
+    if not leading:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    try:
+        if COALESCE_DIR:
+            flight.result = _across_workers(key, compute, COALESCE_DIR)
+        else:
+            flight.result = compute()
+    except Exception as error:
+        flight.error = error
+        raise
+    finally:
+        # Calls arriving from now on compute afresh
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+    return flight.result
+
+
+# Warmed results of the data version _warm_version, oldest first
+_warm = OrderedDict()
+_warm_version = None
+_warm_lock = threading.Lock()
+
+# Calls answered from, and calls looked up in, the warmed results
+hits = 0
+lookups = 0
+
+
+def _warmed(key):
+    """A warmed result as a 1-tuple, or None when there is none."""
+    global hits, lookups
+    version = datastore.current().version
+    with _warm_lock:
+        lookups += 1
+        if _warm_version != version or key not in _warm:
+            return None
+        hits += 1
+        return _warm[key]
+
+
+def warmed_results():
+    """How many warmed results the worker holds for the live data."""
+    snapshot = datastore.latest()
+    with _warm_lock:
+        if snapshot is None or _warm_version != snapshot.version:
+            return 0
+        return len(_warm)
+
+
+def _record(name, args):
+    """Append a call to the access log."""
+    line = json.dumps([name, [arg for arg in args if not callable(arg)]], default=str)
+    try:
+        with open(ACCESS_LOG, "a") as log:
+            log.write(line + "\n")
+    except OSError:
+        logger.debug("Could not write to the access log %s", ACCESS_LOG, exc_info=True)
+
+
+# Callbacks by name: the function, and whether it takes set_progress first
+CALLBACKS = {}
+
+
+def warm(name, args):
+    """Compute a callback's result for its inputs ahead of the requests
+    and keep it until the data changes.
+
+    args are the callback's inputs, without set_progress. Returns False,
+    computing nothing, once the worker holds WARM_RESULTS results.
+    """
+    global _warm_version
+    func, progress = CALLBACKS[name]
+    if progress:
+        args = (_no_progress, *args)
+    key = key_of(name, args)
+    version = datastore.current().version
+    with _warm_lock:
+        if _warm_version != version:
+            # The data changed: the results of the old data go
+            _warm.clear()
+            _warm_version = version
+        if key in _warm:
+            return True
+        if len(_warm) >= WARM_RESULTS:
+            return False
+    result = _shared(key, lambda: func(*args))
+    with _warm_lock:
+        if _warm_version == version:
+            _warm[key] = (result,)
+    return True
+
+
+def _no_progress(*args):
+    pass
+
+
+def single_flight(func):
+    """Wrap a callback so identical concurrent calls share one computation.
+
+    The callback's result is shared as is, so it must not be modified by
+    whoever receives it (Dash only serializes it).
+    """
+    name = f"{func.__module__}.{func.__qualname__}"
+    parameters = list(inspect.signature(func).parameters)
+    CALLBACKS[name] = (func, parameters[:1] == ["set_progress"])
+
+    @functools.wraps(func)
+    def coalesced(*args):
+        if ACCESS_LOG:
+            _record(name, args)
+        if not COALESCE:
+            return func(*args)
+        key = key_of(name, args)
+        warmed = _warmed(key)
+        if warmed is not None:
+            return warmed[0]
+        return _shared(key, lambda: func(*args))
+
+    # The name the warm-up finds the callback by (see warmup.py)
+    coalesced.single_flight_name = name
+    return coalesced
@@ -0,0 +1,96 @@
+"""Cross-filtering: a clicked chart element narrows the page's other charts.
+
+A click on the visitation heatmap or the cadre treemap becomes a
+selection: the values of the columns that chart groups by, as a
+{column: [value]} mapping kept in a dcc.Store of the page. The sibling
+charts add it to their filters, so it resolves on the bitmap indexes
+(see bitmaps.py) like any dropdown: the rows of a heatmap cell or a
+treemap tile are one more bitmap AND away, not a rescan of the frame. A
+second click on the selected element, or the clear button, drops it.
+
+The Store is the browser's to write, so a selection is validated before
+it reaches a filter (heatmap_selection, treemap_selection): only the
+columns and values a click can produce get through, anything else is no
+selection.
+"""
+
+import numbers
+
+from components import heatmaps
+
+# Shown while nothing is selected
+HINT = "Click a chart element to narrow the other charts to it"
+
+# Each column a selection may hold, and whether a value of it is valid
+COLUMNS = {
+    "weekday": lambda value: _integer(value) and 0 <= value < len(heatmaps.WEEKDAYS),
+    "hour": lambda value: _integer(value) and 0 <= value <= 23,
+    "cadre": lambda value: isinstance(value, str),
+}
+
+
+def _integer(value):
+    return isinstance(value, numbers.Integral) and not isinstance(value, bool)
+
+
+def validated(selection, columns):
+    """The selection if it selects exactly one valid value of each of the
+    columns, else None."""
+    if not isinstance(selection, dict) or set(selection) != set(columns):
+        return None
+    clean = {}
+    for column in columns:
+        values = selection[column]
+        if not (isinstance(values, list) and len(values) == 1):
+            return None
+        if not COLUMNS[column](values[0]):
+            return None
+        clean[column] = [values[0]]
+    return clean
+
+
+def heatmap_selection(selection):
+    """A visitation heatmap cell's selection, validated."""
+    return validated(selection, ("weekday", "hour"))
+
+
+def treemap_selection(selection):
+    """A cadre treemap tile's selection, validated."""
+    return validated(selection, ("cadre",))
+
+
+def heatmap_cell(click_data):
+    """Selection of a clicked visitation heatmap cell: weekday and hour."""
+    try:
+        point = click_data["points"][0]
+        cell = {
+            "weekday": [heatmaps.WEEKDAYS.index(point["y"])],
+            "hour": [int(point["x"])],
+        }
+    except (KeyError, IndexError, TypeError, ValueError):
+        return None
+    return heatmap_selection(cell)
+
+
+def treemap_tile(click_data):
+    """Selection of a clicked cadre treemap tile."""
+    try:
+        tile = {"cadre": [click_data["points"][0]["label"]]}
+    except (KeyError, IndexError, TypeError):
+        return None
+    return treemap_selection(tile)
+
+
+def toggle(selection, clicked):
+    """The selection after a click: the clicked one, or none if it was it."""
+    return None if clicked == selection else clicked
+
+
+def describe(selection):
+    """The selection as the page shows it."""
+    if heatmap_selection(selection):
+        day, hour = heatmaps.WEEKDAYS[selection["weekday"][0]], selection["hour"][0]
+        return f"Showing visits on {day}s, {hour:02d}:00-{hour:02d}:59"
+    if treemap_selection(selection):
+        return f"Showing cadre: {selection['cadre'][0]}"
+    return HINT
@@ -0,0 +1,442 @@
+"""Dashboard datasets behind a versioned, atomically swapped reference.
+
+Callbacks call ``current()`` once and read every frame from the returned
+Snapshot, so a request always sees one fully built version of the data.
+A Snapshot is never modified once built, so the request threads of a
+threaded worker share it without locks: its frames are copy-on-write
+(whatever a callback derives from one is its own) and its numpy arrays
+are read-only.
+A background thread watches ``data/CSVs/`` and, when a file changes,
+builds a new Snapshot off the request path and swaps it in. New rows
+dropped as delta CSVs into ``data/CSVs/deltas/`` are folded into the
+current Snapshot's aggregates instead, without reloading anything.
+"""
+
+import gc
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, replace
+
+import numpy as np
+import pandas as pd
+
+from components import ingest, partitions, query, shards
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.environ.get("THWP_DATA_DIR", "data/CSVs")
+
+# Delta CSVs (see ingest.DELTA_DATASETS); defaults to <data dir>/deltas
+DELTA_DIR = os.environ.get("THWP_DELTA_DIR")
+
+# Seconds between checks of the data directory (0 disables the scheduler)
+REFRESH_INTERVAL = float(os.environ.get("THWP_REFRESH_INTERVAL", "30"))
+
+# When set (e.g. /dev/shm/thwp), frames are published to and attached from
+# memory-mapped files shared by every worker on the host; see shared_data.py
+SHARED_DATA_DIR = os.environ.get("THWP_SHARED_DATA_DIR")
+
+
+try:
+    # Arrow-backed strings with the NaN semantics of object columns
+    ARROW_STRING = pd.StringDtype("pyarrow", na_value=np.nan)
+except (ImportError, TypeError):
+    # pyarrow missing or pandas < 2.3: strings stay Python objects
+    ARROW_STRING = None
+
+if int(pd.__version__.split(".")[0]) < 3:
+    # Always on from pandas 3: a frame derived from a snapshot's never
+    # writes through to it
+    pd.set_option("mode.copy_on_write", True)
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """One consistent version of every dataset used by the callbacks."""
+
+    version: int
+    signature: tuple
+    built_at: float
+    facilities_df: pd.DataFrame
+    wards_df: pd.DataFrame
+    lgas_df: pd.DataFrame
+    states_df: pd.DataFrame
+    # Visit counts per ingest.VISIT_KEYS combination
+    visit_counts_df: pd.DataFrame
+    merged_hr_data: pd.DataFrame
+    clockins: ingest.ClockIns
+    # Patient attributes the visit deltas are joined to
+    patients_df: pd.DataFrame = None
+    # query.SQLEngine holding the visitation and timecard facts, which are
+    # then None above; None when the callbacks use the aggregates
+    engine: object = None
+    # ingest.delta_files() already folded into this snapshot
+    deltas: tuple = ()
+    # Set on the per-state shards (see shards.py): the state and the names
+    # of its facilities, which the SQL queries are limited to
+    state: str = None
+    facility_scope: tuple = None
+
+
+def data_signature(data_dir=DATA_DIR):
+    """(name, mtime, size) of every CSV; changes whenever a file is replaced."""
+    signature = []
+    for entry in sorted(os.scandir(data_dir), key=lambda e: e.name):
+        if entry.is_file() and entry.name.endswith(".csv"):
+            stat = entry.stat()
+            signature.append((entry.name, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+def delta_dir(data_dir=DATA_DIR):
+    return DELTA_DIR or os.path.join(data_dir, "deltas")
+
+
+def merge_hr_data(hr_personal_df, employment_df):
+    filtered_df = pd.merge(hr_personal_df, employment_df, on="email", how="inner")
+    return filtered_df
+
+
+def load_hr(data_dir=DATA_DIR):
+    hr_personal_df = pd.read_csv(
+        os.path.join(data_dir, "cleaned_hrh_personal_data.csv")
+    )
+    employment_df = pd.read_csv(
+        os.path.join(data_dir, "cleaned_hrh_employment_data.csv")
+    )
+    return merge_hr_data(hr_personal_df, employment_df)
+
+
+def finalize_frame(df):
+    """Move string columns out of Python objects into Arrow buffers.
+
+    Object columns hold one PyObject per cell; merely reading them writes
+    reference counts, which unshares copy-on-write pages after a fork.
+    Arrow strings and numpy columns are plain buffers that stay shared.
+    """
+    if ARROW_STRING is None:
+        return df
+    for column in df.columns:
+        dtype = df[column].dtype
+        python_strings = (
+            isinstance(dtype, pd.StringDtype) and dtype.storage == "python"
+        ) or (
+            dtype == object
+            and pd.api.types.infer_dtype(df[column], skipna=True) in ("string", "empty")
+        )
+        if python_strings:
+            df[column] = df[column].astype(ARROW_STRING)
+    return df
+
+
+def load_frames(data_dir=DATA_DIR, finalize=True, facts=True):
+    """Read the CSVs and derive every frame of a Snapshot.
+
+    Visitations are streamed into visit counts (see ingest.py). With
+    facts=False they are left out, for snapshots that query them through
+    an SQL engine instead.
+    """
+    frames = dict(
+        facilities_df=pd.read_csv(os.path.join(data_dir, "facilities.csv")),
+        wards_df=pd.read_csv(os.path.join(data_dir, "wards.csv")),
+        lgas_df=pd.read_csv(os.path.join(data_dir, "lgas.csv")),
+        states_df=pd.read_csv(os.path.join(data_dir, "states.csv")),
+        merged_hr_data=load_hr(data_dir),
+    )
+    if facts:
+        frames["patients_df"] = ingest.read_patients(
+            os.path.join(data_dir, "cleaned_patients_data.csv")
+        )
+        frames["visit_counts_df"] = ingest.stream_visitation(
+            frames["patients_df"],
+            os.path.join(data_dir, "cleaned_visitations_data.csv"),
+        )
+    if finalize:
+        frames = {name: finalize_frame(df) for name, df in frames.items()}
+    return frames
+
+
+def load_clockins(data_dir=DATA_DIR):
+    """The first clock-in matrix of the timecard."""
+    return ingest.stream_timecard(
+        os.path.join(data_dir, "cleaned_hrh_timecard_data.csv")
+    )
+
+
+def load_all(data_dir=DATA_DIR, finalize=True, facts=True):
+    """The frames, and with the facts the clock-in matrix as "clockins",
+    in state order (see shards.order_by_state).
+
+    With partitioning on the clock-ins stay in the timecard partitions,
+    and the queries read those their filters select (see
+    query.clockins_within).
+    """
+    frames = load_frames(data_dir, finalize, facts)
+    if facts and not partitions.PARTITION_DIR:
+        frames["clockins"] = load_clockins(data_dir)
+    frames.update(shards.order_by_state(frames))
+    return frames
+
+
+def shared_frames(data_dir=DATA_DIR, facts=True):
+    """The frames, and with the facts the clock-in matrix, as published to
+    the shared segment (see shared_data.py).
+
+    The clock-in employees travel as a frame and the matrix and its first
+    day as arrays; clockins_of() puts them back together.
+    """
+    frames = load_all(data_dir, facts=facts)
+    clockins = frames.pop("clockins", None)
+    if clockins is not None:
+        frames["clockin_employees"] = pd.DataFrame(
+            {
+                "employee_id": clockins.employee_ids,
+                "department_code": clockins.department_codes,
+            }
+        )
+        frames["clockin_seconds"] = clockins.seconds
+        frames["clockin_first_date"] = np.asarray(clockins.first_date)
+    return frames
+
+
+def clockins_of(frames):
+    """The ClockIns of attached shared frames, taken out of them; None if
+    they hold none."""
+    if "clockin_employees" not in frames:
+        return None
+    employees = frames.pop("clockin_employees")
+    return ingest.ClockIns(
+        first_date=frames.pop("clockin_first_date")[()],
+        employee_ids=employees["employee_id"].to_numpy(dtype=object),
+        department_codes=employees["department_code"].to_numpy(),
+        seconds=frames.pop("clockin_seconds"),
+    )
+
+
+def build_snapshot(version, data_dir=DATA_DIR, finalize=True):
+    """Load and derive every dataset; nothing is shared with older snapshots."""
+    # Taken before reading, so a file replaced mid-build triggers another build
+    signature = data_signature(data_dir)
+    deltas = ingest.delta_files(delta_dir(data_dir))
+
+    if partitions.PARTITION_DIR:
+        partitions.ensure(data_dir)
+        partition_deltas(deltas, data_dir)
+
+    engine = None
+    if query.QUERY_BACKEND:
+        # The database holds the deltas too; a new delta means a new database
+        engine = query.open_engine(signature, data_dir, delta_dir(data_dir), deltas)
+    facts = engine is None
+
+    if SHARED_DATA_DIR and finalize:
+        from components import shared_data
+
+        # Segments with and without the fact frames, or the clock-ins, must
+        # not be mixed up
+        segment = signature
+        if not facts:
+            segment += (("facts", False),)
+        elif partitions.PARTITION_DIR:
+            segment += (("clockins", False),)
+        frames = shared_data.attach_or_publish(
+            segment,
+            lambda: shared_frames(data_dir, facts),
+            SHARED_DATA_DIR,
+        )
+        # Attached like the frames: the timecard is not read again
+        frames["clockins"] = clockins_of(frames)
+    else:
+        frames = load_all(data_dir, finalize, facts)
+
+    frames.setdefault("visit_counts_df", None)
+    frames.setdefault("clockins", None)
+    snapshot = Snapshot(
+        version=version,
+        signature=signature,
+        built_at=time.time(),
+        engine=engine,
+        **frames,
+    )
+    if engine is not None:
+        return replace(snapshot, deltas=deltas)
+    return apply_deltas(snapshot, deltas, data_dir)
+
+
+def partition_deltas(deltas, data_dir=DATA_DIR):
+    """Add the timecard deltas to the stored partitions (once per file)."""
+    for path in ingest.delta_paths(delta_dir(data_dir), deltas, "timecard"):
+        partitions.append(
+            partitions.PARTITION_DIR,
+            "timecard",
+            ingest.read_timecard_chunks(path),
+            os.path.splitext(os.path.basename(path))[0],
+        )
+
+
+def apply_deltas(snapshot, deltas, data_dir=DATA_DIR):
+    """A copy of the snapshot with the delta files folded in.
+
+    Only the new rows are read; the aggregates they touch are extended,
+    everything else is shared with the given snapshot. The new rows are
+    not put in state order (see shards.py): only the shards of the states
+    they add to are cut as copies, until the next full build.
+    """
+    if not deltas:
+        return snapshot
+    directory = delta_dir(data_dir)
+    if partitions.PARTITION_DIR:
+        partition_deltas(deltas, data_dir)
+    patients_df = ingest.append_patients(
+        snapshot.patients_df, ingest.delta_paths(directory, deltas, "patients")
+    )
+    return replace(
+        snapshot,
+        built_at=time.time(),
+        patients_df=patients_df,
+        visit_counts_df=ingest.append_visits(
+            snapshot.visit_counts_df,
+            patients_df,
+            ingest.delta_paths(directory, deltas, "visitations"),
+        ),
+        clockins=(
+            ingest.append_timecard(
+                snapshot.clockins, ingest.delta_paths(directory, deltas, "timecard")
+            )
+            # Left in the partitions, which hold the delta rows already
+            if snapshot.clockins is not None
+            else None
+        ),
+        deltas=snapshot.deltas + tuple(deltas),
+    )
+
+
+_snapshot = None
+_build_lock = threading.Lock()
+
+
+def current(state=None):
+    """The latest complete Snapshot; builds the first one on demand.
+
+    With a state, the Snapshot's shard of that state (see shards.py).
+    """
+    snapshot = _snapshot
+    if snapshot is None:
+        with _build_lock:
+            if _snapshot is None:
+                _swap(build_snapshot(version=1))
+        snapshot = _snapshot
+    if state:
+        return shards.shard(snapshot, state)
+    return snapshot
+
+
+def latest():
+    """The live Snapshot, or None before the first is built; unlike
+    current(), never builds one."""
+    return _snapshot
+
+
+def preload():
+    """Load everything in the gunicorn master before workers are forked.
+
+    gc.freeze() moves the loaded objects out of the collector's reach, so
+    garbage collections in the workers do not write to (and unshare) them.
+    """
+    snapshot = current()
+    gc.collect()
+    gc.freeze()
+    return snapshot
+
+
+def _swap(snapshot):
+    global _snapshot
+    # Rebinding a module global is atomic: readers get the old or the new one
+    _snapshot = snapshot
+    logger.info("Data snapshot v%s is live", snapshot.version)
+
+
+def refresh(force=False, data_dir=DATA_DIR):
+    """Swap in a new Snapshot if the CSVs changed or new deltas arrived.
+
+    New delta files are folded into the current snapshot; anything else
+    (a replaced CSV, a delta file changed or removed after it was applied)
+    rebuilds from scratch. Returns True when a new version went live.
+    Readers are never blocked: they keep using the previous snapshot until
+    the swap.
+    """
+    with _build_lock:
+        old = _snapshot
+        if old is None or force or data_signature(data_dir) != old.signature:
+            version = old.version + 1 if old is not None else 1
+            _swap(build_snapshot(version, data_dir))
+            return True
+
+        deltas = ingest.delta_files(delta_dir(data_dir))
+        applied = set(old.deltas)
+        pending = tuple(delta for delta in deltas if delta not in applied)
+        if not pending:
+            return False
+        if old.engine is not None or not applied.issubset(deltas):
+            _swap(build_snapshot(old.version + 1, data_dir))
+        else:
+            _swap(
+                replace(apply_deltas(old, pending, data_dir), version=old.version + 1)
+            )
+        return True
+
+
+# Called, without arguments, after the scheduler puts a new snapshot live
+_refresh_listeners = []
+
+
+def on_refresh(listener):
+    """Have listener() called after every scheduled refresh that swaps in a
+    new snapshot, e.g. to warm the caches for it."""
+    _refresh_listeners.append(listener)
+
+
+class RefreshScheduler(threading.Thread):
+    """Polls the data directory and rebuilds the snapshot when it changes."""
+
+    def __init__(self, interval=REFRESH_INTERVAL, data_dir=DATA_DIR):
+        super().__init__(name="data-refresh", daemon=True)
+        self.interval = interval
+        self.data_dir = data_dir
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                refreshed = refresh(data_dir=self.data_dir)
+            except Exception:
+                # A half-written CSV must not take the dashboard down; the
+                # previous snapshot stays live and the next poll retries.
+                logger.exception("Data refresh failed, keeping the current data")
+                continue
+            if refreshed:
+                for listener in _refresh_listeners:
+                    try:
+                        listener()
+                    except Exception:
+                        # Nor must a listener stop the polling, or the others
+                        logger.exception("Refresh listener %r failed", listener)
+
+    def stop(self):
+        self.stopped.set()
+
+
+_scheduler = None
+
+
+def start_refresh_scheduler(interval=REFRESH_INTERVAL):
+    """Start the background refresh thread once per process."""
+    global _scheduler
+    if interval <= 0:
+        return None
+    if _scheduler is None or not _scheduler.is_alive():
+        _scheduler = RefreshScheduler(interval)
+        _scheduler.start()
+    return _scheduler
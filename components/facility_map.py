@@ -0,0 +1,146 @@
+"""Facility map: visit volume, staffing and attendance per facility.
+
+The per-facility figures do not depend on any filter, so they are
+computed once per data snapshot (``facility_stats``) and every map
+render reads them from there. Markers are clustered in the browser by
+the map itself, and above MAX_POINTS facilities they are first merged
+into grid cells here, so the figure stays small however many wards the
+facilities cover.
+"""
+
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from components import absenteeism, query
+
+# Map metrics: column of facility_stats and its label
+METRICS = {
+    "visits": "Visits",
+    "staff": "Staff",
+    "attendance_rate": "Attendance Rate",
+}
+
+# Above this many mapped facilities, markers are merged per grid cell of
+# GRID_DEGREES (or coarser, until they fit)
+MAX_POINTS = int(os.environ.get("THWP_MAP_MAX_POINTS", "5000"))
+GRID_DEGREES = float(os.environ.get("THWP_MAP_GRID_DEGREES", "0.05"))
+
+# Where the map opens when no facility has coordinates (Gombe)
+DEFAULT_CENTER = {"lat": 10.29, "lon": 11.17}
+
+
+def has_coordinates(df):
+    """Rows with a real position; 0/0 and out-of-range values are placeholders."""
+    lat = pd.to_numeric(df["latitude"], errors="coerce")
+    lon = pd.to_numeric(df["longitude"], errors="coerce")
+    return (
+        lat.between(-90, 90) & lon.between(-180, 180) & ~((lat == 0) & (lon == 0))
+    ).to_numpy()
+
+
+def build_facility_stats(snapshot):
+    """One row per facility: location, visits, staff and attendance rate."""
+    facilities_df = snapshot.facilities_df
+    wards_df = snapshot.wards_df.rename(columns={"id": "ward_id", "name": "ward"})
+    lgas_df = snapshot.lgas_df.rename(columns={"id": "lga_id", "lga_name": "lga"})
+    states_df = snapshot.states_df.rename(
+        columns={"id": "state_id", "state_name": "state"}
+    )
+    stats = (
+        facilities_df[["name", "ward_id", "longitude", "latitude"]]
+        .rename(columns={"name": "facility"})
+        .merge(wards_df[["ward_id", "ward", "lga_id"]], on="ward_id", how="left")
+        .merge(lgas_df[["lga_id", "lga", "state_id"]], on="lga_id", how="left")
+        .merge(states_df[["state_id", "state"]], on="state_id", how="left")
+        .drop(columns=["ward_id", "lga_id", "state_id"])
+    )
+
+    # A state without any visits or clock-ins yet has no date bounds
+    first, last = query.visit_date_bounds(snapshot)
+    visits = pd.Series(dtype="int64")
+    if pd.notna(first):
+        visits = query.visit_counts(snapshot, "facility_name", None, first, last)
+    first, last = query.timecard_date_bounds(snapshot)
+    coverage = pd.DataFrame(columns=["staff", "enrolled", "absence_rate"])
+    if pd.notna(first):
+        coverage = absenteeism.facility_coverage(
+            query.presence(snapshot, None, first, last)
+        ).set_index("facility")
+
+    facility = stats["facility"]
+    stats["visits"] = facility.map(visits).fillna(0).astype(np.int64)
+    stats["staff"] = facility.map(coverage["staff"]).fillna(0).astype(np.int64)
+    stats["enrolled"] = facility.map(coverage["enrolled"]).fillna(0).astype(np.int64)
+    stats["attendance_rate"] = 1 - facility.map(coverage["absence_rate"])
+    stats["latitude"] = pd.to_numeric(stats["latitude"], errors="coerce")
+    stats["longitude"] = pd.to_numeric(stats["longitude"], errors="coerce")
+    stats["mapped"] = has_coordinates(stats)
+    return stats
+
+
+# state: (snapshot key, stats) of the latest snapshot each state was seen in
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def facility_stats(snapshot):
+    """build_facility_stats of the snapshot, computed once per snapshot and
+    state."""
+    key = (snapshot.version, snapshot.built_at)
+    cached_key, stats = _stats.get(snapshot.state, (None, None))
+    if cached_key != key:
+        with _stats_lock:
+            cached_key, stats = _stats.get(snapshot.state, (None, None))
+            if cached_key != key:
+                stats = build_facility_stats(snapshot)
+                # Stats of older data are not asked for again
+                for state, (cached_key, _) in list(_stats.items()):
+                    if cached_key < key:
+                        del _stats[state]
+                # One tuple, so readers never pair a key with another frame
+                _stats[snapshot.state] = (key, stats)
+    return stats
+
+
+def grid_cells(stats, degrees=GRID_DEGREES):
+    """Mapped facilities merged per grid cell, at the cells' mean position."""
+    cells = stats.assign(
+        cell_lat=np.floor(stats["latitude"] / degrees),
+        cell_lon=np.floor(stats["longitude"] / degrees),
+        # Summed, then divided by staff again for a staff-weighted rate
+        attended=stats["attendance_rate"].fillna(0) * stats["staff"],
+    )
+    grouped = cells.groupby(["cell_lat", "cell_lon"]).agg(
+        latitude=("latitude", "mean"),
+        longitude=("longitude", "mean"),
+        facilities=("facility", "size"),
+        facility=("facility", "first"),
+        visits=("visits", "sum"),
+        staff=("staff", "sum"),
+        attended=("attended", "sum"),
+    )
+    grouped["attendance_rate"] = grouped["attended"] / grouped["staff"].where(
+        grouped["staff"] > 0
+    )
+    grouped["facility"] = grouped["facility"].where(
+        grouped["facilities"] == 1,
+        grouped["facilities"].astype(str) + " facilities",
+    )
+    return grouped.drop(columns="attended").reset_index(drop=True)
+
+
+def map_points(stats, max_points=MAX_POINTS):
+    """Markers to draw: the mapped facilities, or grid cells when too many."""
+    mapped = stats[stats["mapped"]]
+    if len(mapped) <= max_points:
+        return mapped.assign(facilities=1)
+    # Coarser cells until the markers fit
+    degrees = GRID_DEGREES
+    cells = grid_cells(mapped, degrees)
+    while len(cells) > max_points:
+        degrees *= 2
+        cells = grid_cells(mapped, degrees)
+    return cells
@@ -0,0 +1,648 @@
+"""Prebuilt figure skeletons for the dashboard charts.
+
+Plotly Express validates every property of a figure as it builds it, and
+the callbacks then restyle the result with the same update_layout calls
+on every request. Each chart is instead built through Plotly once, from
+placeholder data, and kept as a plain figure dict (``SKELETONS``); a
+callback copies the skeleton and fills in only its data arrays
+(``figure``, ``category_bars``). compact_figure() and dcc.Graph take the
+dict as they take a Figure. A graph that already draws a skeleton is sent
+only the filled-in data, as a Dash Patch (``client_update``).
+
+Skeletons are shared by every request: what ``figure`` returns is a new
+dict of new traces, but the nested dicts it shares (marker, axes,
+template) must not be modified.
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from dash import Patch
+
+from components.heatmaps import WEEKDAYS
+
+try:
+    # The typed array encoding Figure.to_dict() applies (plotly >= 6)
+    from _plotly_utils.utils import convert_to_base64
+except ImportError:
+
+    def convert_to_base64(obj):
+        pass
+
+
+TRANSPARENT = {"plot_bgcolor": "rgba(0,0,0,0)", "paper_bgcolor": "rgba(0,0,0,0)"}
+
+# Shades of green, darkest first
+GREENS = [
+    "#062d14",
+    "#15522a",
+    "#165e2e",
+    "#177e38",
+    "#18a145",
+    "#25c258",
+    "#4cdc7a",
+    "#88eda7",
+    "#bcf6cd",
+    "#ddfbe6",
+]
+
+VISIT_AGE_GROUPS = ["0-4", "5-9", "10-19", "20-29", "30-39", "40-49", "50-59", "60+"]
+VISIT_AGE_COLORS = dict(zip(VISIT_AGE_GROUPS, GREENS))
+HR_AGE_GROUPS = ["< 20", "20-29", "30-39", "40-49", "50-59", "60+"]
+HR_AGE_COLORS = dict(zip(HR_AGE_GROUPS, GREENS))
+MARITAL_COLORS = {"Single": "#062d14", "Married": "#15522a"}
+
+HEAT_COLORSCALE = [[0, "lightgreen"], [0.5, "yellow"], [1, "darkred"]]
+# Changes from a prior period: red for fewer, green for more, centred on 0
+DELTA_COLORSCALE = "RdYlGn"
+PRIOR_LINE = {"color": "grey", "dash": "dot"}
+
+
+def title(text):
+    """A chart title in the dashboard style: bold, underlined, dark grey."""
+    return {"text": f"<b><u>{text}</u></b>", "font": {"color": "#1E1E1E"}}
+
+
+# name -> function building the styled chart from placeholder data
+SKELETONS = {}
+
+
+def skeleton(name):
+    """Register the function building a chart as the skeleton ``name``."""
+
+    def register(build):
+        SKELETONS[name] = build
+        return build
+
+    return register
+
+
+_built = {}
+_built_lock = threading.Lock()
+
+
+def skeleton_of(name):
+    """The figure dict of a skeleton, built once per process."""
+    built = _built.get(name)
+    if built is None:
+        with _built_lock:
+            built = _built.get(name)
+            if built is None:
+                built = _built[name] = SKELETONS[name]().to_plotly_json()
+    return built
+
+
+PANDAS_ARRAYS = (pd.DataFrame, pd.Series, pd.Index)
+
+
+def _arrays(trace):
+    """The trace with pandas values as numpy arrays, typed-encoded."""
+    trace = {
+        key: value.to_numpy() if isinstance(value, PANDAS_ARRAYS) else value
+        for key, value in trace.items()
+    }
+    convert_to_base64(trace)
+    return trace
+
+
+def _merged(base, update):
+    # Dict values update the skeleton's dict (one level deep), as in
+    # update_layout; anything else replaces it
+    merged = dict(base)
+    for key, value in update.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            value = {**merged[key], **value}
+        merged[key] = value
+    return merged
+
+
+def figure(name, *traces, **layout):
+    """A copy of a skeleton with the given traces' data filled in.
+
+    Each trace is a dict of the properties that change per request (x, y,
+    values, customdata, ...) laid over the skeleton's first trace; the
+    keyword arguments update its layout.
+    """
+    built = skeleton_of(name)
+    prototype = built["data"][0]
+    return {
+        "data": [_merged(prototype, _arrays(trace)) for trace in traces],
+        "layout": _merged(built["layout"], layout),
+    }
+
+
+def period_lines(name, x, y, prior_x, prior_y, prior_dates, label):
+    """A copy of a line skeleton with a prior period's line laid over it.
+
+    The prior points are drawn at the selected dates they compare with
+    (prior_x, see periods.aligned) and hover with their own dates.
+    """
+    return figure(
+        name,
+        {"x": x, "y": y, "name": "Selected period", "showlegend": True},
+        {
+            "x": prior_x,
+            "y": prior_y,
+            "customdata": pd.DatetimeIndex(prior_dates).strftime("%Y-%m-%d"),
+            "name": label,
+            "showlegend": True,
+            "line": PRIOR_LINE,
+            "hovertemplate": f"%{{customdata}}: %{{y}}<extra>{label}</extra>",
+        },
+    )
+
+
+def category_bars(name, categories, values, colors, **layout):
+    """A copy of a one-bar-per-category skeleton (``px.bar(color=x)``).
+
+    colors maps categories to colors, or is a sequence cycled through in
+    order, as color_discrete_map and color_discrete_sequence would be.
+    """
+    traces = []
+    for i, (category, value) in enumerate(zip(categories, values)):
+        if isinstance(colors, dict):
+            color = colors[category]
+        else:
+            color = colors[i % len(colors)]
+        traces.append(
+            {
+                "name": category,
+                "legendgroup": category,
+                "marker": {"color": color},
+                "x": np.array([category], dtype=object),
+                "y": np.array([value]),
+            }
+        )
+    return figure(name, *traces, **layout)
+
+
+def data_patch(name, figure):
+    """A Patch turning a drawn copy of a skeleton into figure.
+
+    figure is a filled copy of the skeleton (compacted or not); the trace
+    properties and layout keys it does not share with the skeleton are
+    what was filled in, and are all the Patch carries.
+    """
+    built = skeleton_of(name)
+    prototype = built["data"][0]
+    patch = Patch()
+    for i, trace in enumerate(figure["data"]):
+        patch["data"][i].update(
+            {
+                key: value
+                for key, value in trace.items()
+                if value is not prototype.get(key)
+            }
+        )
+    layout = {
+        key: value
+        for key, value in figure["layout"].items()
+        if value is not built["layout"].get(key)
+    }
+    if layout:
+        patch["layout"].update(layout)
+    return patch
+
+
+def client_update(drawn, graph, name, figure):
+    """The output sending figure to a graph, a Patch when it can be.
+
+    drawn maps graph ids to the [skeleton, trace count] each was last sent
+    (a dcc.Store's data, updated here). A graph already drawing the same
+    skeleton with as many traces only receives the data; on the first
+    render, after a placeholder figure (name None) or when the number of
+    traces changes, the whole figure is sent.
+    """
+    shape = [name, len(figure["data"])] if name else None
+    update = figure
+    if shape is not None and drawn.get(graph) == shape:
+        update = data_patch(name, figure)
+    drawn[graph] = shape
+    return update
+
+
+# Visitation ----------------------------------------------------------------
+
+
+@skeleton("gender-pie")
+def gender_pie():
+    fig = px.pie(
+        names=["Female", "Male"],
+        values=[1, 1],
+        hole=0.4,
+        color_discrete_sequence=["#062d14", "#18a145"],
+    )
+    fig.update_layout(
+        **TRANSPARENT,
+        showlegend=True,
+        legend_title_text="Gender",
+        title=title("Patients by Gender"),
+    )
+    fig.update_traces(hovertemplate="%{label}: %{percent}")
+    return fig
+
+
+@skeleton("marital-bar")
+def marital_bar():
+    fig = px.bar(
+        pd.DataFrame({"marital_status": ["Married"], "count": [1]}),
+        x="marital_status",
+        y="count",
+        labels={"marital_status": "Marital Status", "count": "Count"},
+        color="marital_status",
+        color_discrete_sequence=["#062d14", "#ddfbe6"],
+    )
+    fig.update_layout(
+        **TRANSPARENT,
+        showlegend=False,
+        legend_title_text="Marital Status",
+        title=title("Patients by Marital Status"),
+    )
+    fig.update_traces(hovertemplate="Marital Status: %{x} <br>Count: %{y}")
+    return fig
+
+
+@skeleton("visit-age-bar")
+def visit_age_bar():
+    fig = px.bar(
+        x=VISIT_AGE_GROUPS[:1],
+        y=[1],
+        color=VISIT_AGE_GROUPS[:1],
+        color_discrete_map=VISIT_AGE_COLORS,
+        labels={"x": "Age Group", "y": "Visit Count"},
+    )
+    fig.update_traces(
+        hovertemplate="<b>Age Group:</b> %{x}<br><b>Visits:</b> %{y}<extra></extra>"
+    )
+    fig.update_layout(
+        **TRANSPARENT, showlegend=False, title=title("Visitation by Age Group")
+    )
+    return fig
+
+
+@skeleton("visit-heatmap")
+def visit_heatmap():
+    fig = go.Figure(
+        data=go.Heatmap(
+            z=[[1]],
+            x=[0],
+            y=WEEKDAYS[:1],
+            colorscale=[
+                [0.0, "lightgreen"],  # Lighter green for the lowest values
+                [0.5, "yellow"],  # Yellow for mid-range values
+                [1.0, "darkred"],  # Dark red for the highest values
+            ],
+            hovertemplate="Hour: %{x}<br>Weekday: %{y}<br>Count: %{z}",
+            hoverinfo="x+y+z",  # Exclude trace name from hover information
+            name="",  # Set name to empty to remove "trace 0"
+        )
+    )
+    fig.update_layout(
+        title=title("Visitation Traffic (Time and Day of the Week)"),
+        xaxis_title="Hour of Day (0-23)",
+        yaxis_title="Weekday",
+        xaxis=dict(tickmode="linear", dtick=1),
+    )
+    return fig
+
+
+@skeleton("visit-heatmap-delta")
+def visit_heatmap_delta():
+    fig = visit_heatmap()
+    fig.update_traces(
+        colorscale=DELTA_COLORSCALE,
+        zmid=0,
+        hovertemplate="Hour: %{x}<br>Weekday: %{y}<br>Change: %{z:+}<br>"
+        "Selected period: %{customdata[0]}<br>Prior period: %{customdata[1]}",
+    )
+    fig.update_layout(title=title("Change in Visitation Traffic from the Prior Period"))
+    return fig
+
+
+@skeleton("visit-line")
+def visit_line():
+    fig = px.line(
+        pd.DataFrame(
+            {"start_date": pd.to_datetime(["2024-01-01"]), "visitation_count": [1]}
+        ),
+        x="start_date",
+        y="visitation_count",
+        labels={"start_date": "Date", "visitation_count": "Total Visitations"},
+        color_discrete_sequence=["green"],
+    )
+    fig.update_layout(
+        **TRANSPARENT,
+        xaxis_title="Date",
+        yaxis_title="Total Visitations",
+        title=title("Visitation Volume Over Time"),
+    )
+    return fig
+
+
+# Human resources -----------------------------------------------------------
+
+
+@skeleton("qualification-bar")
+def qualification_bar():
+    fig = px.bar(
+        pd.DataFrame({"qualification": ["OND"], "counts": [1]}),
+        x="counts",
+        y="qualification",
+        labels={"counts": "Employee Count", "qualification": "Qualification"},
+        orientation="h",
+        color_discrete_sequence=["#18a145"],
+    )
+    fig.update_traces(
+        hovertemplate="<b>Qualification:</b> %{y}<br><b>Counts:</b> %{x}<extra></extra>"
+    )
+    fig.update_layout(
+        **TRANSPARENT,
+        showlegend=True,
+        title=title("Employee Counts by Qualification"),
+    )
+    return fig
+
+
+@skeleton("hr-age-bar")
+def hr_age_bar():
+    age_group = pd.Categorical(HR_AGE_GROUPS[:1], categories=HR_AGE_GROUPS)
+    fig = px.bar(
+        pd.DataFrame({"age_group": age_group, "counts": [1]}),
+        x="age_group",
+        y="counts",
+        labels={"counts": "Employee Count", "age_group": "Age Group"},
+        color="age_group",
+        color_discrete_map=HR_AGE_COLORS,
+    )
+    fig.update_traces(
+        hovertemplate="<b>Age Group:</b> %{x}<br><b>Counts:</b> %{y}<extra></extra>"
+    )
+    fig.update_layout(
+        **TRANSPARENT,
+        showlegend=False,
+        title=title("Employee Distribution by Age Group"),
+    )
+    return fig
+
+
+@skeleton("cadre-pie")
+def cadre_pie():
+    fig = px.pie(
+        pd.DataFrame({"cadre": ["Nurse"], "percentage": [100.0]}),
+        names="cadre",
+        values="percentage",
+        labels={"percentage": "Percentage"},
+        color_discrete_sequence=GREENS,
+    )
+    fig.update_traces(
+        hovertemplate="<b>Cadre: </b> %{label}<br><b>Percentage: </b> %{percent:.2%}<extra></extra>"
+    )
+    fig.update_layout(
+        **TRANSPARENT,
+        showlegend=False,
+        title=title("Top 10 Percentage Distribution by Cadre"),
+    )
+    return fig
+
+
+@skeleton("employment-pie")
+def employment_pie():
+    fig = px.pie(
+        pd.DataFrame({"employment_type": ["Permanent"], "percentage": [100.0]}),
+        names="employment_type",
+        values="percentage",
+        labels={"percentage": "Percentage"},
+        color_discrete_sequence=GREENS[:4],
+    )
+    fig.update_traces(
+        hovertemplate="<b>Employment Type: </b> %{label}<br><b>Percentage: </b> %{percent:.2%}<extra></extra>"
+    )
+    fig.update_layout(
+        **TRANSPARENT,
+        showlegend=False,
+        title=title("Employee Percentage Count by Employment Type"),
+    )
+    return fig
+
+
+@skeleton("cadre-treemap")
+def cadre_treemap():
+    fig = px.treemap(
+        pd.DataFrame(
+            {
+                "cadre": ["Nurse"],
+                "Total No. of Health Workers": [1],
+                "% Distribution": [100.0],
+            }
+        ),
+        path=["cadre"],
+        values="Total No. of Health Workers",
+        color="% Distribution",
+        color_continuous_scale="BuGn",
+    )
+    fig.update_layout(
+        plot_bgcolor="white",
+        paper_bgcolor="white",
+        title=title("% Distribution of Health Workers by Cadre (Top 10)"),
+    )
+    fig.update_traces(
+        hovertemplate="<b>%{label}</b><br>Total Workers: %{value}<br>% Distribution: %{color:.2f}%<extra></extra>"
+    )
+    return fig
+
+
+# Attendance ----------------------------------------------------------------
+
+
+@skeleton("attendance-line")
+def attendance_line():
+    return px.line(
+        pd.DataFrame({"date": pd.to_datetime(["2024-01-01"]), "employee_count": [1]}),
+        x="date",
+        y="employee_count",
+        title="Employee Count Over Time",
+    )
+
+
+@skeleton("attendance-heatmap")
+def attendance_heatmap():
+    return px.imshow(
+        pd.DataFrame([[1] * len(WEEKDAYS)], columns=WEEKDAYS),
+        labels=dict(x="Weekday", y="Hour of Day", color="Employee Count"),
+        x=WEEKDAYS,
+        y=[0],
+        title="Employee Count Heatmap (Hour vs Weekday)",
+        aspect="auto",
+        color_continuous_scale=HEAT_COLORSCALE,
+    )
+
+
+@skeleton("attendance-heatmap-delta")
+def attendance_heatmap_delta():
+    fig = px.imshow(
+        pd.DataFrame([[0] * len(WEEKDAYS)], columns=WEEKDAYS),
+        labels=dict(x="Weekday", y="Hour of Day", color="Change"),
+        x=WEEKDAYS,
+        y=[0],
+        title="Change in Employee Count from the Prior Period (Hour vs Weekday)",
+        aspect="auto",
+        color_continuous_scale=DELTA_COLORSCALE,
+        color_continuous_midpoint=0,
+    )
+    fig.update_traces(
+        hovertemplate="Weekday: %{x}<br>Hour of Day: %{y}<br>Change: %{z:+}<br>"
+        "Selected period: %{customdata[0]}<br>Prior period: %{customdata[1]}"
+        "<extra></extra>"
+    )
+    return fig
+
+
+@skeleton("punctuality-bar")
+def punctuality_bar():
+    fig = px.bar(
+        pd.DataFrame(
+            {
+                "late_rate": [0.5],
+                "y": ["1"],
+                "late_days": [1],
+                "days_present": [2],
+                "mean_offset_minutes": [0.0],
+            }
+        ),
+        x="late_rate",
+        y="y",
+        orientation="h",
+        custom_data=["late_days", "days_present", "mean_offset_minutes"],
+        labels={"late_rate": "Share of Days Late", "y": "Employee"},
+        color_discrete_sequence=["#18a145"],
+    )
+    fig.update_traces(
+        hovertemplate="<b>%{y}</b><br>Late %{customdata[0]} of "
+        "%{customdata[1]} days<br>Mean clock-in offset: "
+        "%{customdata[2]:.0f} min<extra></extra>"
+    )
+    fig.update_layout(**TRANSPARENT, xaxis_tickformat=".0%")
+    return fig
+
+
+@skeleton("absence-bar")
+def absence_bar():
+    fig = px.bar(
+        pd.DataFrame(
+            {
+                "facility": ["PHC"],
+                "absence_rate": [0.5],
+                "staff": [1],
+                "enrolled": [1],
+                "gap_days": [1],
+                "working_days": [1],
+            }
+        ),
+        x="facility",
+        y="absence_rate",
+        custom_data=["staff", "enrolled", "gap_days", "working_days"],
+        labels={"absence_rate": "Absence Rate", "facility": "Facility"},
+        color_discrete_sequence=["#18a145"],
+    )
+    fig.update_traces(
+        hovertemplate="<b>%{x}</b><br>Absence rate: %{y:.0%}<br>"
+        "Staff: %{customdata[0]} (%{customdata[1]} clocking in)<br>"
+        "Under-staffed on %{customdata[2]} of %{customdata[3]} working days"
+        "<extra></extra>"
+    )
+    fig.update_layout(
+        **TRANSPARENT,
+        yaxis_tickformat=".0%",
+        title=title("Absence Rate by Facility"),
+    )
+    return fig
+
+
+@skeleton("streaks-bar")
+def streaks_bar():
+    fig = px.bar(
+        pd.DataFrame(
+            {
+                "current_streak": [1],
+                "y": ["1"],
+                "facility": ["PHC"],
+                "longest_streak": [1],
+                "absence_rate": [0.5],
+            }
+        ),
+        x="current_streak",
+        y="y",
+        orientation="h",
+        custom_data=["facility", "longest_streak", "absence_rate"],
+        labels={"current_streak": "Working Days Absent", "y": "Employee"},
+        color_discrete_sequence=["#18a145"],
+    )
+    fig.update_traces(
+        hovertemplate="<b>%{y}</b> (%{customdata[0]})<br>Absent for the last "
+        "%{x} working days<br>Longest absence: %{customdata[1]} days<br>"
+        "Absence rate: %{customdata[2]:.0%}<extra></extra>"
+    )
+    fig.update_layout(**TRANSPARENT, title=title("Current Absence Streaks"))
+    return fig
+
+
+# Home ----------------------------------------------------------------------
+
+
+@skeleton("home-gender-pie")
+def home_gender_pie():
+    fig = px.pie(
+        values=[1, 1],
+        names=["Male", "Female"],
+        color_discrete_sequence=["#062d14", "#18a145"],
+    )
+    fig.update_traces(
+        hovertemplate="<b>Gender: </b> %{label}<br><b>Count: </b> %{value}<br>"
+        "<b>Percentage: </b> %{percent:.2%}<extra></extra>"
+    )
+    fig.update_layout(
+        **TRANSPARENT,
+        showlegend=True,
+        legend_title_text="Gender",
+        title=title("Patients by Gender"),
+    )
+    return fig
+
+
+@skeleton("home-age-bar")
+def home_age_bar():
+    fig = px.bar(
+        x=VISIT_AGE_GROUPS[:1],
+        y=[1],
+        color=VISIT_AGE_GROUPS[:1],
+        color_discrete_map=VISIT_AGE_COLORS,
+        labels={"x": "", "y": "Count"},
+    )
+    fig.update_traces(
+        hovertemplate="<b>Age Group: </b> %{x} <br><b>Patient Count: </b> %{y} <br>"
+    )
+    fig.update_layout(
+        **TRANSPARENT, showlegend=False, title=title("Patient by Age Group")
+    )
+    return fig
+
+
+@skeleton("home-marital-bar")
+def home_marital_bar():
+    fig = px.bar(
+        x=list(MARITAL_COLORS)[:1],
+        y=[1],
+        color=list(MARITAL_COLORS)[:1],
+        color_discrete_map=MARITAL_COLORS,
+        labels={"x": "", "y": "Count"},
+    )
+    fig.update_traces(
+        hovertemplate="<b>Status:</b> %{x}<br><b>Count:</b> %{y}<extra></extra>"
+    )
+    fig.update_layout(
+        **TRANSPARENT, showlegend=False, title=title("Patients by Marital Status")
+    )
+    return fig
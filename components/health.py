@@ -0,0 +1,182 @@
+"""Liveness and readiness endpoints for load balancers and orchestrators.
+
+GET /healthz answers 200 for as long as the worker serves requests at
+all; it reads nothing else. GET /readyz answers 200 only once the
+worker's data is loaded and a warm-up (see warmup.py) ran to its end,
+and 503 before, so a proxy or orchestrator routing on it never sends a
+user to a worker that would load or compute on their request. A worker
+found not ready starts loading (and warming) in the background, if
+nothing has yet or the last warm-up failed. Both are answered ahead of
+Dash's own request handling, and with a JSON report:
+
+- /healthz: the process id, uptime and data version;
+- /readyz: also each dataset's load state, rows and memory, the indexes
+  and running totals built for the data, the process's memory (see
+  memory.py) and the warm-up's progress and coverage.
+"""
+
+import os
+import threading
+import time
+
+from flask import jsonify, request
+
+from components import bitmaps, datastore, kpis, partitions, warmup
+from components.memory import process_memory
+
+# When the app was loaded (in the gunicorn master, when it preloads)
+STARTED = time.time()
+
+# Snapshot frames, as reported
+FRAMES = (
+    "facilities_df",
+    "wards_df",
+    "lgas_df",
+    "states_df",
+    "visit_counts_df",
+    "merged_hr_data",
+    "patients_df",
+)
+
+# Tables of the SQL backends (see query.build_database)
+ENGINE_TABLES = ("patients", "visitations", "timecard")
+
+# (snapshot key, dataset report) of the latest snapshot reported
+_datasets = (None, None)
+
+_loader = None
+_loader_lock = threading.Lock()
+
+
+def _frame_status(frame, engine):
+    if frame is None:
+        # Its rows are in the database when there is one
+        return {"state": "in database" if engine is not None else "not loaded"}
+    return {
+        "state": "loaded",
+        "rows": len(frame),
+        "bytes": int(frame.memory_usage(deep=True).sum()),
+    }
+
+
+def dataset_status(snapshot):
+    """Load state, rows and bytes of each dataset of a snapshot.
+
+    Computed once per snapshot: sizing the frames reads every string.
+    """
+    global _datasets
+    key = (snapshot.version, snapshot.built_at)
+    cached_key, datasets = _datasets
+    if cached_key == key:
+        return datasets
+
+    datasets = {
+        name: _frame_status(getattr(snapshot, name), snapshot.engine) for name in FRAMES
+    }
+    clockins = snapshot.clockins
+    if clockins is None and snapshot.engine is None and partitions.PARTITION_DIR:
+        # Read from the partitions a query selects (see query.clockins_within)
+        datasets["clockins"] = {"state": "in partitions"}
+    elif clockins is None:
+        datasets["clockins"] = _frame_status(None, snapshot.engine)
+    else:
+        days, employees = clockins.seconds.shape
+        datasets["clockins"] = {
+            "state": "loaded",
+            "rows": days,
+            "employees": employees,
+            "bytes": sum(
+                array.nbytes
+                for array in (
+                    clockins.seconds,
+                    clockins.employee_ids,
+                    clockins.department_codes,
+                )
+            ),
+        }
+    engine = snapshot.engine
+    if engine is not None:
+        datasets["database"] = {
+            "state": "loaded",
+            "backend": engine.backend,
+            "rows": {
+                table: int(engine.query(f"SELECT COUNT(*) AS n FROM {table}")["n"][0])
+                for table in ENGINE_TABLES
+            },
+            "bytes": os.path.getsize(engine.path),
+        }
+    # One tuple, so readers never pair a key with another report
+    _datasets = (key, datasets)
+    return datasets
+
+
+def _load():
+    """Load the data, and warm up, in the background, once."""
+    global _loader
+    if warmup.enabled():
+        # Loads the data first; a failed warm-up is tried again
+        if warmup.status()["state"] in ("idle", "failed"):
+            warmup.start()
+        return
+    with _loader_lock:
+        if _loader is None:
+            _loader = threading.Thread(
+                target=datastore.current, name="data-load", daemon=True
+            )
+            _loader.start()
+
+
+def liveness():
+    snapshot = datastore.latest()
+    return {
+        "status": "alive",
+        "pid": os.getpid(),
+        "uptime": round(time.time() - STARTED, 1),
+        "version": snapshot.version if snapshot is not None else None,
+    }
+
+
+def readiness():
+    """The readiness report, and whether the worker is ready."""
+    snapshot = datastore.latest()
+    report = liveness()
+    report["memory"] = process_memory()
+    report["warmup"] = warmup.status()
+    if snapshot is None:
+        report["status"] = "loading"
+        return report, False
+
+    report["built_at"] = snapshot.built_at
+    report["datasets"] = dataset_status(snapshot)
+    report["indexes"] = bitmaps.built(snapshot) + kpis.built(snapshot)
+    ready = warmup.warmed_up()
+    report["status"] = "ready" if ready else "warming up"
+    return report, ready
+
+
+def register_health(server):
+    """GET /healthz (liveness) and /readyz (readiness) on the Flask server."""
+
+    @server.route("/healthz")
+    def healthz():
+        return jsonify(liveness())
+
+    @server.route("/readyz")
+    def readyz():
+        report, ready = readiness()
+        if not ready:
+            _load()
+        return jsonify(report), 200 if ready else 503
+
+    probes = {"/healthz": healthz, "/readyz": readyz}
+
+    def answer_probes():
+        # Ahead of the other before_request hooks: on a worker's first
+        # request Dash's page router builds every page layout, which loads
+        # the data, and a probe would wait for it
+        probe = probes.get(request.path)
+        if probe is not None:
+            return probe()
+
+    server.before_request_funcs.setdefault(None, []).insert(0, answer_probes)
+    return healthz, readyz
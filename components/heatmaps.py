@@ -0,0 +1,107 @@
+"""Weekday x hour histograms behind the visitation and attendance heatmaps.
+
+Weekdays (0 is Monday) and hours are kept as small integer codes, so a
+histogram is a single np.bincount over the cell codes weekday * 24 + hour
+into a 7 x 24 matrix: no grouping on two keys, no pivot and no weekday
+names until the matrix is drawn.
+"""
+
+import numpy as np
+import pandas as pd
+
+WEEKDAYS = [
+    "Monday",
+    "Tuesday",
+    "Wednesday",
+    "Thursday",
+    "Friday",
+    "Saturday",
+    "Sunday",
+]
+
+HOURS = 24
+CELLS = len(WEEKDAYS) * HOURS
+
+
+def cells(weekdays, hours):
+    """Cell codes (weekday * 24 + hour) of weekday and hour codes."""
+    return np.asarray(weekdays, dtype=np.int64) * HOURS + np.asarray(
+        hours, dtype=np.int64
+    )
+
+
+def _grouped(codes, groups, *columns):
+    """Cell codes offset by each row's group (see weekday_hour), and the
+    columns, of the rows in a group."""
+    if groups is None:
+        return (codes, *columns)
+    groups = np.asarray(groups, dtype=np.int64)
+    kept = groups >= 0
+    return (
+        groups[kept] * CELLS + codes[kept],
+        *(None if column is None else np.asarray(column)[kept] for column in columns),
+    )
+
+
+def weekday_hour(weekdays, hours, weights=None, groups=None, n_groups=1):
+    """Rows (or summed weights) per weekday and hour, as a 7 x 24 matrix.
+
+    With ``groups``, codes 0..n_groups-1 (or -1 to leave a row out), an
+    n_groups x 7 x 24 array of one matrix per group, from the same
+    single bincount.
+    """
+    if weights is not None:
+        weights = np.asarray(weights, dtype=np.float64)
+    codes, weights = _grouped(cells(weekdays, hours), groups, weights)
+    counts = np.bincount(codes, weights=weights, minlength=CELLS * n_groups)
+    counts = np.rint(counts).astype(np.int64)
+    if groups is None:
+        return counts.reshape(len(WEEKDAYS), HOURS)
+    return counts.reshape(n_groups, len(WEEKDAYS), HOURS)
+
+
+def distinct_weekday_hour(weekdays, hours, keys, n_keys, groups=None, n_groups=1):
+    """Distinct keys per weekday and hour, as a 7 x 24 matrix.
+
+    Takes one row per already deduplicated (day, key) pair, e.g. an
+    employee's first clock-in of a day, with keys coded 0..n_keys-1. A key
+    seen on several days at the same weekday and hour counts once.
+    ``groups`` as in weekday_hour.
+    """
+    codes, keys = _grouped(cells(weekdays, hours), groups, keys)
+    seen = np.zeros(CELLS * n_groups * n_keys, dtype=bool)
+    seen[codes * n_keys + np.asarray(keys, dtype=np.int64)] = True
+    counts = np.bincount(
+        np.flatnonzero(seen) // max(n_keys, 1), minlength=CELLS * n_groups
+    )
+    if groups is None:
+        return counts.reshape(len(WEEKDAYS), HOURS)
+    return counts.reshape(n_groups, len(WEEKDAYS), HOURS)
+
+
+def as_frame(matrix):
+    """A 7 x 24 matrix as the heatmaps draw it.
+
+    Weekday names as rows, the hours anything happened at as columns, and
+    NaN (a blank cell) where nothing did.
+    """
+    hours = np.flatnonzero(matrix.any(axis=0))
+    values = matrix[:, hours]
+    if not values.all():
+        # Integers otherwise, which travel as a smaller typed array
+        values = np.where(values > 0, values, np.nan)
+    return pd.DataFrame(values, index=WEEKDAYS, columns=hours)
+
+
+def delta_frame(current, prior):
+    """The change from a prior period's 7 x 24 matrix, as the heatmaps draw
+    it, and the two periods' counts per cell (the hover's customdata).
+
+    As in as_frame, with the hours anything happened at in either period,
+    and NaN where nothing did in both.
+    """
+    hours = np.flatnonzero(current.any(axis=0) | prior.any(axis=0))
+    current, prior = current[:, hours], prior[:, hours]
+    delta = np.where((current > 0) | (prior > 0), current - prior, np.nan)
+    frame = pd.DataFrame(delta, index=WEEKDAYS, columns=hours)
+    return frame, np.stack([current, prior], axis=-1)
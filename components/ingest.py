@@ -0,0 +1,406 @@
+"""Streaming ingestion of the timecard and visitation CSVs.
+
+The CSVs are read CHUNKSIZE rows at a time and every chunk is folded into
+the aggregates the attendance and visitation pages are drawn from, so
+peak memory follows the chunk size and the size of the aggregates (days x
+employees for the timecard, distinct combinations of visit attributes for
+the visitations), not the number of rows in the files. Delta files of
+new rows are folded into existing aggregates the same way.
+"""
+
+import os
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+# Rows read from a CSV at a time
+CHUNKSIZE = int(os.environ.get("THWP_CHUNKSIZE", "100000"))
+
+# ClockIns.seconds value for "no clock-in that day"
+ABSENT = -1
+
+# Visits are counted per combination of these columns
+VISIT_KEYS = [
+    "start_date",
+    "weekday",
+    "hour",
+    "facility_name",
+    "gender",
+    "marital_status",
+    "age_group",
+]
+
+PATIENT_COLUMNS = [
+    "patient_id",
+    "facility_name",
+    "gender",
+    "marital_status",
+    "age_group",
+]
+
+
+# Handle inconsistent time formats
+def parse_hours(time_in):
+    """Hour of each "HH:MM" or "HH:MM:SS" string, NaN if neither parses."""
+    time_in = time_in.astype(str).str.strip()
+    times = pd.to_datetime(time_in, format="%H:%M", errors="coerce")  # Standard case
+    # If seconds are present
+    times = times.fillna(pd.to_datetime(time_in, format="%H:%M:%S", errors="coerce"))
+    return times.dt.hour
+
+
+# Timecard ---------------------------------------------------------------------
+
+
+@dataclass(frozen=True)
+class ClockIns:
+    """First clock-in of every employee on every day of the timecard.
+
+    Row i of ``seconds`` is the day ``first_date + i`` and column j the
+    employee ``employee_ids[j]``; a cell holds the seconds after midnight
+    of that employee's first clock-in that day, or ABSENT.
+    """
+
+    first_date: np.datetime64
+    employee_ids: np.ndarray
+    department_codes: np.ndarray
+    seconds: np.ndarray
+    # The _Buffer seconds is a view of, when it has room to grow
+    buffer: object = field(default=None, repr=False, compare=False)
+
+    def __post_init__(self):
+        # Shared by every request thread of a worker: an in-place write
+        # raises instead of changing the matrix under the other requests
+        for array in (self.employee_ids, self.department_codes, self.seconds):
+            array.flags.writeable = False
+
+    @property
+    def dates(self):
+        return self.first_date + np.arange(len(self.seconds))
+
+    @property
+    def present(self):
+        return self.seconds != ABSENT
+
+    def day_mask(self, start_date=None, end_date=None, year=None):
+        """Rows within [start_date, end_date], or within a year if given."""
+        dates = self.dates
+        if year:
+            return dates.astype("datetime64[Y]").astype(int) + 1970 == int(year)
+        mask = np.ones(len(dates), dtype=bool)
+        if start_date is not None:
+            mask &= dates >= np.datetime64(pd.to_datetime(start_date).date())
+        if end_date is not None:
+            mask &= dates <= np.datetime64(pd.to_datetime(end_date).date())
+        return mask
+
+
+def read_timecard_chunks(path, chunksize=CHUNKSIZE):
+    """Normalized timecard chunks: employee_id, department_code, day, seconds."""
+    for chunk in pd.read_csv(
+        path,
+        usecols=["employee_id", "department_code", "date", "clockin_time"],
+        dtype={"employee_id": str},
+        chunksize=chunksize,
+    ):
+        date = pd.to_datetime(chunk["date"], errors="coerce")
+        clockin = pd.to_datetime(
+            chunk["clockin_time"], format="%H:%M:%S", errors="coerce"
+        )
+        chunk = pd.DataFrame(
+            {
+                "employee_id": chunk["employee_id"],
+                "department_code": chunk["department_code"],
+                "day": date.dt.normalize(),
+                "seconds": (clockin - clockin.dt.normalize()).dt.total_seconds(),
+            }
+        ).dropna(subset=["employee_id", "day", "seconds"])
+        yield chunk.astype({"seconds": "int32"})
+
+
+class _Buffer:
+    """A clock-in matrix with spare rows and columns, shared by the ClockIns
+    of successive refreshes: each is a view of its top left corner, and
+    only the latest (the owner) may grow into the rest."""
+
+    def __init__(self, array):
+        self.array = array
+        self.owner = None
+
+
+def _capacity(needed, capacity):
+    # A quarter (and a week) to spare, so growing by a day or an employee
+    # at a time copies the matrix only now and then
+    return max(capacity, needed + max(needed // 4, 7))
+
+
+class TimecardAggregator:
+    """Folds timecard chunks into a growing days x employees matrix.
+
+    Folded into existing ClockIns, the new days and employees are added in
+    the spare room of their buffer (see _Buffer) when it has some and no
+    other ClockIns claimed it: cells the given ClockIns sees are never
+    written, so it stays valid, and only a fold that changes one of them
+    (or adds an earlier day) copies the matrix.
+    """
+
+    def __init__(self, clockins=None):
+        # Rows and columns of the matrix other ClockIns see, not to write
+        self._shared = (0, 0)
+        self._buffer = None
+        self._fresh = clockins is None
+        if clockins is None:
+            self.first_date = None
+            self.employee_ids = []
+            self.department_codes = []
+            self._seconds = np.full((0, 0), ABSENT, dtype=np.int32)
+        else:
+            self.first_date = clockins.first_date
+            self.employee_ids = list(clockins.employee_ids)
+            self.department_codes = list(clockins.department_codes)
+            self._shared = clockins.seconds.shape
+            buffer = clockins.buffer
+            if buffer is not None and buffer.owner is clockins.seconds:
+                # Claimed before any write: a fold that fails halfway
+                # leaves the spare room to no one rather than dirty
+                buffer.owner = None
+                self._buffer = buffer
+                self._seconds = buffer.array
+            else:
+                # Read-only, copied on the first write
+                self._seconds = clockins.seconds
+        self._days = self._shared[0]
+        self._columns = {id_: j for j, id_ in enumerate(self.employee_ids)}
+
+    def _own(self, days, employees):
+        """Copy the matrix into a buffer of this fold's own, with room for
+        days x employees."""
+        capacity_days, capacity_employees = self._seconds.shape
+        grown = np.full(
+            (
+                _capacity(days, capacity_days),
+                _capacity(employees, capacity_employees),
+            ),
+            ABSENT,
+            dtype=np.int32,
+        )
+        grown[:capacity_days, :capacity_employees] = self._seconds
+        self._seconds = grown
+        self._buffer = _Buffer(grown)
+        self._shared = (0, 0)
+
+    def _reserve(self, days, employees):
+        capacity_days, capacity_employees = self._seconds.shape
+        if (
+            self._buffer is None
+            or days > capacity_days
+            or employees > capacity_employees
+        ):
+            self._own(days, employees)
+
+    def _rows(self, days):
+        first, last = days.min(), days.max()
+        if self.first_date is None:
+            self.first_date = first
+        elif first < self.first_date:
+            # An earlier day than any seen so far: shift the rows down
+            shift = int((self.first_date - first) // np.timedelta64(1, "D"))
+            self._own(self._days + shift, len(self.employee_ids))
+            self._seconds[shift : shift + self._days] = self._seconds[
+                : self._days
+            ].copy()
+            self._seconds[:shift] = ABSENT
+            self._days += shift
+            self.first_date = first
+        rows = ((days - self.first_date) // np.timedelta64(1, "D")).astype(np.int64)
+        self._days = max(
+            self._days, int((last - self.first_date) // np.timedelta64(1, "D")) + 1
+        )
+        return rows
+
+    def _columns_of(self, employee_ids, department_codes):
+        for id_, code in zip(employee_ids, department_codes):
+            j = self._columns.get(id_)
+            if j is None:
+                self._columns[id_] = len(self.employee_ids)
+                self.employee_ids.append(id_)
+                self.department_codes.append(code)
+            else:
+                # The latest department an employee clocked in under
+                self.department_codes[j] = code
+        return np.array([self._columns[id_] for id_ in employee_ids], dtype=np.int64)
+
+    def add(self, chunk):
+        """Fold one normalized chunk (see read_timecard_chunks) in place."""
+        if chunk.empty:
+            return
+        # Employee ids are looked up once per distinct id, not once per row
+        codes, uniques = pd.factorize(chunk["employee_id"])
+        last_codes = chunk.groupby(codes)["department_code"].last().to_numpy()
+        columns = self._columns_of(list(uniques), last_codes)[codes]
+        rows = self._rows(chunk["day"].to_numpy().astype("datetime64[D]"))
+        self._reserve(self._days, len(self.employee_ids))
+        shared_days, shared_employees = self._shared
+        if np.any((rows < shared_days) & (columns < shared_employees)):
+            # A clock-in on a day and employee the given ClockIns has
+            self._own(self._days, len(self.employee_ids))
+
+        # The earliest clock-in wins when an employee clocks in twice a day
+        seconds = chunk["seconds"].to_numpy()
+        current = self._seconds[rows, columns]
+        new = np.where(current == ABSENT, seconds, np.minimum(current, seconds))
+        order = np.lexsort((-new, rows, columns))
+        self._seconds[rows[order], columns[order]] = new[order]
+
+    def freeze(self):
+        """The ClockIns folded so far. Built from scratch they are trimmed
+        to size; folded into earlier ClockIns they keep the spare room for
+        the next fold."""
+        employees = len(self.employee_ids)
+        seconds = self._seconds[: self._days, :employees]
+        buffer = self._buffer
+        if self._fresh:
+            seconds, buffer = seconds.copy(), None
+        clockins = ClockIns(
+            first_date=(
+                self.first_date
+                if self.first_date is not None
+                else np.datetime64("NaT", "D")
+            ),
+            employee_ids=np.array(self.employee_ids, dtype=object),
+            department_codes=np.array(self.department_codes),
+            seconds=seconds,
+            buffer=buffer,
+        )
+        if buffer is not None:
+            buffer.owner = clockins.seconds
+        return clockins
+
+
+def fold_timecard(chunks, clockins=None):
+    """ClockIns with the chunks folded in. Folding a row twice is harmless:
+    the earliest clock-in of a day wins either way."""
+    aggregator = TimecardAggregator(clockins)
+    for chunk in chunks:
+        aggregator.add(chunk)
+    return aggregator.freeze()
+
+
+def stream_timecard(path, chunksize=CHUNKSIZE):
+    return fold_timecard(read_timecard_chunks(path, chunksize))
+
+
+# Visitation -------------------------------------------------------------------
+
+
+def read_visit_chunks(path, patients_df, chunksize=CHUNKSIZE):
+    """Visitation chunks joined to the patient attributes, with visit hours."""
+    for chunk in pd.read_csv(
+        path, usecols=["patient_id", "start_date", "time_in"], chunksize=chunksize
+    ):
+        chunk = chunk.merge(patients_df, on="patient_id", how="inner")
+        chunk["start_date"] = pd.to_datetime(chunk["start_date"])
+        chunk["weekday"] = chunk["start_date"].dt.weekday
+        chunk["hour"] = parse_hours(chunk["time_in"])
+        # Drop visits without a usable time
+        yield chunk.dropna(subset=["hour"]).astype({"hour": "int64"})
+
+
+def _combine(parts):
+    return pd.concat(parts).groupby(level=VISIT_KEYS, dropna=False).sum()
+
+
+def count_visits(chunks, limit=CHUNKSIZE):
+    """Visit counts per VISIT_KEYS combination, folded chunk by chunk."""
+    parts, rows = [], 0
+    for chunk in chunks:
+        part = chunk.groupby(VISIT_KEYS, dropna=False).size().rename("count")
+        parts.append(part)
+        rows += len(part)
+        if rows > limit:
+            # Collapse the partial counts to keep their size bounded
+            parts = [_combine(parts)]
+            rows = len(parts[0])
+    if not parts:
+        return pd.DataFrame(columns=VISIT_KEYS + ["count"])
+    return _combine(parts).reset_index()
+
+
+def read_patients(path):
+    # Patients are the dimension table: one row per patient, read whole
+    return pd.read_csv(path, usecols=PATIENT_COLUMNS)
+
+
+def stream_visitation(patients_df, visitations_path, chunksize=CHUNKSIZE):
+    return count_visits(
+        read_visit_chunks(visitations_path, patients_df, chunksize), chunksize
+    )
+
+
+# Deltas -----------------------------------------------------------------------
+
+# New rows arrive as "<dataset>-<anything>.csv" files with the columns of
+# the matching cleaned CSV, e.g. timecard-2025-01-09.csv. Files are only
+# ever added; they apply in name order, patients before the visits that
+# reference them.
+DELTA_DATASETS = ("patients", "visitations", "timecard")
+
+
+def delta_files(delta_dir):
+    """(name, mtime, size) of every delta CSV, in the order they apply."""
+    try:
+        entries = list(os.scandir(delta_dir))
+    except FileNotFoundError:
+        return ()
+    files = [
+        (entry.name, entry.stat().st_mtime_ns, entry.stat().st_size)
+        for entry in entries
+        if entry.is_file()
+        and entry.name.endswith(".csv")
+        and entry.name.split("-", 1)[0] in DELTA_DATASETS
+    ]
+    order = {dataset: i for i, dataset in enumerate(DELTA_DATASETS)}
+    return tuple(sorted(files, key=lambda f: (order[f[0].split("-", 1)[0]], f[0])))
+
+
+def delta_paths(delta_dir, files, dataset):
+    return [
+        os.path.join(delta_dir, name)
+        for name, _, _ in files
+        if name.split("-", 1)[0] == dataset
+    ]
+
+
+def append_patients(patients_df, paths):
+    """The patients table with the delta patients added (latest row wins)."""
+    if not paths:
+        return patients_df
+    new = pd.concat([read_patients(path) for path in paths])
+    known = patients_df["patient_id"].isin(new["patient_id"])
+    return pd.concat(
+        [patients_df[~known], new.drop_duplicates("patient_id", keep="last")]
+    )
+
+
+def append_visits(visit_counts_df, patients_df, paths):
+    """Visit counts with the delta visits added.
+
+    The delta is counted on its own and appended; rows may then repeat a
+    key of an earlier row, which is harmless because every reader sums
+    the counts.
+    """
+    if not paths:
+        return visit_counts_df
+    delta = count_visits(
+        chunk for path in paths for chunk in read_visit_chunks(path, patients_df)
+    )
+    return pd.concat([visit_counts_df, delta], ignore_index=True)
+
+
+def append_timecard(clockins, paths):
+    if not paths:
+        return clockins
+    return fold_timecard(
+        (chunk for path in paths for chunk in read_timecard_chunks(path)), clockins
+    )
@@ -0,0 +1,230 @@
+"""Date-range totals behind the KPI cards, from per-facility prefix sums.
+
+The daily visits, attendees and late arrivals of every facility are
+accumulated once per data snapshot into (days + 1) x facilities arrays of
+running totals, so the total of any facilities between two dates is
+cumulative[end + 1] - cumulative[start]: two lookups per facility however
+long the range, instead of a scan of the facts on every filter change.
+"""
+
+import threading
+from dataclasses import dataclass
+
+import dash_bootstrap_components as dbc
+import numpy as np
+import pandas as pd
+from dash import html
+
+from components import query
+
+
+@dataclass(frozen=True)
+class PrefixSums:
+    """Running totals of a daily count per facility.
+
+    Row i of ``cumulative`` holds each facility's total over the days
+    before ``first_date + i``, and ``active`` the number of those days
+    with any count at all.
+    """
+
+    first_date: np.datetime64
+    facilities: pd.Index
+    cumulative: np.ndarray
+    active: np.ndarray
+
+    @property
+    def days(self):
+        return len(self.cumulative) - 1
+
+    def rows(self, start_date=None, end_date=None, year=None):
+        """Rows bounding [start_date, end_date], or a year if given.
+
+        Either date may be left open, as in ClockIns.day_mask.
+        """
+        if year:
+            start_date, end_date = f"{int(year)}-01-01", f"{int(year)}-12-31"
+
+        def row(date, default, after):
+            date = pd.to_datetime(date)
+            if pd.isna(date):
+                return default
+            offset = (np.datetime64(date.date()) - self.first_date).astype(int)
+            return int(np.clip(offset + after, 0, self.days))
+
+        first, last = row(start_date, 0, 0), row(end_date, self.days, 1)
+        return first, max(first, last)
+
+    def totals(self, facilities=None, start_date=None, end_date=None, year=None):
+        """Total of each selected facility (every one without a selection)."""
+        first, last = self.rows(start_date, end_date, year)
+        columns = slice(None)
+        if facilities:
+            columns = self.facilities.get_indexer(facilities)
+            columns = columns[columns >= 0]
+        return self.cumulative[last, columns] - self.cumulative[first, columns]
+
+    def total(self, facilities=None, start_date=None, end_date=None, year=None):
+        return int(self.totals(facilities, start_date, end_date, year).sum())
+
+    def active_days(self, start_date=None, end_date=None, year=None):
+        """Days of the range with any count, at any facility."""
+        first, last = self.rows(start_date, end_date, year)
+        return int(self.active[last] - self.active[first])
+
+
+def prefix_sums(dates, facilities, counts):
+    """PrefixSums of daily counts given as (date, facility, count) rows."""
+    days = pd.to_datetime(dates).to_numpy().astype("datetime64[D]")
+    codes, names = pd.factorize(np.asarray(facilities), use_na_sentinel=False)
+    if not len(days):
+        return PrefixSums(
+            np.datetime64("NaT", "D"),
+            pd.Index(names),
+            np.zeros((1, len(names)), dtype=np.int64),
+            np.zeros(1, dtype=np.int64),
+        )
+    first = days.min()
+    n_days = (days.max() - first).astype(int) + 1
+    daily = np.bincount(
+        (days - first).astype(np.int64) * len(names) + codes,
+        weights=np.asarray(counts, dtype=np.float64),
+        minlength=n_days * len(names),
+    )
+    daily = np.rint(daily).astype(np.int64).reshape(n_days, len(names))
+    # A leading row of zeros: the totals before the first day
+    cumulative = np.zeros((n_days + 1, len(names)), dtype=np.int64)
+    np.cumsum(daily, axis=0, out=cumulative[1:])
+    active = np.concatenate([[0], np.cumsum(daily.any(axis=1))])
+    # Shared by every request thread: read-only, like the clock-in matrix
+    cumulative.flags.writeable = active.flags.writeable = False
+    return PrefixSums(first, pd.Index(names), cumulative, active)
+
+
+@dataclass(frozen=True)
+class AttendanceSums:
+    attendees: PrefixSums
+    late: PrefixSums
+
+
+def build_visit_sums(snapshot):
+    visits = query.visits_per_facility_day(snapshot)
+    return prefix_sums(visits["start_date"], visits["facility_name"], visits["count"])
+
+
+def build_attendance_sums(snapshot):
+    attendance = query.attendance_per_facility_day(snapshot)
+    return AttendanceSums(
+        attendees=prefix_sums(
+            attendance["date"], attendance["facility"], attendance["attendees"]
+        ),
+        late=prefix_sums(
+            attendance["date"], attendance["facility"], attendance["late"]
+        ),
+    )
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _cached(build, snapshot):
+    """build(snapshot), computed once per snapshot and state."""
+    slot, key = (build, snapshot.state), (snapshot.version, snapshot.built_at)
+    cached_key, value = _cache.get(slot, (None, None))
+    if cached_key != key:
+        with _cache_lock:
+            cached_key, value = _cache.get(slot, (None, None))
+            if cached_key != key:
+                value = build(snapshot)
+                # One tuple, so readers never pair a key with another value
+                _cache[slot] = (key, value)
+    return value
+
+
+def built(snapshot):
+    """Names of the running totals already built for a snapshot."""
+    key = (snapshot.version, snapshot.built_at)
+    return sorted(
+        build.__name__.removeprefix("build_")
+        for (build, state), (cached_key, _) in list(_cache.items())
+        if state == snapshot.state and cached_key == key
+    )
+
+
+def visit_sums(snapshot):
+    """PrefixSums of the snapshot's visits per facility."""
+    return _cached(build_visit_sums, snapshot)
+
+
+def attendance_sums(snapshot):
+    """PrefixSums of the snapshot's attendees and late arrivals per facility."""
+    return _cached(build_attendance_sums, snapshot)
+
+
+def visit_kpis(snapshot, facilities, start_date, end_date, attributes=None):
+    """Visits, average visits per day and facilities visited in a range.
+
+    The running totals are per facility only: with patient attribute
+    filters (see query.filter_visits) the visits are counted by query.
+    """
+    sums = visit_sums(snapshot)
+    if attributes and any(attributes.values()):
+        totals = query.visit_counts(
+            snapshot, "facility_name", facilities, start_date, end_date, attributes
+        ).to_numpy()
+    else:
+        totals = sums.totals(facilities, start_date, end_date)
+    days = sums.active_days(start_date, end_date)
+    return {
+        "visits": int(totals.sum()),
+        "daily_visits": totals.sum() / days if days else 0.0,
+        "facilities": int((totals > 0).sum()),
+    }
+
+
+def attendance_kpis(snapshot, year, start_date, end_date):
+    """Clock-ins, average daily attendees and late arrivals in a range.
+
+    An employee's first clock-in of a day is the one kept, so clock-ins
+    are attendee days; a selected year replaces the date range.
+    """
+    sums = attendance_sums(snapshot)
+    clockins = sums.attendees.total(None, start_date, end_date, year)
+    late = sums.late.total(None, start_date, end_date, year)
+    days = sums.attendees.active_days(start_date, end_date, year)
+    return {
+        "clockins": clockins,
+        "daily_attendees": clockins / days if days else 0.0,
+        "late": late,
+        "late_rate": late / clockins if clockins else 0.0,
+    }
+
+
+def change(values, prior, key):
+    """A KPI's change from the prior period's values (see periods.py), as
+    the cards show it after the value; empty when not comparing."""
+    if prior is None or not prior[key]:
+        return ""
+    return f" ({(values[key] - prior[key]) / prior[key]:+.0%} vs prior)"
+
+
+def card(label, value_id):
+    """A KPI card in the style of the home page indicators; the callbacks
+    fill in the value_id span."""
+    return dbc.Col(
+        dbc.Card(
+            dbc.CardBody(
+                html.H6(
+                    [f"{label}: ", html.Span(id=value_id, style={"color": "orange"})],
+                    className="card-title",
+                )
+            ),
+            className="card text-white bg-success mb-2",
+            style={
+                "height": "50px",
+                "border": "2px solid green",
+                "box-shadow": "2px 2px 10px rgba(0, 0, 0, 0.1)",
+            },
+        ),
+        width=3,
+    )
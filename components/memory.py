@@ -0,0 +1,37 @@
+import resource
+
+
+def process_memory(pid="self"):
+    """RSS, PSS and USS of a process in bytes.
+
+    PSS splits pages shared with other processes (e.g. copy-on-write pages
+    inherited from the gunicorn master) between them, and USS counts only
+    the pages private to this process, so together they show how much of a
+    worker's RSS is really its own. Outside Linux only the peak RSS of the
+    current process is available.
+    """
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as smaps:
+            fields = {}
+            for line in smaps:
+                key, _, value = line.partition(":")
+                parts = value.split()
+                if len(parts) == 2 and parts[1] == "kB":
+                    fields[key] = int(parts[0]) * 1024
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        return {"rss": peak, "pss": None, "uss": None}
+
+    return {
+        "rss": fields.get("Rss"),
+        "pss": fields.get("Pss"),
+        "uss": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def format_memory(memory):
+    return " ".join(
+        f"{key}={value / 2**20:.1f}MB"
+        for key, value in memory.items()
+        if value is not None
+    )
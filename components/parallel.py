@@ -0,0 +1,70 @@
+"""A bounded thread pool for the figures of multi-output callbacks.
+
+The visitation charts callback builds three charts, and the attendance
+one two, from independent aggregates. ``run`` computes such parts
+concurrently on a small shared pool: the SQL engines, and much of what
+pandas and NumPy do, run without the GIL, so on a multi-core worker the
+callback takes about as long as its slowest chart instead of their sum.
+
+The pool has THWP_FIGURE_THREADS threads (default: up to 4, one per
+core); 1 turns it off and every part runs in the callback's own thread.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+FIGURE_THREADS = int(os.environ.get("THWP_FIGURE_THREADS", min(4, os.cpu_count() or 1)))
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_in_pool = threading.local()
+
+
+def _mark_worker():
+    _in_pool.active = True
+
+
+def pool():
+    """The process's pool, or None when parts should run in the caller."""
+    global _pool, _pool_pid
+    if FIGURE_THREADS <= 1:
+        return None
+    # A background job is a fork: the parent's threads did not come along
+    if _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool_pid != os.getpid():
+                _pool = ThreadPoolExecutor(
+                    FIGURE_THREADS,
+                    thread_name_prefix="figures",
+                    initializer=_mark_worker,
+                )
+                _pool_pid = os.getpid()
+    return _pool
+
+
+def run(*parts, done=None):
+    """Call every part (a function of no arguments), return their results
+    in order.
+
+    done(n) is called in the caller's thread as the n-th part finishes,
+    e.g. to report progress. A part running on the pool that calls run
+    itself gets its parts run in its own thread, so the pool never waits
+    on itself.
+    """
+    executor = pool()
+    if executor is None or len(parts) < 2 or getattr(_in_pool, "active", False):
+        results = []
+        for part in parts:
+            results.append(part())
+            if done is not None:
+                done(len(results))
+        return results
+    futures = {executor.submit(part): i for i, part in enumerate(parts)}
+    results = [None] * len(parts)
+    for finished, future in enumerate(as_completed(futures), 1):
+        results[futures[future]] = future.result()
+        if done is not None:
+            done(finished)
+    return results
@@ -0,0 +1,246 @@
+"""Year/month partitioned Parquet copies of the timecard and payroll facts.
+
+    <root>/timecard/year=2024/month=3[/department_code=15]/part-00000.parquet
+    <root>/timecard/_catalog.json
+
+The catalog lists every partition with its key values, row count and
+date range, so a query for March 2024 opens that month's files only
+(partition pruning) instead of parsing the whole CSV. Partitions are
+written a chunk at a time from the cleaned CSVs and rewritten when a CSV
+changes; timecard deltas are appended as extra part files.
+
+    python -m components.partitions [--by department_code]
+"""
+
+import argparse
+import fcntl
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from components import ingest
+
+logger = logging.getLogger(__name__)
+
+# Partitioning is off unless this is set (e.g. data/partitions)
+PARTITION_DIR = os.environ.get("THWP_PARTITION_DIR")
+
+# Extra partition key for the timecard after year and month, e.g.
+# department_code; the payroll has no department or facility column
+TIMECARD_PARTITION_BY = os.environ.get("THWP_TIMECARD_PARTITION_BY") or None
+
+CATALOG = "_catalog.json"
+
+
+def _payroll_chunks(path, chunksize=ingest.CHUNKSIZE):
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        chunk["day"] = pd.to_datetime(chunk.pop("date"))
+        yield chunk.drop(columns=["year", "month"])
+
+
+DATASETS = {
+    # name: (source CSV, reader of normalized chunks with a "day" column)
+    "timecard": ("cleaned_hrh_timecard_data.csv", ingest.read_timecard_chunks),
+    "payroll": ("cleaned_hrh_payroll_data.csv", _payroll_chunks),
+}
+
+
+def _source_signature(path):
+    stat = os.stat(path)
+    return [os.path.basename(path), stat.st_mtime_ns, stat.st_size]
+
+
+def load_catalog(root, dataset):
+    try:
+        with open(os.path.join(root, dataset, CATALOG)) as catalog:
+            return json.load(catalog)
+    except FileNotFoundError:
+        return None
+
+
+def _save_catalog(directory, catalog):
+    staging = os.path.join(directory, CATALOG + ".tmp")
+    with open(staging, "w") as file:
+        json.dump(catalog, file, indent=1)
+    os.replace(staging, os.path.join(directory, CATALOG))
+
+
+def _write_parts(directory, catalog, chunks, name):
+    """Write every chunk into its partitions as <name>-<n>.parquet files."""
+    keys = catalog["keys"]
+    for n, chunk in enumerate(chunks):
+        if chunk.empty:
+            continue
+        chunk = chunk.assign(year=chunk["day"].dt.year, month=chunk["day"].dt.month)
+        for values, part in chunk.groupby(keys, sort=False):
+            values = [int(value) for value in values]
+            path = "/".join(f"{key}={value}" for key, value in zip(keys, values))
+            os.makedirs(os.path.join(directory, path), exist_ok=True)
+            pq.write_table(
+                pa.Table.from_pandas(part.drop(columns=keys), preserve_index=False),
+                os.path.join(directory, path, f"{name}-{n:05d}.parquet"),
+            )
+            entry = catalog["partitions"].setdefault(
+                path,
+                dict(zip(keys, values), rows=0, first=None, last=None, files=[]),
+            )
+            first = str(part["day"].min().date())
+            last = str(part["day"].max().date())
+            entry["rows"] += len(part)
+            entry["first"] = min(filter(None, [entry["first"], first]))
+            entry["last"] = max(filter(None, [entry["last"], last]))
+            entry["files"].append(f"{path}/{name}-{n:05d}.parquet")
+
+
+def write_dataset(root, dataset, data_dir, by=None):
+    """Partition the dataset's CSV, replacing any earlier partitions."""
+    source_name, read_chunks = DATASETS[dataset]
+    source = os.path.join(data_dir, source_name)
+    catalog = {
+        "dataset": dataset,
+        "source": _source_signature(source),
+        "keys": ["year", "month"] + ([by] if by else []),
+        "appended": [],
+        "partitions": {},
+    }
+    # Written aside and renamed, so readers never see a partial dataset
+    staging = tempfile.mkdtemp(prefix=f".{dataset}-", dir=root)
+    try:
+        _write_parts(staging, catalog, read_chunks(source), "part")
+        _save_catalog(staging, catalog)
+        os.chmod(staging, 0o755)
+        target = os.path.join(root, dataset)
+        if os.path.exists(target):
+            old = tempfile.mkdtemp(prefix=f".{dataset}-old-", dir=root)
+            os.rename(target, os.path.join(old, dataset))
+            os.rename(staging, target)
+            shutil.rmtree(old, ignore_errors=True)
+        else:
+            os.rename(staging, target)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    logger.info(
+        "Partitioned %s into %d partitions", dataset, len(catalog["partitions"])
+    )
+    return catalog
+
+
+def append(root, dataset, chunks, name):
+    """Add rows (e.g. a delta file) to the partitions; once per name."""
+    directory = os.path.join(root, dataset)
+    with open(os.path.join(root, f".{dataset}.lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        catalog = load_catalog(root, dataset)
+        if name in catalog["appended"]:
+            return catalog
+        _write_parts(directory, catalog, chunks, name)
+        catalog["appended"].append(name)
+        _save_catalog(directory, catalog)
+    return catalog
+
+
+def _is_current(catalog, source, by):
+    keys = ["year", "month"] + ([by] if by else [])
+    return (
+        catalog is not None and catalog["source"] == source and catalog["keys"] == keys
+    )
+
+
+def ensure(data_dir, root=PARTITION_DIR, timecard_by=TIMECARD_PARTITION_BY):
+    """Partition every dataset whose CSV changed since it was partitioned."""
+    os.makedirs(root, exist_ok=True)
+    for dataset, (source_name, _) in DATASETS.items():
+        source = _source_signature(os.path.join(data_dir, source_name))
+        by = timecard_by if dataset == "timecard" else None
+        if _is_current(load_catalog(root, dataset), source, by):
+            continue
+        # One process partitions while the others wait, then find it done
+        with open(os.path.join(root, f".{dataset}.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if not _is_current(load_catalog(root, dataset), source, by):
+                write_dataset(root, dataset, data_dir, by)
+
+
+def prune(catalog, year=None, month=None, start_date=None, end_date=None, **keys):
+    """Catalog entries of the partitions that can hold matching rows."""
+    start = str(pd.to_datetime(start_date).date()) if start_date else None
+    end = str(pd.to_datetime(end_date).date()) if end_date else None
+    wanted = dict(keys, year=year, month=month)
+    return [
+        entry
+        for entry in catalog["partitions"].values()
+        if all(
+            value is None or entry.get(key) == int(value)
+            for key, value in wanted.items()
+        )
+        and (start is None or entry["last"] >= start)
+        and (end is None or entry["first"] <= end)
+    ]
+
+
+def scan_entries(root, dataset, catalog, entries, columns=None):
+    """Every row of the given catalog entries (see prune), one partition
+    file at a time, with the key columns."""
+    if columns is not None and "day" not in columns:
+        columns = [*columns, "day"]
+    for entry in entries:
+        for file in entry["files"]:
+            part = pq.read_table(os.path.join(root, dataset, file), columns=columns)
+            part = part.to_pandas()
+            for key in catalog["keys"]:
+                part[key] = entry[key]
+            yield part
+
+
+def scan(
+    root,
+    dataset,
+    columns=None,
+    year=None,
+    month=None,
+    start_date=None,
+    end_date=None,
+    **keys,
+):
+    """Matching rows, one partition file at a time, with the key columns."""
+    catalog = load_catalog(root, dataset)
+    entries = prune(catalog, year, month, start_date, end_date, **keys)
+    for part in scan_entries(root, dataset, catalog, entries, columns):
+        if start_date is not None:
+            part = part[part["day"] >= pd.to_datetime(start_date)]
+        if end_date is not None:
+            part = part[part["day"] <= pd.to_datetime(end_date)]
+        yield part
+
+
+def read(root, dataset, columns=None, **filters):
+    parts = list(scan(root, dataset, columns, **filters))
+    if not parts:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(parts, ignore_index=True)
+
+
+if __name__ == "__main__":
+    from components import datastore
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--root", default=PARTITION_DIR or "data/partitions")
+    parser.add_argument(
+        "--by",
+        default=TIMECARD_PARTITION_BY,
+        help="extra timecard partition key, e.g. department_code",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    ensure(datastore.DATA_DIR, args.root, args.by)
+    for dataset in DATASETS:
+        catalog = load_catalog(args.root, dataset)
+        print(dataset, len(catalog["partitions"]), "partitions")
@@ -0,0 +1,72 @@
+"""Period-over-period comparison of the visitation and attendance charts.
+
+The selected dates are compared with the period just before them, as many
+days long, or with the same dates a year earlier. The queries take the
+prior range alongside the selected one and return both periods from one
+pass: a single filter over the two ranges, every row coded with its
+period (0 selected, 1 prior), and a single bincount, or GROUP BY, over
+the codes; the callbacks never run twice.
+"""
+
+import numpy as np
+import pandas as pd
+from dash import dcc
+
+# Comparison toggle options; "none" turns the comparison off
+MODES = {
+    "none": "No comparison",
+    "period": "Previous period",
+    "year": "Previous year",
+}
+
+
+def ranges(start_date, end_date, year=None, mode=None):
+    """The selected (start, end) days and the prior ones to compare with.
+
+    The prior range is None when not comparing. A selected year replaces
+    the date range, as on the attendance page; a prior year-ago range
+    longer than a year is cut where the selected one begins, so no day
+    belongs to both.
+    """
+    if year:
+        start_date, end_date = f"{int(year)}-01-01", f"{int(year)}-12-31"
+    start, end = (pd.to_datetime(date) for date in (start_date, end_date))
+    # A cleared date picker leaves its end of the range open (NaT)
+    start, end = (date if pd.isna(date) else date.normalize() for date in (start, end))
+    if mode not in ("period", "year") or pd.isna(start) or pd.isna(end):
+        return (start, end), None
+    if mode == "period":
+        days = end - start + pd.Timedelta(days=1)
+        return (start, end), (start - days, end - days)
+    prior_start = start - pd.DateOffset(years=1)
+    prior_end = min(end - pd.DateOffset(years=1), start - pd.Timedelta(days=1))
+    return (start, end), (prior_start, prior_end)
+
+
+def codes(dates, current, prior):
+    """Period code of every date: 0 selected, 1 prior, -1 neither."""
+    days = np.asarray(pd.to_datetime(dates), dtype="datetime64[D]")
+    period = np.full(len(days), -1, dtype=np.int64)
+    for code, (start, end) in ((1, prior), (0, current)):
+        start, end = (
+            np.datetime64(pd.to_datetime(date).date()) for date in (start, end)
+        )
+        period[(days >= start) & (days <= end)] = code
+    return period
+
+
+def aligned(dates, current, prior, mode):
+    """Prior-period dates moved onto the selected period, to overlay them."""
+    if mode == "year":
+        return pd.to_datetime(dates) + pd.DateOffset(years=1)
+    return pd.to_datetime(dates) + (current[0] - prior[0])
+
+
+def toggle(toggle_id):
+    """The comparison toggle of a page, off until a prior period is picked."""
+    return dcc.Dropdown(
+        id=toggle_id,
+        options=[{"label": label, "value": mode} for mode, label in MODES.items()],
+        value="none",
+        clearable=False,
+    )
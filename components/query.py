@@ -0,0 +1,783 @@
+"""Query layer for the callback aggregates.
+
+Each function takes a datastore Snapshot and the callback's filters and
+returns a small aggregate. With THWP_QUERY_BACKEND=duckdb (or sqlite) the
+cleaned CSVs are loaded, a chunk at a time, into an embedded database
+file and the filters are pushed down into aggregate SQL, so the
+visitation and timecard facts never have to fit in a worker's RAM; the
+snapshot then carries the engine instead of those two frames. Without a
+backend the same aggregates come from the visit counts and clock-in
+matrix the snapshot streamed in (see ingest.py).
+"""
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from components import (
+    absenteeism,
+    bitmaps,
+    heatmaps,
+    ingest,
+    partitions,
+    periods,
+    punctuality,
+)
+
+logger = logging.getLogger(__name__)
+
+# "duckdb", "sqlite", or empty for in-memory pandas
+QUERY_BACKEND = os.environ.get("THWP_QUERY_BACKEND", "").lower()
+
+QUERY_DB = os.environ.get("THWP_QUERY_DB")
+
+
+class SQLEngine:
+    """Read-only access to the database file of one data version."""
+
+    def __init__(self, backend, path):
+        self.backend = backend
+        self.path = path
+        self._local = threading.local()
+        if backend == "duckdb":
+            import duckdb
+
+            self._duckdb = duckdb.connect(path, read_only=True)
+
+    def _connection(self):
+        if self.backend == "duckdb":
+            # Cursors of one duckdb connection may be used across threads
+            return self._duckdb.cursor()
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(
+                f"file:{self.path}?mode=ro", uri=True, check_same_thread=False
+            )
+            self._local.connection = connection
+        return connection
+
+    def query(self, sql, params=()):
+        cursor = self._connection().execute(sql, list(params))
+        columns = [column[0] for column in cursor.description]
+        return pd.DataFrame(cursor.fetchall(), columns=columns)
+
+
+def _visit_chunks(path):
+    for chunk in pd.read_csv(path, chunksize=ingest.CHUNKSIZE):
+        start_date = pd.to_datetime(chunk["start_date"])
+        yield pd.DataFrame(
+            {
+                "patient_id": chunk["patient_id"],
+                "start_date": start_date.dt.strftime("%Y-%m-%d"),
+                "hour": ingest.parse_hours(chunk["time_in"]),
+                "weekday": start_date.dt.weekday,
+            }
+        ).dropna(subset=["hour"]).astype({"hour": "int64"})
+
+
+def _timecard_chunks(path):
+    for chunk in ingest.read_timecard_chunks(path):
+        yield pd.DataFrame(
+            {
+                "employee_id": chunk["employee_id"],
+                "department_code": chunk["department_code"],
+                "date": chunk["day"].dt.strftime("%Y-%m-%d"),
+                "seconds": chunk["seconds"],
+                "clockin_hour": chunk["seconds"] // 3600,
+                "weekday": chunk["day"].dt.weekday,
+                "year": chunk["day"].dt.year,
+                "month": chunk["day"].dt.month,
+            }
+        )
+
+
+def _append(connection, backend, table, df):
+    if backend == "duckdb":
+        connection.register("chunk", df)
+        if table in {row[0] for row in connection.execute("SHOW TABLES").fetchall()}:
+            connection.execute(f"INSERT INTO {table} SELECT * FROM chunk")
+        else:
+            connection.execute(f"CREATE TABLE {table} AS SELECT * FROM chunk")
+        connection.unregister("chunk")
+    else:
+        df.to_sql(table, connection, if_exists="append", index=False)
+
+
+def build_database(backend, path, data_dir, delta_dir=None, deltas=()):
+    """Load the cleaned CSVs and the delta files into a new database file,
+    chunk by chunk."""
+    if backend == "duckdb":
+        import duckdb
+
+        connection = duckdb.connect(path)
+    else:
+        connection = sqlite3.connect(path)
+
+    patients = ingest.read_patients(os.path.join(data_dir, "cleaned_patients_data.csv"))
+    patients = ingest.append_patients(
+        patients, ingest.delta_paths(delta_dir, deltas, "patients")
+    )
+    _append(connection, backend, "patients", patients)
+    for visitations in [
+        os.path.join(data_dir, "cleaned_visitations_data.csv"),
+        *ingest.delta_paths(delta_dir, deltas, "visitations"),
+    ]:
+        for chunk in _visit_chunks(visitations):
+            _append(connection, backend, "visitations", chunk)
+    if backend == "duckdb" and partitions.PARTITION_DIR:
+        # Read in place from the year/month partitions, which already hold
+        # the deltas; filters on year skip the other partitions' files
+        files = os.path.join(
+            os.path.abspath(partitions.PARTITION_DIR), "timecard", "**", "*.parquet"
+        )
+        connection.execute(f"""
+            CREATE VIEW timecard AS
+            SELECT employee_id, department_code, strftime(day, '%Y-%m-%d') AS date,
+                   seconds, seconds // 3600 AS clockin_hour, isodow(day) - 1 AS weekday,
+                   year, month
+            FROM read_parquet('{files.replace("'", "''")}', hive_partitioning = true)
+            """)
+    else:
+        for timecard in [
+            os.path.join(data_dir, "cleaned_hrh_timecard_data.csv"),
+            *ingest.delta_paths(delta_dir, deltas, "timecard"),
+        ]:
+            for chunk in _timecard_chunks(timecard):
+                _append(connection, backend, "timecard", chunk)
+        connection.execute("CREATE INDEX timecard_date ON timecard (date)")
+
+    connection.execute("""
+        CREATE VIEW visits AS
+        SELECT v.start_date, v.hour, v.weekday, p.facility_name, p.gender,
+               p.marital_status, p.age_group
+        FROM visitations v JOIN patients p ON p.patient_id = v.patient_id
+        """)
+    connection.execute("CREATE INDEX visitations_date ON visitations (start_date)")
+    connection.execute("CREATE INDEX patients_id ON patients (patient_id)")
+    if backend == "sqlite":
+        connection.commit()
+    connection.close()
+
+
+def open_engine(signature, data_dir, delta_dir=None, deltas=(), backend=QUERY_BACKEND):
+    """Engine for this version of the data, building its database if needed."""
+    directory = (
+        (os.path.dirname(QUERY_DB) or ".") if QUERY_DB else tempfile.gettempdir()
+    )
+    name = os.path.basename(QUERY_DB) if QUERY_DB else f"thwp-{backend}"
+    # The backend too: sqlite and duckdb cannot open each other's files
+    digest = hashlib.sha1(
+        json.dumps([backend, signature, deltas]).encode()
+    ).hexdigest()[:16]
+    path = os.path.join(directory, f"{name}-{digest}.db")
+    os.makedirs(directory, exist_ok=True)
+    if not os.path.exists(path):
+        # One worker builds while the others wait, then all open it read-only
+        with open(os.path.join(directory, f".{name}.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if not os.path.exists(path):
+                staging = path + ".building"
+                if os.path.exists(staging):
+                    os.remove(staging)
+                build_database(backend, staging, data_dir, delta_dir, deltas)
+                os.replace(staging, path)
+                logger.info("Built %s query database %s", backend, path)
+    return SQLEngine(backend, path)
+
+
+# Filters --------------------------------------------------------------------
+
+
+def _in(column, values):
+    if not len(values):
+        return "1 = 0", []
+    return f"{column} IN ({', '.join('?' * len(values))})", list(values)
+
+
+def _visit_scope(snapshot):
+    """Clause limiting the visits to a state shard's facilities, if any."""
+    if snapshot.facility_scope is None:
+        return "1 = 1", []
+    return _in("facility_name", snapshot.facility_scope)
+
+
+def _day(date):
+    return pd.to_datetime(date).strftime("%Y-%m-%d")
+
+
+def _within(column, *ranges):
+    """Clause matching a date column within any of the (start, end) ranges
+    given; None ranges are skipped."""
+    clauses, params = [], []
+    for start_date, end_date in filter(None, ranges):
+        clauses.append(f"{column} >= ? AND {column} <= ?")
+        params += [_day(start_date), _day(end_date)]
+    if len(clauses) == 1:
+        return clauses[0], params
+    return "(" + " OR ".join(f"({clause})" for clause in clauses) + ")", params
+
+
+def _period(column, start_date, end_date):
+    """Expression of each row's period code (see periods.py): 0 within the
+    selected range, 1 outside it, i.e. within the prior range the WHERE
+    clause also keeps."""
+    return (
+        f"CASE WHEN {column} >= ? AND {column} <= ? THEN 0 ELSE 1 END",
+        [_day(start_date), _day(end_date)],
+    )
+
+
+def _visit_where(
+    snapshot, facilities, start_date, end_date, attributes=None, prior=None
+):
+    scope, params = _visit_scope(snapshot)
+    dates, date_params = _within("start_date", (start_date, end_date), prior)
+    clauses = [scope, dates]
+    params += date_params
+    for column, selected in {"facility_name": facilities, **(attributes or {})}.items():
+        if not selected:
+            continue
+        if column not in ingest.VISIT_KEYS:
+            # Column names go into the SQL as they are: only known ones
+            raise ValueError(f"Cannot filter the visits on {column!r}")
+        clause, values = _in(column, selected)
+        if bitmaps.MISSING in selected:
+            # Missing values are selected as bitmaps.MISSING
+            clause = f"({clause} OR {column} IS NULL)"
+        clauses.append(clause)
+        params.extend(values)
+    return " AND ".join(clauses), params
+
+
+def filter_visits(
+    snapshot, facilities, start_date, end_date, attributes=None, prior=None
+):
+    """Rows of the visit counts matching the filters.
+
+    ``attributes`` maps patient columns (gender, age_group, ...) to the
+    selected values; the facility and attribute filters are resolved on
+    the snapshot's bitmap index (see bitmaps.py). A ``prior`` (start, end)
+    range keeps its rows too, to compare with (see periods.py).
+    """
+    df = snapshot.visit_counts_df
+    mask = bitmaps.visit_index(snapshot).mask(
+        {"facility_name": facilities, **(attributes or {})}
+    )
+    dates = df["start_date"].to_numpy()
+    within = np.zeros(len(dates), dtype=bool)
+    for first, last in filter(None, [(start_date, end_date), prior]):
+        within |= (dates >= pd.to_datetime(first).to_datetime64()) & (
+            dates <= pd.to_datetime(last).to_datetime64()
+        )
+    return df[mask & within]
+
+
+def _timecard_scope(snapshot):
+    """Clause limiting the clock-ins to a state shard's employees, if any."""
+    if snapshot.facility_scope is None:
+        return "1 = 1", []
+    return _in("employee_id", snapshot.merged_hr_data["psn_number"].dropna().unique())
+
+
+def _timecard_where(snapshot, year, start_date, end_date, prior=None):
+    scope, params = _timecard_scope(snapshot)
+    if prior is not None:
+        # Both ranges bounded, the year resolved into them (periods.ranges)
+        dates, date_params = _within("date", (start_date, end_date), prior)
+        return f"{scope} AND year >= ? AND year <= ? AND {dates}", [
+            *params,
+            pd.to_datetime(prior[0]).year,
+            pd.to_datetime(end_date).year,
+            *date_params,
+        ]
+    # A selected year replaces the date range, as on the attendance page
+    if year:
+        return f"{scope} AND year = ?", params + [int(year)]
+    # Either bound may be left open, as in ClockIns.day_mask
+    clauses = [scope]
+    start_date, end_date = pd.to_datetime(start_date), pd.to_datetime(end_date)
+    # The year bounds let partitioned storage skip whole years
+    if pd.notna(start_date):
+        clauses += ["year >= ?", "date >= ?"]
+        params += [start_date.year, start_date.strftime("%Y-%m-%d")]
+    if pd.notna(end_date):
+        clauses += ["year <= ?", "date <= ?"]
+        params += [end_date.year, end_date.strftime("%Y-%m-%d")]
+    return " AND ".join(clauses), params
+
+
+# ClockIns read from the timecard partitions, most recently used last
+CLOCKIN_WINDOWS = 8
+_windows = OrderedDict()
+_windows_lock = threading.Lock()
+
+
+def clockins_within(snapshot, year=None, start_date=None, end_date=None):
+    """ClockIns holding at least the days of a year or date range (either
+    bound may be open), for ClockIns.day_mask to narrow down.
+
+    The snapshot's own when it holds them. With partitioning on the pandas
+    path leaves them in the timecard partitions (see datastore.load_all),
+    and these are the clock-ins of the snapshot's employees in only the
+    partitions the year and dates select. The latest CLOCKIN_WINDOWS are
+    kept.
+    """
+    if snapshot.clockins is not None:
+        return snapshot.clockins
+    root = partitions.PARTITION_DIR
+    catalog = partitions.load_catalog(root, "timecard")
+    entries = partitions.prune(catalog, year, start_date=start_date, end_date=end_date)
+    key = (
+        snapshot.version,
+        snapshot.built_at,
+        snapshot.state,
+        tuple(file for entry in entries for file in entry["files"]),
+    )
+    with _windows_lock:
+        clockins = _windows.get(key)
+        if clockins is None:
+            chunks = partitions.scan_entries(root, "timecard", catalog, entries)
+            if snapshot.facility_scope is not None:
+                # A state shard's employees, as _timecard_scope
+                employees = snapshot.merged_hr_data["psn_number"].dropna().unique()
+                chunks = (
+                    chunk[chunk["employee_id"].isin(employees)] for chunk in chunks
+                )
+            clockins = _windows[key] = ingest.fold_timecard(chunks)
+            while len(_windows) > CLOCKIN_WINDOWS:
+                _windows.popitem(last=False)
+        _windows.move_to_end(key)
+    return clockins
+
+
+def filter_timecard(snapshot, year, start_date, end_date, prior=None):
+    """Dates and clock-in seconds of the days matching the filters, and of
+    a ``prior`` (start, end) range to compare with (see periods.py)."""
+    if prior is not None:
+        # Both ranges bounded, the year resolved into them (periods.ranges)
+        clockins = clockins_within(snapshot, None, prior[0], end_date)
+    else:
+        clockins = clockins_within(snapshot, year, start_date, end_date)
+    mask = clockins.day_mask(start_date, end_date, year)
+    if prior is not None:
+        mask |= clockins.day_mask(*prior)
+    return clockins.dates[mask], clockins.seconds[mask]
+
+
+# Visitation -----------------------------------------------------------------
+
+
+def visit_date_bounds(snapshot):
+    if snapshot.engine is not None:
+        scope, params = _visit_scope(snapshot)
+        first, last = snapshot.engine.query(
+            "SELECT MIN(start_date) AS first, MAX(start_date) AS last FROM visits "
+            f"WHERE {scope}",
+            params,
+        ).iloc[0]
+        return pd.to_datetime(first), pd.to_datetime(last)
+    dates = snapshot.visit_counts_df["start_date"]
+    return dates.min(), dates.max()
+
+
+def visit_counts(snapshot, column, facilities, start_date, end_date, attributes=None):
+    """Visits per value of a patient column (gender, marital_status, age_group)."""
+    if snapshot.engine is not None:
+        where, params = _visit_where(
+            snapshot, facilities, start_date, end_date, attributes
+        )
+        counts = snapshot.engine.query(
+            f"SELECT {column} AS value, COUNT(*) AS count FROM visits "
+            f"WHERE {where} GROUP BY {column}",
+            params,
+        )
+        return counts.set_index("value")["count"].rename_axis(column)
+    filtered_df = filter_visits(snapshot, facilities, start_date, end_date, attributes)
+    return filtered_df.groupby(column, dropna=False)["count"].sum()
+
+
+def patient_counts(snapshot, column):
+    """Registered patients per value of a patient column."""
+    if snapshot.engine is not None:
+        scope, params = _visit_scope(snapshot)
+        counts = snapshot.engine.query(
+            f"SELECT {column} AS value, COUNT(*) AS count FROM patients "
+            f"WHERE {scope} GROUP BY {column}",
+            params,
+        )
+        return counts.set_index("value")["count"].rename_axis(column)
+    return snapshot.patients_df.groupby(column, dropna=False).size()
+
+
+def visits_by_weekday_hour(
+    snapshot, facilities, start_date, end_date, attributes=None, prior=None
+):
+    """Visit counts per weekday and hour (see heatmaps.py), a 7 x 24 matrix.
+
+    With a ``prior`` (start, end) range, a 2 x 7 x 24 array of the selected
+    period's matrix and the prior one's, from the same query.
+    """
+    groups, n_groups = None, 1
+    if snapshot.engine is not None:
+        where, params = _visit_where(
+            snapshot, facilities, start_date, end_date, attributes, prior
+        )
+        period, period_params = "", []
+        if prior is not None:
+            period, period_params = _period("start_date", start_date, end_date)
+            period += " AS period, "
+        heatmap_data = snapshot.engine.query(
+            f"SELECT {period}weekday, hour, COUNT(*) AS count FROM visits "
+            f"WHERE {where} GROUP BY {'period, ' * bool(period)}weekday, hour",
+            period_params + params,
+        )
+        if prior is not None:
+            groups, n_groups = heatmap_data["period"], 2
+    else:
+        heatmap_data = filter_visits(
+            snapshot, facilities, start_date, end_date, attributes, prior
+        )
+        if prior is not None:
+            groups = periods.codes(
+                heatmap_data["start_date"], (start_date, end_date), prior
+            )
+            n_groups = 2
+    return heatmaps.weekday_hour(
+        heatmap_data["weekday"],
+        heatmap_data["hour"],
+        heatmap_data["count"],
+        groups,
+        n_groups,
+    )
+
+
+def visits_per_day(
+    snapshot, facilities, start_date, end_date, attributes=None, prior=None
+):
+    """Visits per day; with a ``prior`` (start, end) range, its days too and
+    a period column telling them apart (see periods.py)."""
+    if snapshot.engine is not None:
+        where, params = _visit_where(
+            snapshot, facilities, start_date, end_date, attributes, prior
+        )
+        visitations_over_time = snapshot.engine.query(
+            f"SELECT start_date, COUNT(*) AS visitation_count FROM visits "
+            f"WHERE {where} GROUP BY start_date ORDER BY start_date",
+            params,
+        )
+        visitations_over_time["start_date"] = pd.to_datetime(
+            visitations_over_time["start_date"]
+        )
+    else:
+        filtered_df = filter_visits(
+            snapshot, facilities, start_date, end_date, attributes, prior
+        )
+        visitations_over_time = (
+            filtered_df.groupby("start_date")["count"]
+            .sum()
+            .reset_index(name="visitation_count")
+        )
+    if prior is not None:
+        visitations_over_time["period"] = periods.codes(
+            visitations_over_time["start_date"], (start_date, end_date), prior
+        )
+    return visitations_over_time
+
+
+def visits_per_facility_day(snapshot):
+    """Visits per day and facility over the whole snapshot (see kpis.py)."""
+    if snapshot.engine is not None:
+        scope, params = _visit_scope(snapshot)
+        visits = snapshot.engine.query(
+            f"SELECT start_date, facility_name, COUNT(*) AS count FROM visits "
+            f"WHERE {scope} GROUP BY start_date, facility_name",
+            params,
+        )
+        visits["start_date"] = pd.to_datetime(visits["start_date"])
+        return visits
+    return (
+        snapshot.visit_counts_df.groupby(["start_date", "facility_name"], dropna=False)[
+            "count"
+        ]
+        .sum()
+        .reset_index()
+    )
+
+
+# Attendance -----------------------------------------------------------------
+
+
+def timecard_date_bounds(snapshot):
+    if snapshot.engine is not None:
+        scope, params = _timecard_scope(snapshot)
+        first, last = snapshot.engine.query(
+            f"SELECT MIN(date) AS first, MAX(date) AS last FROM timecard WHERE {scope}",
+            params,
+        ).iloc[0]
+        return pd.to_datetime(first), pd.to_datetime(last)
+    clockins = clockins_within(snapshot)
+    dates = clockins.dates[clockins.present.any(axis=1)]
+    if not len(dates):
+        return pd.NaT, pd.NaT
+    return pd.Timestamp(dates.min()), pd.Timestamp(dates.max())
+
+
+def timecard_years(snapshot):
+    if snapshot.engine is not None:
+        scope, params = _timecard_scope(snapshot)
+        years = snapshot.engine.query(
+            f"SELECT DISTINCT year FROM timecard WHERE {scope} ORDER BY year", params
+        )
+        return years["year"].tolist()
+    clockins = clockins_within(snapshot)
+    dates = clockins.dates[clockins.present.any(axis=1)]
+    return pd.unique(dates.astype("datetime64[Y]").astype(int) + 1970).tolist()
+
+
+def employees_per_day(snapshot, year, start_date, end_date, prior=None):
+    """Employees clocking in per day; with a ``prior`` (start, end) range,
+    its days too and a period column telling them apart (see periods.py)."""
+    if snapshot.engine is not None:
+        where, params = _timecard_where(snapshot, year, start_date, end_date, prior)
+        time_series_data = snapshot.engine.query(
+            f"SELECT date, COUNT(DISTINCT employee_id) AS employee_count "
+            f"FROM timecard WHERE {where} GROUP BY date ORDER BY date",
+            params,
+        )
+        time_series_data["date"] = pd.to_datetime(time_series_data["date"])
+    else:
+        dates, seconds = filter_timecard(snapshot, year, start_date, end_date, prior)
+        employee_count = (seconds != ingest.ABSENT).sum(axis=1)
+        time_series_data = pd.DataFrame(
+            {
+                "date": dates[employee_count > 0].astype("datetime64[ns]"),
+                "employee_count": employee_count[employee_count > 0],
+            }
+        )
+    if prior is not None:
+        time_series_data["period"] = periods.codes(
+            time_series_data["date"], (start_date, end_date), prior
+        )
+    return time_series_data
+
+
+def employees_by_weekday_hour(snapshot, year, start_date, end_date, prior=None):
+    """Distinct employees per weekday and clock-in hour, a 7 x 24 matrix.
+
+    With a ``prior`` (start, end) range, a 2 x 7 x 24 array of the selected
+    period's matrix and the prior one's, from the same query.
+    """
+    if snapshot.engine is not None:
+        where, params = _timecard_where(snapshot, year, start_date, end_date, prior)
+        period, period_params = "", []
+        if prior is not None:
+            period, period_params = _period("date", start_date, end_date)
+            period += " AS period, "
+        heatmap_data = snapshot.engine.query(
+            f"SELECT {period}weekday, clockin_hour, "
+            f"COUNT(DISTINCT employee_id) AS employees FROM timecard "
+            f"WHERE {where} GROUP BY {'period, ' * bool(period)}weekday, clockin_hour",
+            period_params + params,
+        )
+        return heatmaps.weekday_hour(
+            heatmap_data["weekday"],
+            heatmap_data["clockin_hour"],
+            heatmap_data["employees"],
+            heatmap_data["period"] if prior is not None else None,
+            2 if prior is not None else 1,
+        )
+    dates, seconds = filter_timecard(snapshot, year, start_date, end_date, prior)
+    # The matrix holds one first clock-in per (day, employee) already
+    days, employees = np.nonzero(seconds != ingest.ABSENT)
+    # Monday is 0: 1970-01-01 was a Thursday
+    weekdays = (dates[days].astype(np.int64) + 3) % 7
+    groups = None
+    if prior is not None:
+        groups = periods.codes(dates, (start_date, end_date), prior)[days]
+    return heatmaps.distinct_weekday_hour(
+        weekdays,
+        seconds[days, employees] // 3600,
+        employees,
+        seconds.shape[1],
+        groups,
+        2 if prior is not None else 1,
+    )
+
+
+def employee_punctuality(
+    snapshot,
+    year,
+    start_date,
+    end_date,
+    shift_start=punctuality.SHIFT_START,
+    grace_minutes=punctuality.GRACE_MINUTES,
+):
+    """Per-employee days present, late days and summed clock-in offset."""
+    if snapshot.engine is not None:
+        start = punctuality.shift_seconds(shift_start)
+        where, params = _timecard_where(snapshot, year, start_date, end_date)
+        # First clock-in of each employee and day, as in the clock-in matrix
+        return snapshot.engine.query(
+            f"""
+            SELECT employee_id, MAX(department_code) AS department_code,
+                   COUNT(*) AS days_present,
+                   SUM(CASE WHEN seconds > ? THEN 1 ELSE 0 END) AS late_days,
+                   SUM(seconds - ?) AS offset_seconds
+            FROM (
+                SELECT employee_id, date, MAX(department_code) AS department_code,
+                       MIN(seconds) AS seconds
+                FROM timecard WHERE {where} GROUP BY employee_id, date
+            ) AS days
+            GROUP BY employee_id
+            """,
+            [start + grace_minutes * 60, start, *params],
+        )
+    clockins = clockins_within(snapshot, year, start_date, end_date)
+    mask = clockins.day_mask(start_date, end_date, year)
+    return punctuality.employee_punctuality(
+        clockins.seconds[mask],
+        clockins.employee_ids,
+        clockins.department_codes,
+        shift_start,
+        grace_minutes,
+    )
+
+
+def attendance_per_facility_day(
+    snapshot,
+    shift_start=punctuality.SHIFT_START,
+    grace_minutes=punctuality.GRACE_MINUTES,
+):
+    """Employees clocking in, and clocking in late, per day and facility.
+
+    Over the whole snapshot (see kpis.py); employees count at the facility
+    they are stationed at, or "Unknown" when off the HR roster.
+    """
+    late_after = punctuality.shift_seconds(shift_start) + grace_minutes * 60
+    facilities = punctuality.facility_of(snapshot.merged_hr_data)
+    if snapshot.engine is not None:
+        scope, params = _timecard_scope(snapshot)
+        # First clock-in of each employee and day, as in the clock-in matrix
+        days = snapshot.engine.query(
+            f"SELECT date, employee_id, MIN(seconds) AS seconds FROM timecard "
+            f"WHERE {scope} GROUP BY date, employee_id",
+            params,
+        )
+        days["date"] = pd.to_datetime(days["date"])
+        days["facility"] = days["employee_id"].map(facilities).fillna("Unknown")
+        days["late"] = (days["seconds"] > late_after).astype(np.int64)
+        return (
+            days.groupby(["date", "facility"])
+            .agg(attendees=("employee_id", "size"), late=("late", "sum"))
+            .reset_index()
+        )
+    clockins = clockins_within(snapshot)
+    codes, names = pd.factorize(
+        facilities.reindex(clockins.employee_ids).fillna("Unknown")
+    )
+    # One bincount per measure over the (day, facility) cells
+    days, employees = np.nonzero(clockins.present)
+    cells = days * len(names) + codes[employees]
+    size = len(clockins.seconds) * len(names)
+    attendees = np.bincount(cells, minlength=size)
+    late = np.bincount(
+        cells, weights=clockins.seconds[days, employees] > late_after, minlength=size
+    )
+    seen = np.flatnonzero(attendees)
+    return pd.DataFrame(
+        {
+            "date": clockins.dates[seen // len(names)].astype("datetime64[ns]"),
+            "facility": np.asarray(names)[seen % len(names)],
+            "attendees": attendees[seen],
+            "late": late[seen].astype(np.int64),
+        }
+    )
+
+
+def presence(snapshot, year, start_date, end_date):
+    """absenteeism.Presence of the HR roster on the selected working days."""
+    if snapshot.engine is not None:
+        where, params = _timecard_where(snapshot, year, start_date, end_date)
+        clock_ins = snapshot.engine.query(
+            f"SELECT DISTINCT employee_id, date FROM timecard WHERE {where}", params
+        )
+        days = pd.to_datetime(clock_ins["date"]).to_numpy().astype("datetime64[D]")
+        employees, employee_ids = pd.factorize(clock_ins["employee_id"])
+        first = days.min() if len(days) else np.datetime64("NaT", "D")
+        dates = first + np.arange(
+            (days.max() - first).astype(int) + 1 if len(days) else 0
+        )
+        present = np.zeros((len(dates), len(employee_ids)), dtype=bool)
+        present[(days - first).astype(int), employees] = True
+    else:
+        clockins = clockins_within(snapshot, year, start_date, end_date)
+        mask = clockins.day_mask(start_date, end_date, year)
+        dates, employee_ids = clockins.dates[mask], clockins.employee_ids
+        present = clockins.present[mask]
+    return absenteeism.presence(
+        dates,
+        np.asarray(employee_ids),
+        present,
+        absenteeism.roster(snapshot.merged_hr_data),
+    )
+
+
+# Payroll --------------------------------------------------------------------
+
+PAY_COLUMNS = [
+    "basic",
+    "allowances",
+    "gross",
+    "deductions",
+    "loans",
+    "tax",
+    "suspensions",
+    "net_pay",
+]
+
+
+def payroll(year=None, month=None, columns=None, data_dir=None):
+    """Payroll rows of a year and/or month, the pay date in "day".
+
+    With partitioning on only the matching year/month partitions are read;
+    otherwise the whole CSV is read and filtered.
+    """
+    from components import datastore
+
+    data_dir = data_dir or datastore.DATA_DIR
+    if partitions.PARTITION_DIR:
+        partitions.ensure(data_dir)
+        return partitions.read(
+            partitions.PARTITION_DIR, "payroll", columns, year=year, month=month
+        )
+    df = pd.read_csv(os.path.join(data_dir, "cleaned_hrh_payroll_data.csv"))
+    df["day"] = pd.to_datetime(df.pop("date"))
+    if year:
+        df = df[df["year"] == int(year)]
+    if month:
+        df = df[df["month"] == int(month)]
+    if columns is not None:
+        df = df[[*columns, "day", "year", "month"]]
+    return df
+
+
+def payroll_totals(year=None, month=None, data_dir=None):
+    """Staff paid and the sum of every pay column, per year and month."""
+    df = payroll(year, month, ["psn", *PAY_COLUMNS], data_dir)
+    return (
+        df.groupby(["year", "month"])
+        .agg(
+            staff=("psn", "nunique"),
+            **{column: (column, "sum") for column in PAY_COLUMNS},
+        )
+        .reset_index()
+    )
@@ -0,0 +1,144 @@
+import base64
+import gzip
+import numbers
+
+import numpy as np
+from flask import request
+
+# Trace attributes that carry the data arrays of the dashboard charts
+ARRAY_KEYS = ("x", "y", "z", "values", "lat", "lon")
+
+# Smallest typed array Plotly.js understands for integral data
+INT_DTYPES = [np.int8, np.int16, np.int32]
+
+
+def encode_typed_array(values):
+    """Encode a numeric array as a Plotly typed array ({"dtype", "bdata"}).
+
+    Returns None when the values are not numeric (e.g. category labels),
+    so the caller can leave them as they are.
+    """
+    if isinstance(values, dict):
+        # Already encoded (plotly >= 6 does this for numpy arrays)
+        return values
+
+    arr = np.asarray(values)
+    if arr.dtype.kind == "M":
+        # Dates travel as milliseconds since epoch on a date axis
+        arr = arr.astype("datetime64[ms]").astype(np.int64).astype(np.float64)
+    elif arr.dtype.kind == "O" and arr.size:
+        # Only real numbers (None is a gap): numeric-looking strings such as
+        # department codes are category labels and stay a list
+        if not all(
+            item is None or isinstance(item, (numbers.Real, np.bool_))
+            for item in arr.flat
+        ):
+            return None
+        arr = arr.astype(np.float64)
+    elif arr.dtype.kind not in "biuf":
+        return None
+
+    if arr.dtype.kind in "biu":
+        arr = arr.astype(np.int64)
+        for dtype in INT_DTYPES:
+            info = np.iinfo(dtype)
+            if arr.size == 0 or (arr.min() >= info.min and arr.max() <= info.max):
+                arr = arr.astype(dtype)
+                break
+        else:
+            arr = arr.astype(np.float64)
+    elif arr.dtype.kind == "f":
+        arr = arr.astype(np.float64)
+
+    arr = np.ascontiguousarray(arr)
+    encoded = {
+        "dtype": arr.dtype.str.lstrip("<|="),
+        "bdata": base64.b64encode(arr.tobytes()).decode("ascii"),
+    }
+    if arr.ndim > 1:
+        encoded["shape"] = ", ".join(str(n) for n in arr.shape)
+    return encoded
+
+
+def _as_datetime(values):
+    """Return the values as datetime64[ms] when they are dates, else None."""
+    arr = np.asarray(values)
+    if arr.dtype.kind == "M":
+        return arr.astype("datetime64[ms]")
+    if arr.dtype.kind in "OU" and arr.size:
+        first = arr.ravel()[0]
+        # Only ISO date strings ("YYYY-MM-DD...") count as dates
+        if not (isinstance(first, str) and len(first) >= 10 and first[4] == "-"):
+            return None
+        try:
+            return arr.astype("datetime64[ms]")
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+def compact_figure(fig):
+    """Return the figure as a dict whose numeric and date arrays are typed arrays.
+
+    Heatmap z-matrices, line chart values and date axes are the bulk of
+    every callback response; as base64 typed arrays they are a fraction of
+    the size of the equivalent JSON lists.
+    """
+    figure = fig.to_plotly_json() if hasattr(fig, "to_plotly_json") else dict(fig)
+    layout = dict(figure.get("layout", {}))
+
+    data = []
+    for trace in figure.get("data", []):
+        trace = dict(trace)
+        for key in ARRAY_KEYS:
+            values = trace.get(key)
+            if values is None or isinstance(values, (str, int, float)):
+                continue
+
+            dates = (
+                _as_datetime(values)
+                if key in ("x", "y") and not isinstance(values, dict)
+                else None
+            )
+            if dates is not None:
+                values = dates
+                # Numbers are only read as dates when the axis says so
+                axis = trace.get(key + "axis", key)
+                axis_name = axis[0] + "axis" + axis[1:]
+                layout[axis_name] = {**layout.get(axis_name, {}), "type": "date"}
+
+            encoded = encode_typed_array(values)
+            if encoded is not None:
+                trace[key] = encoded
+        data.append(trace)
+
+    figure["data"] = data
+    figure["layout"] = layout
+    return figure
+
+
+def register_compression(server, min_size=1024, level=6):
+    """Gzip the JSON responses of the Dash callback endpoint."""
+
+    @server.after_request
+    def gzip_response(response):
+        if (
+            response.status_code != 200
+            or response.direct_passthrough
+            or response.mimetype != "application/json"
+            or "Content-Encoding" in response.headers
+            or "gzip" not in request.headers.get("Accept-Encoding", "").lower()
+        ):
+            return response
+
+        payload = response.get_data()
+        if len(payload) < min_size:
+            return response
+
+        response.set_data(gzip.compress(payload, compresslevel=level))
+        response.headers["Content-Encoding"] = "gzip"
+        response.headers["Content-Length"] = len(response.get_data())
+        response.vary.add("Accept-Encoding")
+        return response
+
+    return gzip_response
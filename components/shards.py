@@ -0,0 +1,225 @@
+"""Per-state shards of the dashboard data.
+
+A shard is a Snapshot scoped to one state: the state's LGAs, wards and
+facilities, the visits and patients of those facilities, the HR roster
+stationed at them and those employees' clock-ins. A shard is cut from the
+national snapshot on the first request for its state and kept until the
+next data version, so a request only ever reads the frames of its own
+state, and serving more states adds nothing to the requests of others.
+
+The national fact frames are stored ordered by state (order_by_state),
+rows and clock-in columns alike, so a state's facts are one contiguous
+range of them: its shard is a slice, a view of the national data, not a
+copy, and a shard costs next to no memory. Delta rows are appended out
+of order (see datastore.apply_deltas), so the shards of the states they
+add to are copied instead, and only those.
+
+Pages are scoped by their query string, e.g. /visitation?state=GOMBE;
+without one they show every state, or THWP_DEFAULT_STATE if set.
+"""
+
+import logging
+import os
+import threading
+from dataclasses import replace
+from urllib.parse import parse_qs
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STATE = os.environ.get("THWP_DEFAULT_STATE") or None
+
+
+def state_name(state):
+    """A state as the pages and shards name it: upper-cased, or the default."""
+    state = state or DEFAULT_STATE
+    return state.strip().upper() if state else None
+
+
+def state_of(search):
+    """State named in a URL query string ("?state=Gombe")."""
+    values = parse_qs((search or "").lstrip("?")).get("state")
+    return state_name(values[0] if values else None)
+
+
+def geography(snapshot, state):
+    """The states, LGAs, wards and facilities frames of one state."""
+    states_df = snapshot.states_df[
+        snapshot.states_df["state_name"].str.upper() == state
+    ]
+    lgas_df = snapshot.lgas_df[snapshot.lgas_df["state_id"].isin(states_df["id"])]
+    wards_df = snapshot.wards_df[snapshot.wards_df["lga_id"].isin(lgas_df["id"])]
+    facilities_df = snapshot.facilities_df[
+        snapshot.facilities_df["ward_id"].isin(wards_df["id"])
+    ]
+    return states_df, lgas_df, wards_df, facilities_df
+
+
+def facility_states(facilities_df, wards_df, lgas_df, states_df):
+    """The (upper-cased) state of every facility, by facility name."""
+    state_names = states_df.set_index("id")["state_name"].str.upper()
+    lga_states = lgas_df.set_index("id")["state_id"].map(state_names)
+    ward_states = wards_df.set_index("id")["lga_id"].map(lga_states)
+    states = facilities_df.set_index("name")["ward_id"].map(ward_states)
+    return states[~states.index.duplicated()]
+
+
+def _state_codes(states, names):
+    """Sort codes of the states of names; unknown ones sort last."""
+    categories = sorted(states.dropna().unique())
+    codes = pd.Categorical(names.map(states), categories=categories).codes
+    return np.where(codes < 0, len(categories), codes)
+
+
+def _in_order(codes):
+    return bool(np.all(np.diff(codes) >= 0))
+
+
+# Fact frames of a Snapshot, and the column naming each row's facility
+FACT_FRAMES = {
+    "visit_counts_df": "facility_name",
+    "patients_df": "facility_name",
+    "merged_hr_data": "facility_stationed",
+}
+
+
+def order_by_state(frames):
+    """The fact frames and clock-ins among a Snapshot's frames (a mapping of
+    its fields), reordered by state where they are not already.
+
+    Sorting is stable, so rows keep their order within a state. Returns
+    only what it reordered.
+    """
+    states = facility_states(
+        frames["facilities_df"],
+        frames["wards_df"],
+        frames["lgas_df"],
+        frames["states_df"],
+    )
+    ordered = {}
+    for name, column in FACT_FRAMES.items():
+        df = frames.get(name)
+        if df is None:
+            continue
+        codes = _state_codes(states, df[column])
+        if not _in_order(codes):
+            ordered[name] = df.iloc[np.argsort(codes, kind="stable")].reset_index(
+                drop=True
+            )
+
+    clockins = frames.get("clockins")
+    if clockins is not None:
+        # Employees are placed by the facility they are stationed at
+        hr = ordered.get("merged_hr_data", frames["merged_hr_data"])
+        stationed = hr.drop_duplicates("psn_number").set_index("psn_number")
+        employees = pd.Series(clockins.employee_ids).map(
+            stationed["facility_stationed"]
+        )
+        codes = _state_codes(states, employees)
+        if not _in_order(codes):
+            columns = np.argsort(codes, kind="stable")
+            ordered["clockins"] = replace(
+                clockins,
+                employee_ids=clockins.employee_ids[columns],
+                department_codes=clockins.department_codes[columns],
+                seconds=np.ascontiguousarray(clockins.seconds[:, columns]),
+            )
+    return ordered
+
+
+def _range(mask):
+    """The slice of the rows in mask when they are contiguous, else mask."""
+    rows = np.flatnonzero(mask)
+    if len(rows) and rows[-1] - rows[0] + 1 == len(rows):
+        return slice(rows[0], rows[-1] + 1)
+    if not len(rows):
+        return slice(0, 0)
+    return np.asarray(mask)
+
+
+def _rows(df, mask):
+    """The rows of df in mask, a view of df when they are contiguous."""
+    rows = _range(mask)
+    if isinstance(rows, slice):
+        return df.iloc[rows].reset_index(drop=True)
+    return df[rows].reset_index(drop=True)
+
+
+def build_shard(snapshot, state):
+    """The snapshot narrowed to the facilities of one state.
+
+    The facts are sliced, not copied, from the national frames when they
+    are in state order (see order_by_state).
+    """
+    states_df, lgas_df, wards_df, facilities_df = geography(snapshot, state)
+    facilities = tuple(facilities_df["name"])
+    hr = snapshot.merged_hr_data
+    merged_hr_data = _rows(hr, hr["facility_stationed"].isin(facilities))
+
+    frames = dict(
+        states_df=states_df.reset_index(drop=True),
+        lgas_df=lgas_df.reset_index(drop=True),
+        wards_df=wards_df.reset_index(drop=True),
+        facilities_df=facilities_df.reset_index(drop=True),
+        merged_hr_data=merged_hr_data,
+        state=state,
+        facility_scope=facilities,
+    )
+    # The fact frames are None when an SQL engine holds the facts; the
+    # queries then filter by facility_scope instead
+    if snapshot.visit_counts_df is not None:
+        visits = snapshot.visit_counts_df
+        frames["visit_counts_df"] = _rows(
+            visits, visits["facility_name"].isin(facilities)
+        )
+    if snapshot.patients_df is not None:
+        patients = snapshot.patients_df
+        frames["patients_df"] = _rows(
+            patients, patients["facility_name"].isin(facilities)
+        )
+    if snapshot.clockins is not None:
+        # Employees are placed by the facility they are stationed at
+        clockins = snapshot.clockins
+        columns = _range(
+            np.isin(clockins.employee_ids, merged_hr_data["psn_number"].to_numpy())
+        )
+        frames["clockins"] = replace(
+            clockins,
+            employee_ids=clockins.employee_ids[columns],
+            department_codes=clockins.department_codes[columns],
+            seconds=clockins.seconds[:, columns],
+        )
+    return replace(snapshot, **frames)
+
+
+_shards = (None, {})
+_shards_lock = threading.Lock()
+
+
+def shard(snapshot, state):
+    """The snapshot's shard of a state; cut once per snapshot and state.
+
+    Unknown states get the unscoped snapshot.
+    """
+    global _shards
+    key = (snapshot.version, snapshot.built_at)
+    cached_key, shards = _shards
+    scoped = shards.get(state) if cached_key == key else None
+    if scoped is not None:
+        return scoped
+
+    with _shards_lock:
+        cached_key, shards = _shards
+        if cached_key != key:
+            # A new data version: the shards of the old one are dropped
+            shards = {}
+            _shards = (key, shards)
+        if state not in shards:
+            if not (snapshot.states_df["state_name"].str.upper() == state).any():
+                # Not cached: any query string must not grow the cache
+                logger.info("Unknown state %r, serving every state", state)
+                return snapshot
+            shards[state] = build_shard(snapshot, state)
+        return shards[state]
@@ -0,0 +1,187 @@
+"""Snapshot frames published as memory-mapped Arrow files.
+
+For deployments where workers are not forked from one preloaded master
+(rolling restarts, several containers on one host), the finalized frames
+are written once per data version into THWP_SHARED_DATA_DIR, ideally on
+tmpfs (/dev/shm), next to plain numpy arrays (the clock-in matrix) as
+.npy files. Every worker maps the same files and wraps the column
+buffers without copying, so the data lives in RAM once however many
+workers attach, and a new worker attaches in milliseconds.
+
+    python -m components.shared_data     # publish ahead of time (optional)
+"""
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+logger = logging.getLogger(__name__)
+
+SHARED_DATA_DIR = os.environ.get("THWP_SHARED_DATA_DIR")
+
+# Older versions are deleted on publish; workers still mapping them keep
+# their pages until they swap to the new version
+KEEP_SEGMENTS = 2
+
+MANIFEST = "manifest.json"
+
+# Changed with what a segment holds, so older segments are not attached
+FORMAT = 3
+
+
+def segment_name(signature):
+    """Directory name of the segment holding one version of the data."""
+    key = json.dumps([FORMAT, signature])
+    return "v-" + hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def _column_to_arrow(series):
+    if isinstance(series.dtype, pd.StringDtype) or series.dtype == object:
+        return pa.array(series, type=pa.large_string(), from_pandas=True)
+    if pd.api.types.is_extension_array_dtype(series.dtype) and not series.hasnans:
+        # e.g. UInt32 week numbers: plain numpy when there is nothing masked
+        series = series.astype(series.dtype.numpy_dtype)
+    if isinstance(series.dtype, np.dtype):
+        # from_pandas=False keeps NaN as a float value, not a null, so the
+        # column maps back to numpy without a copy
+        return pa.array(series.to_numpy(), from_pandas=False)
+    return pa.array(series, from_pandas=True)
+
+
+def frame_to_arrow(df):
+    return pa.table({column: _column_to_arrow(df[column]) for column in df.columns})
+
+
+def _string_type(arrow_type):
+    if arrow_type in (pa.string(), pa.large_string()):
+        return pd.StringDtype("pyarrow", na_value=np.nan)
+    return None
+
+
+def map_frame(path):
+    """DataFrame whose columns point straight into the memory-mapped file."""
+    table = ipc.open_file(pa.memory_map(path)).read_all()
+    return table.to_pandas(split_blocks=True, types_mapper=_string_type)
+
+
+def map_array(path):
+    """Read-only numpy array pointing straight into the memory-mapped file."""
+    return np.asarray(np.load(path, mmap_mode="r"))
+
+
+def publish(frames, signature, directory=SHARED_DATA_DIR):
+    """Write the frames (DataFrames, or numpy arrays of numbers and dates)
+    as a new segment; a no-op if it already exists."""
+    path = os.path.join(directory, segment_name(signature))
+    if os.path.exists(path):
+        return path
+
+    # Written aside and renamed, so readers never see a partial segment
+    staging = tempfile.mkdtemp(prefix=".staging-", dir=directory)
+    arrays = sorted(name for name, df in frames.items() if isinstance(df, np.ndarray))
+    try:
+        for name, df in frames.items():
+            if name in arrays:
+                np.save(os.path.join(staging, name + ".npy"), df, allow_pickle=False)
+                continue
+            table = frame_to_arrow(df)
+            with pa.OSFile(os.path.join(staging, name + ".arrow"), "wb") as sink:
+                with ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+        with open(os.path.join(staging, MANIFEST), "w") as manifest:
+            json.dump(
+                {
+                    "signature": signature,
+                    "frames": sorted(set(frames) - set(arrays)),
+                    "arrays": arrays,
+                    "published_at": time.time(),
+                },
+                manifest,
+            )
+        os.chmod(staging, 0o755)
+        os.rename(staging, path)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    logger.info("Published shared data segment %s", path)
+    prune(directory, keep=path)
+    return path
+
+
+def prune(directory, keep):
+    segments = sorted(
+        (
+            entry.path
+            for entry in os.scandir(directory)
+            if entry.is_dir() and entry.name.startswith("v-") and entry.path != keep
+        ),
+        key=os.path.getmtime,
+        reverse=True,
+    )
+    for path in segments[KEEP_SEGMENTS - 1 :]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def attach(signature, directory=SHARED_DATA_DIR):
+    """Map the segment for this data version, or None if not published."""
+    path = os.path.join(directory, segment_name(signature))
+    try:
+        with open(os.path.join(path, MANIFEST)) as manifest:
+            contents = json.load(manifest)
+        frames = {
+            name: map_frame(os.path.join(path, name + ".arrow"))
+            for name in contents["frames"]
+        }
+        for name in contents["arrays"]:
+            frames[name] = map_array(os.path.join(path, name + ".npy"))
+        return frames
+    except FileNotFoundError:
+        return None
+
+
+def attach_or_publish(signature, load_frames, directory=SHARED_DATA_DIR):
+    """Attach to the published frames, building and publishing them first
+    if this is the first process to need this version of the data."""
+    os.makedirs(directory, exist_ok=True)
+    start = time.perf_counter()
+    frames = attach(signature, directory)
+    if frames is None:
+        # One process builds while the others wait on the lock, then attach
+        with open(os.path.join(directory, ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            frames = attach(signature, directory)
+            if frames is None:
+                publish(load_frames(), signature, directory)
+                frames = attach(signature, directory)
+    logger.info(
+        "Attached shared data segment %s in %.1f ms",
+        segment_name(signature),
+        (time.perf_counter() - start) * 1000,
+    )
+    return frames
+
+
+if __name__ == "__main__":
+    from components import datastore
+
+    logging.basicConfig(level=logging.INFO)
+    directory = SHARED_DATA_DIR or "/dev/shm/thwp"
+    os.makedirs(directory, exist_ok=True)
+    print(
+        publish(
+            datastore.shared_frames(),
+            datastore.data_signature(),
+            directory,
+        )
+    )
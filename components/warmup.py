@@ -0,0 +1,311 @@
+"""Warm-up of the chart results at boot and after every data refresh.
+
+The first supervisors to open the dashboard in the morning, or after new
+data went live, would otherwise wait for every chart to be computed. A
+background thread computes the figure callbacks' results ahead of them
+(see coalesce.warm) and the callbacks answer from those until the data
+changes again. In order, it warms:
+
+- every page as it first loads (the default filters);
+- the THWP_WARMUP_TOP calls requested most often, counted from the
+  access log the callbacks write to THWP_WARMUP_LOG (see coalesce.py);
+- the views listed in the JSON file THWP_WARMUP_VIEWS or, without one,
+  each facility and each month of the latest year of the data.
+
+A view is a page and the values it sets on top of the page's defaults:
+
+    {"path": "/visitation", "search": "?state=GOMBE",
+     "values": {"vs-facility-filter.value": ["..."]}}
+
+It stops early when the worker holds THWP_WARM_RESULTS results. Each
+gunicorn worker warms its own; with THWP_COALESCE_DIR set each result is
+still computed once, and the other workers take it from there. Background
+callback jobs are forked from the worker and see its warmed results too.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from urllib.parse import parse_qsl
+
+import dash
+import pandas as pd
+from dash._utils import to_json
+from dash.development.base_component import Component
+
+from components import coalesce, datastore, kpis, query
+
+logger = logging.getLogger(__name__)
+
+# THWP_WARMUP=0 turns the warm-up off
+WARMUP = os.environ.get("THWP_WARMUP", "1") != "0"
+
+# Most requested calls of the access log to warm
+WARMUP_TOP = int(os.environ.get("THWP_WARMUP_TOP", "50"))
+
+WARMUP_VIEWS = os.environ.get("THWP_WARMUP_VIEWS")
+
+# Bytes read from the end of the access log: its recent requests
+ACCESS_LOG_TAIL = 8 * 1024 * 1024
+
+# The facility filter of the pages the built-in views narrow to a facility
+FACILITY_FILTERS = {
+    "/visitation": "vs-facility-filter",
+    "/human-resources": "hr-facility-filter",
+}
+
+# The date range picker, and the bounds of its data, of the pages the
+# built-in views narrow to a month
+DATE_RANGES = {
+    "/visitation": ("date-picker", query.visit_date_bounds),
+    "/attendance": ("date-range", query.timecard_date_bounds),
+}
+
+
+def page_values(page, search=""):
+    """The values a page's components load with, as the browser gets them,
+    keyed "<id>.<property>"."""
+    layout = page["layout"]
+    if callable(layout):
+        layout = layout(**dict(parse_qsl(search.lstrip("?"))))
+    values = {}
+    for component in [layout, *layout._traverse()]:
+        if not isinstance(component, Component):
+            continue
+        props = component.to_plotly_json()["props"]
+        if isinstance(props.get("id"), str):
+            for prop, value in props.items():
+                if prop != "children":
+                    values[f"{props['id']}.{prop}"] = value
+    # Through JSON, as they travel: dates become ISO strings
+    return json.loads(to_json(values))
+
+
+def view_calls(app, view):
+    """The figure callbacks a view runs on load, as (name, inputs) pairs."""
+    pages = {page["path"]: page for page in dash.page_registry.values()}
+    search = view.get("search", "")
+    values = {
+        **page_values(pages[view["path"]], search),
+        "url.search": search,
+        **view.get("values", {}),
+    }
+    ids = {key.rsplit(".", 1)[0] for key in values}
+    calls = []
+    for entry in app.callback_map.values():
+        name = getattr(entry.get("callback"), "single_flight_name", None)
+        dependencies = entry["inputs"] + entry["state"]
+        if name is None or not all(dep["id"] in ids for dep in dependencies):
+            continue
+        # Inputs and state in the order the callback takes them
+        flat = [values.get(f"{dep['id']}.{dep['property']}") for dep in dependencies]
+        calls.append((name, [flat[i] for i in entry["inputs_state_indices"]]))
+    return calls
+
+
+def default_views():
+    """Every page as it first loads."""
+    return [{"path": page["path"]} for page in dash.page_registry.values()]
+
+
+def builtin_views(snapshot):
+    """Each facility, and each month of the latest year of the data."""
+    views = []
+    facilities = snapshot.facilities_df["name"].dropna().unique()
+    for path, filter_id in FACILITY_FILTERS.items():
+        views += [
+            {"path": path, "values": {f"{filter_id}.value": [facility]}}
+            for facility in facilities
+        ]
+    for path, (picker_id, date_bounds) in DATE_RANGES.items():
+        last_date = date_bounds(snapshot)[1]
+        if pd.isna(last_date):
+            continue
+        for month in pd.period_range(f"{last_date.year}-01", last_date, freq="M"):
+            # As the picker sends a picked day
+            start, end = (
+                day.strftime("%Y-%m-%d") for day in (month.start_time, month.end_time)
+            )
+            values = {f"{picker_id}.start_date": start, f"{picker_id}.end_date": end}
+            views.append({"path": path, "values": values})
+    return views
+
+
+def configured_views(snapshot):
+    """The views of THWP_WARMUP_VIEWS, or the built-in ones."""
+    if not WARMUP_VIEWS:
+        return builtin_views(snapshot)
+    with open(WARMUP_VIEWS) as views:
+        return json.load(views)
+
+
+def logged_calls(top=WARMUP_TOP):
+    """The calls of the access log requested most often, most first."""
+    if not coalesce.ACCESS_LOG or top <= 0:
+        return []
+    try:
+        with open(coalesce.ACCESS_LOG, "rb") as log:
+            size = log.seek(0, os.SEEK_END)
+            log.seek(max(0, size - ACCESS_LOG_TAIL))
+            lines = log.read().splitlines()
+    except OSError:
+        return []
+    if size > ACCESS_LOG_TAIL:
+        # The first line read is most likely cut
+        lines = lines[1:]
+    counts, calls = Counter(), {}
+    for line in lines:
+        try:
+            name, args = json.loads(line)
+        except (ValueError, TypeError):
+            continue
+        if name in coalesce.CALLBACKS:
+            key = coalesce.key_of(name, args)
+            counts[key] += 1
+            calls.setdefault(key, (name, args))
+    return [calls[key] for key, _ in counts.most_common(top)]
+
+
+def _calls_of(app, views):
+    calls = []
+    for view in views:
+        try:
+            calls += view_calls(app, view)
+        except Exception:
+            logger.warning("Cannot warm up view %s", view, exc_info=True)
+    return calls
+
+
+def plan(app, snapshot):
+    """The calls to warm, in order, each once."""
+    calls = (
+        _calls_of(app, default_views())
+        + logged_calls()
+        + _calls_of(app, configured_views(snapshot))
+    )
+    planned = {}
+    for name, args in calls:
+        planned.setdefault(coalesce.key_of(name, args), (name, args))
+    return list(planned.values())
+
+
+_app = None
+_progress = {"state": "idle"}
+_progress_lock = threading.Lock()
+_thread = None
+_again = False
+# Whether a warm-up has run to its end in this process
+_finished = False
+
+
+def enabled():
+    """Whether the worker warms up at all."""
+    return WARMUP and _app is not None and coalesce.WARM_RESULTS > 0
+
+
+def warmed_up():
+    """Whether the worker is done with its first warm-up, or has none."""
+    return _finished or not enabled()
+
+
+def status():
+    """Progress of the latest warm-up, with how many results the worker
+    holds and the share of callback calls they answered."""
+    with _progress_lock:
+        progress = dict(_progress)
+    progress["cached"] = coalesce.warmed_results()
+    progress["hit_rate"] = (
+        round(coalesce.hits / coalesce.lookups, 3) if coalesce.lookups else None
+    )
+    return progress
+
+
+def _report(**progress):
+    with _progress_lock:
+        _progress.update(progress)
+
+
+def warm_up(app):
+    """Warm the results of the live data, in the calling thread."""
+    snapshot = datastore.current()
+    started = time.time()
+    _report(
+        state="running",
+        version=snapshot.version,
+        planned=None,
+        warmed=0,
+        failed=0,
+        started=started,
+        finished=None,
+    )
+    # The running totals behind the KPI cards, which are not cached
+    kpis.visit_sums(snapshot)
+    kpis.attendance_sums(snapshot)
+    calls = plan(app, snapshot)
+    _report(planned=len(calls))
+    warmed = failed = 0
+    for name, args in calls:
+        if datastore.current().version != snapshot.version:
+            # Newer data went live; its own warm-up follows
+            break
+        try:
+            if not coalesce.warm(name, args):
+                # The worker holds as many results as it keeps
+                break
+        except Exception:
+            failed += 1
+            logger.warning("Warm-up of %s failed", name, exc_info=True)
+        else:
+            warmed += 1
+        _report(warmed=warmed, failed=failed)
+    _report(state="done", finished=time.time())
+    logger.info(
+        "Warm-up of data v%s: %d of %d calls cached in %.1fs (%d failed)",
+        snapshot.version,
+        warmed,
+        len(calls),
+        time.time() - started,
+        failed,
+    )
+
+
+def _run():
+    global _thread, _again, _finished
+    while True:
+        try:
+            warm_up(_app)
+        except Exception:
+            # Not warmed up: the worker stays unready until one succeeds
+            logger.exception("Warm-up failed")
+            _report(state="failed", finished=time.time())
+        else:
+            _finished = True
+        with _progress_lock:
+            if not _again:
+                _thread = None
+                return
+            _again = False
+
+
+def start():
+    """Warm up in a background thread; once more after the running warm-up
+    if one is. Needs register(app) first."""
+    global _thread, _again
+    if not enabled():
+        return
+    with _progress_lock:
+        if _thread is not None:
+            _again = True
+            return
+        _thread = threading.Thread(target=_run, name="warm-up", daemon=True)
+        _thread.start()
+
+
+def register(app):
+    """Warm app's figure callbacks on start() and after every data refresh."""
+    global _app
+    _app = app
+    datastore.on_refresh(start)
@@ -0,0 +1,50 @@
+"""gunicorn settings for production.
+
+    gunicorn            # this file is read from the working directory
+
+The app and its datasets are loaded once in the master (preload_app) and
+shared copy-on-write by the forked workers, instead of every worker
+reading data/CSVs/ on its own.
+
+With GUNICORN_THREADS above 1 the workers are threaded (gthread) and
+serve that many requests at once from one copy of the data, e.g.
+
+    WEB_CONCURRENCY=2 GUNICORN_THREADS=8 gunicorn
+
+The data snapshots are immutable and the per-snapshot caches built under
+locks (see components/datastore.py), so threads need no other setup.
+
+Every worker warms the charts of the popular views in the background as
+it starts (see components/warmup.py); set THWP_COALESCE_DIR so they
+compute each chart once between them.
+Route traffic on GET /readyz, which answers 503 until the worker's data
+is loaded and a warm-up has run to its end (see components/health.py).
+"""
+
+import os
+
+from components import datastore, warmup
+from components.memory import format_memory, process_memory
+
+wsgi_app = "wsgi:server"
+bind = os.environ.get("BIND", f"0.0.0.0:{os.environ.get('PORT', '8000')}")
+workers = int(os.environ.get("WEB_CONCURRENCY", "4"))
+# Requests served at once per worker; above 1 gunicorn runs gthread workers
+threads = int(os.environ.get("GUNICORN_THREADS", "1"))
+preload_app = True
+timeout = 120
+
+
+def when_ready(server):
+    server.log.info("Master memory after preload: %s", format_memory(process_memory()))
+
+
+def post_fork(server, worker):
+    # Threads do not survive fork(), so each worker runs its own refresher
+    datastore.start_refresh_scheduler()
+
+
+def post_worker_init(worker):
+    worker.log.info("Worker %s memory: %s", worker.pid, format_memory(process_memory()))
+    # Once the app is loaded: the charts of the popular views, in the background
+    warmup.start()
@@ -1,22 +1,22 @@
 import dash
 from dash import dcc, html, Input, Output
 import dash_bootstrap_components as dbc
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 
+from components import datastore, kpis, periods, punctuality, query, shards
+
 # Register this page with a different path
 dash.register_page(__name__, path="/attendance")
 
-# Load the CSV file
-df = pd.read_csv("data/CSVs/cleaned_hrh_timecard_data.csv")
-
-# Ensure date and time columns are in the correct format
-df["date"] = pd.to_datetime(df["date"])
-
 
 # Define layout function
-def layout():
+def layout(state=None, **kwargs):
+    # Read per page load so the year and date bounds follow data refreshes;
+    # the state in the query string (?state=GOMBE) scopes the page
+    snapshot = datastore.current(shards.state_name(state))
+    first_date, last_date = query.timecard_date_bounds(snapshot)
+
     return dbc.Container(
         [
             dbc.Row(
@@ -46,9 +46,9 @@ def layout():
                                                         "label": year,
                                                         "value": year,
                                                     }
-                                                    for year in df[
-                                                        "date"
-                                                    ].dt.year.unique()
+                                                    for year in query.timecard_years(
+                                                        snapshot
+                                                    )
                                                 ],
                                                 clearable=False,
                                             ),
@@ -60,20 +60,43 @@ def layout():
                                             # Date range picker
                                             dcc.DatePickerRange(
                                                 id="date-range",
-                                                min_date_allowed=df["date"].min(),
-                                                max_date_allowed=df["date"].max(),
-                                                start_date=df["date"].min(),
-                                                end_date=df["date"].max(),
+                                                min_date_allowed=first_date,
+                                                max_date_allowed=last_date,
+                                                start_date=first_date,
+                                                end_date=last_date,
                                             ),
                                         ],
                                         width=5,
                                     ),
-                                    dbc.Col(
-                                        width=1,
-                                    ),
+                                    # Prior period laid over the charts
+                                    dbc.Col(periods.toggle("att-compare"), width=3),
                                 ],
                                 className="mb-4",
                             ),
+                            # Headline numbers of the selected year or dates
+                            dbc.Row(
+                                [
+                                    kpis.card("Clock-ins", "att-kpi-clockins"),
+                                    kpis.card(
+                                        "Attendees per Day", "att-kpi-daily-attendees"
+                                    ),
+                                    kpis.card(
+                                        f"Late (after {punctuality.SHIFT_START})",
+                                        "att-kpi-late",
+                                    ),
+                                ],
+                                className="bg-success py-1 mb-4",
+                            ),
+                            # Progress of chart updates running as background jobs
+                            dbc.Progress(
+                                id="att-progress",
+                                value=0,
+                                max=3,
+                                striped=True,
+                                animated=True,
+                                color="success",
+                                style={"display": "none"},
+                            ),
                             # 1 - charts
                             dbc.Row(
                                 [
@@ -120,6 +143,104 @@ def layout():
                                 ],
                                 className="my-4",
                             ),
+                            # 3 - punctuality
+                            dbc.Row(
+                                [
+                                    dbc.Col(
+                                        [
+                                            html.Label("Rank by:"),
+                                            dcc.Dropdown(
+                                                id="punctuality-level",
+                                                options=[
+                                                    {
+                                                        "label": level.title(),
+                                                        "value": level,
+                                                    }
+                                                    for level in punctuality.LEVELS
+                                                ],
+                                                value="employee",
+                                                clearable=False,
+                                            ),
+                                        ],
+                                        width=3,
+                                    ),
+                                    dbc.Col(
+                                        [
+                                            html.Label("Shift start (HH:MM):"),
+                                            dbc.Input(
+                                                id="shift-start",
+                                                type="text",
+                                                value=punctuality.SHIFT_START,
+                                                debounce=True,
+                                            ),
+                                        ],
+                                        width=2,
+                                    ),
+                                ],
+                                className="mb-2",
+                            ),
+                            dbc.Row(
+                                [
+                                    dbc.Col(
+                                        [
+                                            html.Div(
+                                                [
+                                                    # Lateness ranking
+                                                    dcc.Graph(id="punctuality-ranking")
+                                                ],
+                                                style={
+                                                    "background-color": "#f8f9fa",  # Light background color for the container
+                                                    "padding": "20px",
+                                                    "border-radius": "10px",  # Rounded corners
+                                                    "box-shadow": "0px 4px 8px rgba(0, 0, 0, 0.2)",  # Box shadow effect
+                                                },
+                                            ),
+                                        ],
+                                        width=12,
+                                    ),
+                                ],
+                                className="my-4",
+                            ),
+                            # 4 - absenteeism against the HR roster
+                            dbc.Row(
+                                [
+                                    dbc.Col(
+                                        [
+                                            html.Div(
+                                                [
+                                                    # Absence rate and coverage gaps per facility
+                                                    dcc.Graph(id="absence-facilities")
+                                                ],
+                                                style={
+                                                    "background-color": "#f8f9fa",  # Light background color for the container
+                                                    "padding": "20px",
+                                                    "border-radius": "10px",  # Rounded corners
+                                                    "box-shadow": "0px 4px 8px rgba(0, 0, 0, 0.2)",  # Box shadow effect
+                                                },
+                                            ),
+                                        ],
+                                        width=6,
+                                    ),
+                                    dbc.Col(
+                                        [
+                                            html.Div(
+                                                [
+                                                    # Employees absent the longest
+                                                    dcc.Graph(id="absence-streaks")
+                                                ],
+                                                style={
+                                                    "background-color": "#f8f9fa",  # Light background color for the container
+                                                    "padding": "20px",
+                                                    "border-radius": "10px",  # Rounded corners
+                                                    "box-shadow": "0px 4px 8px rgba(0, 0, 0, 0.2)",  # Box shadow effect
+                                                },
+                                            ),
+                                        ],
+                                        width=6,
+                                    ),
+                                ],
+                                className="my-4",
+                            ),
                         ],
                         width=12,
                     ),
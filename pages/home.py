@@ -1,184 +1,104 @@
 import dash
 from dash import dcc, html
 import dash_bootstrap_components as dbc
+import numpy as np
 import pandas as pd
-import plotly.express as px
 
-# from components.sidebar import sidebar
-
-# Load CSV files into DataFrames
-patients_df = pd.read_csv("data/CSVs/cleaned_patients_data.csv")
-facilities_df = pd.read_csv("data/CSVs/facilities.csv")
-wards_df = pd.read_csv("data/CSVs/wards_gombe.csv")
-lgas_df = pd.read_csv("data/CSVs/lgas_gombe.csv")
-states_df = pd.read_csv("data/CSVs/states_gombe.csv")
-visitation_df = pd.read_csv("data/CSVs/cleaned_visitations_data.csv")
-hr_personal_df = pd.read_csv("data/CSVs/cleaned_hrh_personal_data.csv")
-
-patients_visitation_df = pd.merge(
-    visitation_df, patients_df, left_on="patient_id", right_on="patient_id"
-)
-
-# Merge datasets to create necessary relationships
-wards_lgas_df = pd.merge(wards_df, lgas_df, left_on="lga_id", right_on="id")
-facilities_wards_df = pd.merge(
-    facilities_df, wards_df, left_on="ward_id", right_on="id"
-)
-
-patients_wards_df = pd.merge(
-    patients_df, wards_df, left_on="ward_name", right_on="name"
-)
-
-patients_wards_lgas_df = pd.merge(
-    patients_wards_df, lgas_df, left_on="lga_id", right_on="id"
-)
-
-# Calculate percentages
-total_patients = len(patients_df)
-# "{:.1f}K".format(...) formats the value to one decimal place and appends the "K" for thousands.
-# For example, if total_patients = 53240, the formatted value would be displayed as 53.2K.
-# formatted_total_patients = "{:.1f}K".format(total_patients / 1000)
-
-formatted_total_patients = "{:,}".format(total_patients)
-total_lgas = 1  # len(lgas_df)
-total_wards = len(wards_df)
-total_facilities = 24  # len(facilities_df)
-# Registration - Gender
-male_patients = patients_df.query('gender in ["male", "Male"]').shape[0]
-female_patients = patients_df.query('gender in ["female", "Female"]').shape[0]
-
-male_percentage = (male_patients / total_patients) * 100 if total_patients > 0 else 0
-formatted_male_percentage = "{:.2f}".format(male_percentage)
-female_percentage = (
-    (female_patients / total_patients) * 100 if total_patients > 0 else 0
-)
-formatted_female_percentage = "{:.2f}".format(female_percentage)
-
-# Visitation - Gender
-v_male_patients = patients_visitation_df.query('gender in ["male", "Male"]').shape[0]
-v_female_patients = patients_visitation_df.query(
-    'gender in ["female", "Female"]'
-).shape[0]
-
-male_percentage = (male_patients / total_patients) * 100 if total_patients > 0 else 0
-formatted_male_percentage = "{:.2f}".format(male_percentage)
-female_percentage = (
-    (female_patients / total_patients) * 100 if total_patients > 0 else 0
-)
-formatted_female_percentage = "{:.2f}".format(female_percentage)
+from components import datastore, figures, query, shards
 
+# from components.sidebar import sidebar
 
-# marital status
-married_patients = patients_df.query('marital_status in ["married", "Married"]').shape[
-    0
-]
-single_patients = patients_df.query('marital_status in  ["single", "Single"]').shape[0]
 
-formatted_single_patients = "{:,}".format(single_patients)
-formatted_married_patients = "{:,}".format(married_patients)
+def count_of(counts, *values):
+    """Sum of the counts of the given values (e.g. "male", "Male")."""
+    return int(sum(counts.get(value, 0) for value in values))
 
-# Calculate percentages
-hr_personal_df = pd.read_csv("data/CSVs/cleaned_hrh_personal_data.csv")
-total_employees = len(hr_personal_df)
-formatted_total_employees = "{:,}".format(total_employees)
 
-# Personal - Disability
-disability_status_employees = hr_personal_df.query("disability_status in [1, 1]").shape[
-    0
-]
+def overview(snapshot):
+    """Headline totals and patient attribute counts of a (state) snapshot."""
+    registered = {
+        column: query.patient_counts(snapshot, column)
+        for column in ("gender", "age_group", "marital_status")
+    }
+    first, last = query.visit_date_bounds(snapshot)
+    visiting = {
+        column: (
+            query.visit_counts(snapshot, column, None, first, last)
+            if pd.notna(first)
+            else pd.Series(dtype="int64")
+        )
+        for column in ("gender", "age_group", "marital_status")
+    }
 
-disability_status_percentage = (
-    (disability_status_employees / total_employees) * 100 if total_employees > 0 else 0
-)
-formatted_disability_status_percentage = "{:.2f}".format(disability_status_percentage)
+    # Facilities linked to a ward ("Nil" is a placeholder row), the LGAs
+    # they are in and every ward of those LGAs
+    facilities_df = snapshot.facilities_df[
+        snapshot.facilities_df["name"].str.upper() != "NIL"
+    ]
+    wards_df = snapshot.wards_df
+    lga_ids = wards_df.loc[wards_df["id"].isin(facilities_df["ward_id"]), "lga_id"]
+    return dict(
+        total_patients=int(registered["gender"].sum()),
+        total_lgas=lga_ids.nunique(),
+        total_wards=int(wards_df["lga_id"].isin(lga_ids).sum()),
+        total_facilities=int(facilities_df["ward_id"].isin(wards_df["id"]).sum()),
+        total_employees=len(snapshot.merged_hr_data),
+        registered=registered,
+        visiting=visiting,
+    )
 
-line_colors = [
-    "#062d14",
-    "#18a145",
-]
 
-# Bar chart for age group distribution
-desired_order = ["0-4", "5-9", "10-19", "20-29", "30-39", "40-49", "50-59", "60+"]
-# Custom hover template
-hovertemp = "<b>Age Group: </b> %{x} <br>"
-hovertemp += "<b>Patient Count: </b> %{y} <br>"
+# 🔹 Pie chart for patients by gender (registered or visiting)
+def gender_figure(male, female):
+    return figures.figure(
+        "home-gender-pie",
+        {"labels": ["Male", "Female"], "values": np.array([male, female])},
+    )
 
-# Custom hover template for pie chart
-ms_hovertemp = "<b>Status: </b> %{label}<br>"
-ms_hovertemp += "<b>Count: </b> %{value}<br>"
-ms_hovertemp += "<b>Percentage: </b> %{percent:.2%}<extra></extra>"
 
-# Custom hover template for pie chart
-g_hovertemp = "<b>Gender: </b> %{label}<br>"
-g_hovertemp += "<b>Count: </b> %{value}<br>"
-g_hovertemp += "<b>Percentage: </b> %{percent:.2%}<extra></extra>"
+# 🔹 Bar chart for patients by age group (registered or visiting)
+def age_figure(counts):
+    return figures.category_bars(
+        "home-age-bar",
+        figures.VISIT_AGE_GROUPS,
+        [counts.get(age_group, 0) for age_group in figures.VISIT_AGE_GROUPS],
+        figures.VISIT_AGE_COLORS,
+    )
 
-# Define custom colors for marital statuses
-marital_status_colors = {
-    "Single": "#062d14",
-    "Married": "#15522a",
-}
 
-# 🔹 Bar Chart for Registered Patients (patients_df)
-registered_marital_chart = dcc.Graph(
-    figure=px.bar(
-        x=list(marital_status_colors.keys()),
-        y=[
-            patients_df["marital_status"].value_counts().get(status, 0)
-            for status in marital_status_colors.keys()
-        ],
-        color=list(marital_status_colors.keys()),
-        color_discrete_map=marital_status_colors,
-        labels={"x": "", "y": "Count"},
+# 🔹 Bar Chart for patients by marital status (registered or visiting)
+def marital_chart(counts):
+    return dcc.Graph(
+        figure=figures.category_bars(
+            "home-marital-bar",
+            list(figures.MARITAL_COLORS),
+            [counts.get(status, 0) for status in figures.MARITAL_COLORS],
+            figures.MARITAL_COLORS,
+        ),
     )
-    .update_traces(
-        hovertemplate="<b>Status:</b> %{x}<br><b>Count:</b> %{y}<extra></extra>"
-    )
-    .update_layout(
-        showlegend=False,
-        plot_bgcolor="rgba(0,0,0,0)",
-        paper_bgcolor="rgba(0,0,0,0)",
-        # legend_title_text="Marital Status",  # Custom legend title
-        title={
-            "text": "<b><u>Patients by Marital Status</u></b>",
-            "font": {"color": "#1E1E1E"},
-        },
-    ),
-)
 
-# 🔹 Bar Chart for Visiting Patients (patients_visitation_df)
-visiting_marital_chart = dcc.Graph(
-    figure=px.bar(
-        x=list(marital_status_colors.keys()),
-        y=[
-            patients_visitation_df["marital_status"].value_counts().get(status, 0)
-            for status in marital_status_colors.keys()
-        ],
-        color=list(marital_status_colors.keys()),
-        color_discrete_map=marital_status_colors,
-        labels={"x": "", "y": "Count"},
-    )
-    .update_traces(
-        hovertemplate="<b>Status:</b> %{x}<br><b>Count:</b> %{y}<extra></extra>"
-    )
-    .update_layout(
-        showlegend=False,
-        plot_bgcolor="rgba(0,0,0,0)",
-        paper_bgcolor="rgba(0,0,0,0)",
-        # legend_title_text="Marital Status",  # Custom legend title
-        title={
-            "text": "<b><u>Patients by Marital Status</u></b>",
-            "font": {"color": "#1E1E1E"},
-        },
-    ),
-)
 
 # Register this page in Dash's page registry
 dash.register_page(__name__, path="/")
 
 
 # Define layout function
-def layout():
+def layout(state=None, **kwargs):
+    # Totals of the state in the query string (?state=GOMBE), or of all
+    totals = overview(datastore.current(shards.state_name(state)))
+    registered, visiting = totals["registered"], totals["visiting"]
+    formatted_total_patients = "{:,}".format(totals["total_patients"])
+    formatted_total_employees = "{:,}".format(totals["total_employees"])
+    total_lgas = totals["total_lgas"]
+    total_wards = totals["total_wards"]
+    total_facilities = totals["total_facilities"]
+    registered_marital_chart = marital_chart(registered["marital_status"])
+    visiting_marital_chart = marital_chart(visiting["marital_status"])
+    male_patients = count_of(registered["gender"], "male", "Male")
+    female_patients = count_of(registered["gender"], "female", "Female")
+    v_male_patients = count_of(visiting["gender"], "male", "Male")
+    v_female_patients = count_of(visiting["gender"], "female", "Female")
+
     return dbc.Container(
         [
             dbc.Row(
@@ -356,31 +276,9 @@ def layout():
                                             html.Div(
                                                 [
                                                     dcc.Graph(
-                                                        figure=px.pie(
-                                                            values=[
-                                                                male_patients,
-                                                                female_patients,
-                                                            ],
-                                                            names=[
-                                                                "Male",
-                                                                "Female",
-                                                            ],
-                                                            color_discrete_sequence=line_colors,
-                                                        )
-                                                        .update_traces(
-                                                            hovertemplate=g_hovertemp
-                                                        )  # Apply custom hover template
-                                                        .update_layout(
-                                                            showlegend=True,  # Remove legend
-                                                            plot_bgcolor="rgba(0,0,0,0)",  # Remove background color of plot area
-                                                            paper_bgcolor="rgba(0,0,0,0)",  # Remove background color of entire figure
-                                                            legend_title_text="Gender",  # Custom legend title
-                                                            title={
-                                                                "text": "<b><u>Patients by Gender</u></b>",  # Bold and underline title
-                                                                "font": {
-                                                                    "color": "#1E1E1E"
-                                                                },  # Set title color to green
-                                                            },
+                                                        figure=gender_figure(
+                                                            male_patients,
+                                                            female_patients,
                                                         ),
                                                         config={
                                                             "displayModeBar": True
@@ -403,44 +301,8 @@ def layout():
                                             html.Div(
                                                 [
                                                     dcc.Graph(
-                                                        figure=px.bar(
-                                                            x=desired_order,
-                                                            y=[
-                                                                patients_df["age_group"]
-                                                                .value_counts()
-                                                                .get(age_group, 0)
-                                                                for age_group in desired_order
-                                                            ],
-                                                            color=desired_order,
-                                                            color_discrete_map={
-                                                                "0-4": "#062d14",
-                                                                "5-9": "#15522a",
-                                                                "10-19": "#165e2e",
-                                                                "20-29": "#177e38",
-                                                                "30-39": "#18a145",
-                                                                "40-49": "#25c258",
-                                                                "50-59": "#4cdc7a",
-                                                                "60+": "#88eda7",
-                                                            },
-                                                            labels={
-                                                                "x": "",
-                                                                "y": "Count",
-                                                            },
-                                                        )
-                                                        .update_traces(
-                                                            hovertemplate=hovertemp
-                                                        )  # Apply custom hover template
-                                                        .update_layout(
-                                                            showlegend=False,  # Remove legend
-                                                            plot_bgcolor="rgba(0,0,0,0)",  # Remove background color of plot area
-                                                            paper_bgcolor="rgba(0,0,0,0)",  # Remove background color of entire figure
-                                                            # legend_title_text="Age Group",  # Custom legend title
-                                                            title={
-                                                                "text": "<b><u>Patient by Age Group</u></b>",  # Bold and underline title
-                                                                "font": {
-                                                                    "color": "#1E1E1E"
-                                                                },  # Set title color to green
-                                                            },
+                                                        figure=age_figure(
+                                                            registered["age_group"]
                                                         ),
                                                         config={
                                                             "displayModeBar": False
@@ -494,31 +356,9 @@ def layout():
                                             html.Div(
                                                 [
                                                     dcc.Graph(
-                                                        figure=px.pie(
-                                                            values=[
-                                                                v_male_patients,
-                                                                v_female_patients,
-                                                            ],
-                                                            names=[
-                                                                "Male",
-                                                                "Female",
-                                                            ],
-                                                            color_discrete_sequence=line_colors,
-                                                        )
-                                                        .update_traces(
-                                                            hovertemplate=g_hovertemp
-                                                        )  # Apply custom hover template
-                                                        .update_layout(
-                                                            showlegend=True,  # Remove legend
-                                                            plot_bgcolor="rgba(0,0,0,0)",  # Remove background color of plot area
-                                                            paper_bgcolor="rgba(0,0,0,0)",  # Remove background color of entire figure
-                                                            legend_title_text="Gender",  # Custom legend title
-                                                            title={
-                                                                "text": "<b><u>Patients by Gender</u></b>",  # Bold and underline title
-                                                                "font": {
-                                                                    "color": "#1E1E1E"
-                                                                },  # Set title color to green
-                                                            },
+                                                        figure=gender_figure(
+                                                            v_male_patients,
+                                                            v_female_patients,
                                                         ),
                                                         config={
                                                             "displayModeBar": False
@@ -541,49 +381,8 @@ def layout():
                                             html.Div(
                                                 [
                                                     dcc.Graph(
-                                                        figure=px.bar(
-                                                            x=desired_order,
-                                                            y=[
-                                                                patients_visitation_df[
-                                                                    "age_group"
-                                                                ]
-                                                                .value_counts()
-                                                                .get(
-                                                                    age_group,
-                                                                    0,
-                                                                )
-                                                                for age_group in desired_order
-                                                            ],
-                                                            color=desired_order,
-                                                            color_discrete_map={
-                                                                "0-4": "#062d14",
-                                                                "5-9": "#15522a",
-                                                                "10-19": "#165e2e",
-                                                                "20-29": "#177e38",
-                                                                "30-39": "#18a145",
-                                                                "40-49": "#25c258",
-                                                                "50-59": "#4cdc7a",
-                                                                "60+": "#88eda7",
-                                                            },
-                                                            labels={
-                                                                "x": "",
-                                                                "y": "Count",
-                                                            },
-                                                        )
-                                                        .update_traces(
-                                                            hovertemplate=hovertemp
-                                                        )  # Apply custom hover template
-                                                        .update_layout(
-                                                            showlegend=False,  # Remove legend
-                                                            plot_bgcolor="rgba(0,0,0,0)",  # Remove background color of plot area
-                                                            paper_bgcolor="rgba(0,0,0,0)",  # Remove background color of entire figure
-                                                            # legend_title_text="Age Group",  # Custom legend title
-                                                            title={
-                                                                "text": "<b><u>Patient by Age Group</u></b>",  # Bold and underline title
-                                                                "font": {
-                                                                    "color": "#1E1E1E"
-                                                                },  # Set title color to green
-                                                            },
+                                                        figure=age_figure(
+                                                            visiting["age_group"]
                                                         ),
                                                         config={
                                                             "displayModeBar": False
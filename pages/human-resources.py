@@ -1,56 +1,22 @@
 import dash
 from dash import dcc, html, Input, Output
 import dash_bootstrap_components as dbc
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 
+from components import bitmaps, crossfilter, datastore, shards
+
 # Register this page with a different path
 dash.register_page(__name__, path="/human-resources")
 
-# Load CSV files into DataFrames
-hr_personal_df = pd.read_csv("data/CSVs/cleaned_hrh_personal_data.csv")
-
-facilities_df = pd.read_csv("data/CSVs/facilities.csv")
-wards_df = pd.read_csv("data/CSVs/wards.csv")
-lgas_df = pd.read_csv("data/CSVs/lgas.csv")
-states_df = pd.read_csv("data/CSVs/states.csv")
-
-# Merge datasets to create necessary relationships
-wards_lgas_df = pd.merge(wards_df, lgas_df, left_on="lga_id", right_on="id")
-facilities_wards_df = pd.merge(
-    facilities_df, wards_df, left_on="ward_id", right_on="id"
-)
-
-
-# Calculate percentages
-total_employees = len(hr_personal_df)
-formatted_total_employees = "{:,}".format(total_employees)
-
-# Registration - Gender
-male_employees = hr_personal_df.query('gender in ["male", "Male"]').shape[0]
-female_employees = hr_personal_df.query('gender in ["female", "Female"]').shape[0]
-
-male_percentage = (male_employees / total_employees) * 100 if total_employees > 0 else 0
-formatted_male_percentage = "{:.2f}".format(male_percentage)
-female_percentage = (
-    (female_employees / total_employees) * 100 if total_employees > 0 else 0
-)
-formatted_female_percentage = "{:.2f}".format(female_percentage)
-
-# Personal - Disability
-disability_status_employees = hr_personal_df.query("disability_status in [1, 1]").shape[
-    0
-]
-
-disability_status_percentage = (
-    (disability_status_employees / total_employees) * 100 if total_employees > 0 else 0
-)
-formatted_disability_status_percentage = "{:.2f}".format(disability_status_percentage)
-
 
 # Define layout function
-def layout():
+def layout(state=None, **kwargs):
+    # The state in the query string (?state=GOMBE) scopes every filter
+    snapshot = datastore.current(shards.state_name(state))
+    states_df = snapshot.states_df
+    index = bitmaps.hr_index(snapshot)
+
     return dbc.Container(
         [
             dbc.Row(
@@ -78,6 +44,7 @@ def layout():
                                                     "state_name"
                                                 ].unique()
                                             ],
+                                            value=snapshot.state,
                                             placeholder="Select State",
                                         ),
                                         width=2,
@@ -108,6 +75,103 @@ def layout():
                                         width=1,
                                     ),
                                 ],
+                                className="mb-2",
+                            ),
+                            # Roster attribute filters
+                            dbc.Row(
+                                [
+                                    dbc.Col(
+                                        dcc.Dropdown(
+                                            id="hr-gender-filter",
+                                            options=[
+                                                {"label": value, "value": value}
+                                                for value in index.values("gender")
+                                            ],
+                                            placeholder="Select Gender",
+                                            multi=True,
+                                        ),
+                                        width=2,
+                                    ),
+                                    dbc.Col(
+                                        dcc.Dropdown(
+                                            id="hr-cadre-filter",
+                                            options=[
+                                                {"label": value, "value": value}
+                                                for value in index.values("cadre")
+                                            ],
+                                            placeholder="Select Cadre",
+                                            multi=True,
+                                        ),
+                                        width=3,
+                                    ),
+                                    dbc.Col(
+                                        dcc.Dropdown(
+                                            id="hr-employment-type-filter",
+                                            options=[
+                                                {"label": value, "value": value}
+                                                for value in index.values(
+                                                    "employment_type"
+                                                )
+                                            ],
+                                            placeholder="Select Employment Type",
+                                            multi=True,
+                                        ),
+                                        width=2,
+                                    ),
+                                    dbc.Col(
+                                        dcc.Dropdown(
+                                            id="hr-qualification-filter",
+                                            options=[
+                                                {"label": value, "value": value}
+                                                for value in index.values(
+                                                    "qualification"
+                                                )
+                                            ],
+                                            placeholder="Select Qualification",
+                                            multi=True,
+                                        ),
+                                        width=3,
+                                    ),
+                                    dbc.Col(
+                                        dcc.Dropdown(
+                                            id="hr-age-group-filter",
+                                            options=[
+                                                {"label": value, "value": value}
+                                                for value in index.values("age_group")
+                                            ],
+                                            placeholder="Select Age Group",
+                                            multi=True,
+                                        ),
+                                        width=2,
+                                    ),
+                                ],
+                                className="mb-2",
+                            ),
+                            # The cadre tile clicked to narrow the other
+                            # charts (see crossfilter.py)
+                            dcc.Store(id="hr-crossfilter"),
+                            dbc.Row(
+                                [
+                                    dbc.Col(
+                                        html.Small(
+                                            crossfilter.HINT,
+                                            id="hr-crossfilter-label",
+                                            className="text-muted",
+                                        ),
+                                        width=4,
+                                        className="d-flex align-items-center",
+                                    ),
+                                    dbc.Col(
+                                        dbc.Button(
+                                            "Clear selection",
+                                            id="hr-crossfilter-clear",
+                                            color="success",
+                                            outline=True,
+                                            size="sm",
+                                        ),
+                                        width=2,
+                                    ),
+                                ],
                                 className="mb-4",
                             ),
                             # 1 - charts
@@ -8,8 +8,9 @@ import plotly.express as px
 dash.register_page(__name__, path="/payroll")
 
 
-# Define layout function
-def layout():
+# Define layout function (query string parameters such as ?state= arrive
+# as keyword arguments)
+def layout(**kwargs):
     return dbc.Container(
         fluid=True,
     )
@@ -1,62 +1,36 @@
 import dash
 from dash import dcc, html, Input, Output
 import dash_bootstrap_components as dbc
-import pandas as pd
 import plotly.express as px
 
-
-# Register this page in Dash's page registry
-dash.register_page(__name__, path="/visitation")
-
-# Load CSV files into DataFrames
-patients_df = pd.read_csv("data/CSVs/cleaned_patients_data.csv")
-facilities_df = pd.read_csv("data/CSVs/facilities.csv")
-wards_df = pd.read_csv("data/CSVs/wards.csv")
-lgas_df = pd.read_csv("data/CSVs/lgas.csv")
-states_df = pd.read_csv("data/CSVs/states.csv")
-
-# Merge datasets to create necessary relationships
-wards_lgas_df = pd.merge(wards_df, lgas_df, left_on="lga_id", right_on="id")
-facilities_wards_df = pd.merge(
-    facilities_df, wards_df, left_on="ward_id", right_on="id"
-)
-patients_wards_df = pd.merge(
-    patients_df, wards_df, left_on="ward_name", right_on="name"
-)
-patients_wards_lgas_df = pd.merge(
-    patients_wards_df, lgas_df, left_on="lga_id", right_on="id"
-)
-visitation_df = pd.read_csv("data/CSVs/cleaned_visitations_data.csv")
-# Merge without repeating similar columns
-patients_visitation_df = pd.merge(
-    patients_df.drop(columns=["state_name", "lga_name", "ward_name"]),
-    visitation_df.drop(columns=["patient_project_number", "facility_name"]),
-    on="patient_id",
-    how="inner",
-)
-
-
-# Convert start_date column to datetime format
-patients_visitation_df["start_date"] = pd.to_datetime(
-    patients_visitation_df["start_date"]
+from components import (
+    bitmaps,
+    crossfilter,
+    datastore,
+    facility_map,
+    figures,
+    kpis,
+    periods,
+    query,
+    shards,
 )
 
-# Extract day, month, and year into separate columns
-patients_visitation_df["start_day"] = patients_visitation_df["start_date"].dt.day
-patients_visitation_df["start_month"] = patients_visitation_df["start_date"].dt.month
-patients_visitation_df["start_year"] = patients_visitation_df["start_date"].dt.year
 
-# Extract week number and day of the week
-patients_visitation_df["week_number"] = (
-    patients_visitation_df["start_date"].dt.isocalendar().week
-)
-patients_visitation_df["day_of_week"] = patients_visitation_df[
-    "start_date"
-].dt.day_name()
+# Register this page in Dash's page registry
+dash.register_page(__name__, path="/visitation")
 
 
 # Define layout function
-def layout():
+def layout(state=None, **kwargs):
+    # Read per page load so the date bounds follow data refreshes; the state
+    # in the query string (?state=GOMBE) scopes the page to its shard
+    snapshot = datastore.current(shards.state_name(state))
+    states_df = snapshot.states_df
+    first_date, last_date = query.visit_date_bounds(snapshot)
+    # Patient attribute filters offer the values the patients have
+    genders = query.patient_counts(snapshot, "gender").index.fillna(bitmaps.MISSING)
+    age_groups = set(query.patient_counts(snapshot, "age_group").index)
+
     return dbc.Container(
         [
             dbc.Row(
@@ -84,6 +58,7 @@ def layout():
                                                     "state_name"
                                                 ].unique()
                                             ],
+                                            value=snapshot.state,
                                             placeholder="Select State",
                                         ),
                                         width=2,
@@ -113,19 +88,96 @@ def layout():
                                     dbc.Col(
                                         dcc.DatePickerRange(
                                             id="date-picker",
-                                            start_date=patients_visitation_df[
-                                                "start_date"
-                                            ].min(),
-                                            end_date=patients_visitation_df[
-                                                "start_date"
-                                            ].max(),
+                                            start_date=first_date,
+                                            end_date=last_date,
                                             display_format="YYYY-MM-DD",
                                         ),
                                         width=3,
                                     ),
                                 ],
+                                className="mb-2",
+                            ),
+                            # Patient attribute filters
+                            dbc.Row(
+                                [
+                                    dbc.Col(
+                                        dcc.Dropdown(
+                                            id="vs-gender-filter",
+                                            options=[
+                                                {"label": gender, "value": gender}
+                                                for gender in sorted(genders)
+                                            ],
+                                            placeholder="Select Gender",
+                                            multi=True,
+                                        ),
+                                        width=2,
+                                    ),
+                                    dbc.Col(
+                                        dcc.Dropdown(
+                                            id="vs-age-group-filter",
+                                            options=[
+                                                {"label": group, "value": group}
+                                                for group in figures.VISIT_AGE_GROUPS
+                                                if group in age_groups
+                                            ],
+                                            placeholder="Select Age Group",
+                                            multi=True,
+                                        ),
+                                        width=2,
+                                    ),
+                                    # Prior period laid over the charts
+                                    dbc.Col(periods.toggle("vs-compare"), width=2),
+                                    # The heatmap cell clicked to narrow the
+                                    # other charts (see crossfilter.py)
+                                    dcc.Store(id="vs-crossfilter"),
+                                    dbc.Col(
+                                        html.Small(
+                                            crossfilter.HINT,
+                                            id="vs-crossfilter-label",
+                                            className="text-muted",
+                                        ),
+                                        width=4,
+                                        className="d-flex align-items-center",
+                                    ),
+                                    dbc.Col(
+                                        dbc.Button(
+                                            "Clear selection",
+                                            id="vs-crossfilter-clear",
+                                            color="success",
+                                            outline=True,
+                                            size="sm",
+                                        ),
+                                        width=2,
+                                    ),
+                                ],
                                 className="mb-4",
                             ),
+                            # Progress of chart updates running as background jobs
+                            dbc.Progress(
+                                id="vs-progress",
+                                value=0,
+                                max=3,
+                                striped=True,
+                                animated=True,
+                                color="success",
+                                style={"display": "none"},
+                            ),
+                            # Headline numbers of the selected facilities and dates
+                            dbc.Row(
+                                [
+                                    kpis.card("Visits", "vs-kpi-visits"),
+                                    kpis.card("Visits per Day", "vs-kpi-daily-visits"),
+                                    kpis.card(
+                                        "Facilities Visited", "vs-kpi-facilities"
+                                    ),
+                                ],
+                                className="bg-success py-1 mb-4",
+                            ),
+                            # The skeleton each chart was last sent, so
+                            # filter changes only send the charts' new data
+                            dcc.Store(id="vs-charts-drawn"),
+                            dcc.Store(id="hourly-traffic-heatmap-drawn"),
+                            dcc.Store(id="visitation-chart-drawn"),
                             # 1- charts
                             dbc.Row(
                                 [
@@ -230,6 +282,53 @@ def layout():
                                 ],
                                 className="my-4",
                             ),
+                            # 4 - facility map
+                            dbc.Row(
+                                [
+                                    dbc.Col(
+                                        [
+                                            html.Label("Colour facilities by:"),
+                                            dcc.Dropdown(
+                                                id="map-metric",
+                                                options=[
+                                                    {"label": label, "value": metric}
+                                                    for (
+                                                        metric,
+                                                        label,
+                                                    ) in facility_map.METRICS.items()
+                                                ],
+                                                value="visits",
+                                                clearable=False,
+                                            ),
+                                        ],
+                                        width=3,
+                                    ),
+                                ],
+                                className="mb-2",
+                            ),
+                            dbc.Row(
+                                [
+                                    dbc.Col(
+                                        [
+                                            html.Div(
+                                                [
+                                                    dcc.Graph(
+                                                        id="facility-map",
+                                                        style={"height": "600px"},
+                                                    ),
+                                                ],
+                                                style={
+                                                    "background-color": "#f8f9fa",  # Light background color for the container
+                                                    "padding": "20px",
+                                                    "border-radius": "10px",  # Rounded corners
+                                                    "box-shadow": "0px 4px 8px rgba(0, 0, 0, 0.2)",  # Box shadow effect
+                                                },
+                                            ),
+                                        ]
+                                    )
+                                ],
+                                className="my-4",
+                            ),
                         ],
                         width=12,
                     ),
@@ -0,0 +1,19 @@
+import os
+
+import pytest
+
+# Callbacks run in the request, without a diskcache job queue
+os.environ.setdefault("THWP_BACKGROUND_CALLBACKS", "0")
+
+
+@pytest.fixture(scope="session")
+def app():
+    """The dashboard, on the CSVs of data/CSVs."""
+    import app as dashboard
+
+    return dashboard.app
+
+
+@pytest.fixture
+def client(app):
+    return app.server.test_client()
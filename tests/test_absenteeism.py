@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from components import absenteeism
+
+# Monday 1 to Sunday 7 January 2024
+DATES = np.arange("2024-01-01", "2024-01-08", dtype="datetime64[D]")
+
+
+@pytest.fixture
+def presence():
+    # Clock-ins of e1, e2, e3 and x (off the roster); e4 never clocks in.
+    # Nobody clocks in on Thursday, so it is no working day, nor the weekend
+    present = np.array(
+        [
+            [1, 0, 1, 1],  # Mon
+            [0, 0, 1, 0],  # Tue
+            [0, 1, 0, 0],  # Wed
+            [0, 0, 0, 0],  # Thu
+            [1, 1, 0, 0],  # Fri
+            [1, 0, 0, 0],  # Sat
+            [0, 0, 0, 0],  # Sun
+        ],
+        dtype=bool,
+    )
+    hr = pd.DataFrame(
+        {
+            "psn_number": ["e1", "e2", "e3", "e4", "e1", None],
+            "facility_stationed": ["F1", "F1", "F2", "F2", "F9", "F1"],
+            "date_of_appointment": [
+                "2020-05-01",
+                "2024-01-03",
+                None,
+                "2019-01-01",
+                "2020-05-01",
+                "2020-05-01",
+            ],
+        }
+    )
+    return absenteeism.presence(
+        DATES,
+        np.array(["e1", "e2", "e3", "x"], dtype=object),
+        present,
+        absenteeism.roster(hr),
+    )
+
+
+def test_presence_lays_the_roster_over_the_working_days(presence):
+    assert presence.dates.tolist() == [
+        np.datetime64("2024-01-01"),
+        np.datetime64("2024-01-02"),
+        np.datetime64("2024-01-03"),
+        np.datetime64("2024-01-05"),
+    ]
+    # One row per PSN number, at its first listed facility
+    assert presence.employee_ids.tolist() == ["e1", "e2", "e3", "e4"]
+    assert presence.facilities.tolist() == ["F1", "F1", "F2", "F2"]
+    # e2 is expected from their appointment on Wednesday
+    assert presence.expected[1].tolist() == [False, False, True, True]
+    assert presence.enrolled.tolist() == [True, True, True, False]
+
+
+def test_streaks_are_the_longest_and_trailing_runs():
+    absent = np.array(
+        [
+            [1, 1, 0, 1, 1, 1, 0],
+            [0, 0, 0, 0, 0, 0, 0],
+            [0, 1, 0, 1, 1, 0, 1],
+            [1, 1, 1, 1, 1, 1, 1],
+        ],
+        dtype=bool,
+    )
+    longest, current = absenteeism.streaks(absent)
+
+    assert longest.tolist() == [3, 0, 2, 7]
+    assert current.tolist() == [0, 0, 1, 7]
+    assert absenteeism.streaks(np.zeros((2, 0), dtype=bool))[0].tolist() == [0, 0]
+
+
+def test_employee_absence(presence):
+    employees = absenteeism.employee_absence(presence).set_index("employee_id")
+
+    assert employees["expected_days"].tolist() == [4, 2, 4, 4]
+    assert employees["absent_days"].tolist() == [2, 0, 2, 4]
+    assert employees["absence_rate"].tolist() == [0.5, 0, 0.5, 1]
+    assert employees["longest_streak"].tolist() == [2, 0, 2, 4]
+    assert employees["current_streak"].tolist() == [0, 0, 2, 4]
+
+
+def test_facility_coverage_counts_gaps_below_the_threshold(presence):
+    coverage = absenteeism.facility_coverage(presence, threshold=0.5)
+
+    # The most absent first
+    assert coverage["facility"].tolist() == ["F2", "F1"]
+    f2, f1 = coverage.to_dict("records")
+    assert f1["staff"] == 2 and f1["enrolled"] == 2
+    assert f1["absence_rate"] == pytest.approx(1 - 4 / 6)
+    # Tuesday: nobody of one rostered; Wednesday: one of two is no gap
+    assert (f1["gap_days"], f1["unstaffed_days"], f1["working_days"]) == (1, 1, 4)
+    assert f2["enrolled"] == 1
+    assert f2["absence_rate"] == pytest.approx(0.75)
+    assert (f2["gap_days"], f2["unstaffed_days"], f2["working_days"]) == (2, 2, 4)
+
+
+def test_facility_days(presence):
+    days = absenteeism.facility_days(presence)
+    f1 = days[days["facility"] == "F1"]
+
+    assert f1["rostered"].tolist() == [1, 1, 2, 2]
+    assert f1["present"].tolist() == [1, 0, 1, 2]
+    assert f1["coverage"].tolist() == [1, 0, 0.5, 1]
@@ -0,0 +1,31 @@
+import pytest
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "end_date=2024-13-45",
+        "start_date=notadate",
+        "limit=ten",
+        "limit=-1",
+        "year=last",
+    ],
+)
+def test_bad_parameters_are_a_400(client, query):
+    response = client.get(f"/api/absenteeism/employees?{query}")
+
+    assert response.status_code == 400
+
+
+def test_unknown_level_is_a_404(client):
+    assert client.get("/api/absenteeism/wards").status_code == 404
+
+
+def test_records_are_limited(client):
+    response = client.get(
+        "/api/absenteeism/employees?start_date=2024-02-01&end_date=2024-02-29&limit=3"
+    )
+
+    assert response.status_code == 200
+    assert len(response.get_json()) == 3
+    assert {"facility", "enrolled"} <= set(response.get_json()[0])
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from components import bitmaps
+from components.bitmaps import MISSING
+
+
+@pytest.fixture
+def roster():
+    # 11 rows: the bitmaps do not fill their last byte
+    return pd.DataFrame(
+        {
+            "cadre": ["Nurse", "Doctor", None, "Nurse", "CHEW", "Doctor"] * 2,
+            "gender": ["Female", "Male", "Female", None, "Male", "Female"] * 2,
+        }
+    ).iloc[:11]
+
+
+@pytest.fixture
+def index(roster):
+    return bitmaps.build_index(roster, ("cadre", "gender"))
+
+
+def oracle(roster, filters):
+    filled = roster.fillna(MISSING)
+    mask = np.ones(len(roster), dtype=bool)
+    for column, values in filters.items():
+        if values:
+            values = [values] if isinstance(values, str) else values
+            mask &= filled[column].isin(values).to_numpy()
+    return mask
+
+
+@pytest.mark.parametrize(
+    "filters",
+    [
+        {},
+        {"cadre": []},
+        {"cadre": "Nurse"},
+        {"cadre": ["Nurse", "Doctor"]},
+        {"cadre": ["Nurse"], "gender": ["Female"]},
+        {"cadre": [MISSING]},
+        {"gender": [MISSING, "Male"], "cadre": ["CHEW", "Nurse"]},
+        {"cadre": ["Dentist"]},
+    ],
+)
+def test_mask_and_count_match_isin(roster, index, filters):
+    expected = oracle(roster, filters)
+
+    np.testing.assert_array_equal(index.mask(filters), expected)
+    assert index.count(filters) == expected.sum()
+    assert index.mask(filters).shape == (11,)
+
+
+def test_a_list_of_filters_matches_any_of_them(roster, index):
+    clauses = [{"cadre": ["Doctor"]}, {"gender": ["Male"], "cadre": ["Nurse"]}]
+    expected = oracle(roster, clauses[0]) | oracle(roster, clauses[1])
+
+    np.testing.assert_array_equal(index.mask(clauses), expected)
+    assert index.count([]) == 0
+
+
+def test_values_are_sorted_with_missing_last(index):
+    assert index.values("cadre") == ["CHEW", "Doctor", "Nurse", MISSING]
+    assert index.values("gender") == ["Female", "Male", MISSING]
+
+
+def test_selections_leave_the_bitmaps_as_they_were(index):
+    nurses = index.mask({"cadre": ["Nurse"]})
+    index.select({"cadre": ["Nurse", "Doctor"], "gender": ["Male"]})
+
+    np.testing.assert_array_equal(index.mask({"cadre": ["Nurse"]}), nurses)
+    assert not index.bitmaps["cadre"]["Nurse"].flags.writeable
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import stat
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from components import coalesce, datastore
+
+
+@pytest.fixture(autouse=True)
+def snapshot(monkeypatch):
+    snapshot = SimpleNamespace(version=3, built_at=1.5)
+    monkeypatch.setattr(datastore, "current", lambda state=None: snapshot)
+    monkeypatch.setattr(coalesce, "COALESCE", True)
+    monkeypatch.setattr(coalesce, "COALESCE_DIR", None)
+    monkeypatch.setattr(coalesce, "ACCESS_LOG", None)
+    # The callbacks wrapped here are not registered for the warm-up
+    monkeypatch.setattr(coalesce, "CALLBACKS", dict(coalesce.CALLBACKS))
+    return snapshot
+
+
+def test_keys_ignore_selection_order_and_empty_inputs():
+    key = coalesce.key_of("view", (["b", "a"], "", None, {"state": [2, 1]}))
+
+    assert key == coalesce.key_of("view", (["a", "b"], None, [], {"state": [1, 2]}))
+    assert key != coalesce.key_of("view", (["a"], None, None, {"state": [1, 2]}))
+    assert key != coalesce.key_of("other", (["a", "b"], None, None, {"state": [1, 2]}))
+    # set_progress is left out
+    assert coalesce.key_of("view", (print, 1)) == coalesce.key_of("view", (None, 1))
+
+
+class CountingEvent(threading.Event):
+    def __init__(self):
+        super().__init__()
+        self.waiting = 0
+
+    def wait(self, timeout=None):
+        self.waiting += 1
+        return super().wait(timeout)
+
+
+def in_flight(key):
+    """The flight of a key, once its first call started it."""
+    for _ in range(500):
+        flight = coalesce._flights.get(key)
+        if flight is not None:
+            return flight
+        time.sleep(0.01)
+    raise AssertionError(f"{key} never took off")
+
+
+def test_identical_concurrent_calls_compute_once():
+    started, release, calls = threading.Event(), threading.Event(), []
+
+    @coalesce.single_flight
+    def view(facilities, start_date):
+        calls.append(facilities)
+        started.set()
+        release.wait(5)
+        return {"facilities": facilities}
+
+    key = coalesce.key_of(view.single_flight_name, (["a", "b"], "2024-01-01"))
+    results = []
+    leader = threading.Thread(
+        target=lambda: results.append(view(["a", "b"], "2024-01-01"))
+    )
+    leader.start()
+    assert started.wait(5)
+    flight = in_flight(key)
+    flight.done = CountingEvent()
+    followers = [
+        threading.Thread(target=lambda: results.append(view(["b", "a"], "2024-01-01")))
+        for _ in range(4)
+    ]
+    for thread in followers:
+        thread.start()
+    while flight.done.waiting < 4:
+        time.sleep(0.01)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(5)
+
+    assert calls == [["a", "b"]]
+    assert len(results) == 5
+    assert all(result is results[0] for result in results)
+    # Nothing is kept once it finished
+    assert coalesce._flights == {}
+    view(["a", "b"], "2024-01-01")
+    assert len(calls) == 2
+
+
+def test_waiting_calls_get_the_error():
+    started, release, errors = threading.Event(), threading.Event(), []
+
+    @coalesce.single_flight
+    def failing(x):
+        started.set()
+        release.wait(5)
+        raise ValueError("boom")
+
+    def call():
+        try:
+            failing(1)
+        except ValueError as error:
+            errors.append(error)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    assert started.wait(5)
+    flight = in_flight(coalesce.key_of(failing.single_flight_name, (1,)))
+    flight.done = CountingEvent()
+    follower = threading.Thread(target=call)
+    follower.start()
+    while not flight.done.waiting:
+        time.sleep(0.01)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert len(errors) == 2
+    assert errors[0] is errors[1]
+
+
+def test_files_across_workers_are_named_after_the_data_version(tmp_path, snapshot):
+    directory = tmp_path / "coalesce"
+    key = coalesce.key_of("view", ("a",))
+
+    assert coalesce._across_workers(key, lambda: {"n": 1}, str(directory)) == {"n": 1}
+    name = hashlib.sha1(json.dumps([3, 1.5, key]).encode()).hexdigest()
+    assert sorted(os.listdir(directory)) == [f"{name}.lock", f"{name}.result"]
+    assert stat.S_IMODE(os.stat(directory).st_mode) == 0o700
+
+    snapshot.built_at = 2.5
+    coalesce._across_workers(key, lambda: {"n": 2}, str(directory))
+    # Another build of the same version does not share the result
+    assert len(os.listdir(directory)) == 4
@@ -0,0 +1,76 @@
+from types import SimpleNamespace
+
+import pytest
+
+from components import crossfilter, query
+
+
+def test_clicks_round_trip_through_validation():
+    cell = crossfilter.heatmap_cell({"points": [{"x": "9", "y": "Wednesday"}]})
+    tile = crossfilter.treemap_tile({"points": [{"label": "Nurse"}]})
+
+    assert cell == {"weekday": [2], "hour": [9]}
+    assert crossfilter.heatmap_selection(cell) == cell
+    assert tile == {"cadre": ["Nurse"]}
+    assert crossfilter.treemap_selection(tile) == tile
+    assert crossfilter.describe(cell) == "Showing visits on Wednesdays, 09:00-09:59"
+    assert crossfilter.describe(tile) == "Showing cadre: Nurse"
+
+
+def test_second_click_on_the_selection_drops_it():
+    cell = {"weekday": [2], "hour": [9]}
+
+    assert crossfilter.toggle(None, cell) == cell
+    assert crossfilter.toggle(cell, {"weekday": [2], "hour": [9]}) is None
+    assert crossfilter.toggle(cell, {"weekday": [3], "hour": [9]}) != cell
+
+
+@pytest.mark.parametrize(
+    "selection",
+    [
+        None,
+        "weekday",
+        {},
+        {"weekday": [2]},
+        {"weekday": [7], "hour": [9]},
+        {"weekday": [2], "hour": [24]},
+        {"weekday": [True], "hour": [9]},
+        {"weekday": ["2"], "hour": [9]},
+        {"weekday": [2, 3], "hour": [9]},
+        {"weekday": 2, "hour": 9},
+        {"weekday": [2], "hour": [9], "gender": ["F"]},
+        {"(SELECT 1) > 0": [True]},
+        {"cadre": ["Nurse"]},
+    ],
+)
+def test_invalid_heatmap_selections_are_dropped(selection):
+    assert crossfilter.heatmap_selection(selection) is None
+
+
+@pytest.mark.parametrize(
+    "selection",
+    [{"cadre": [1]}, {"cadre": ["Nurse", "Doctor"]}, {"rank": ["GL 08"]}],
+)
+def test_invalid_treemap_selections_are_dropped(selection):
+    assert crossfilter.treemap_selection(selection) is None
+    assert crossfilter.describe(selection) == crossfilter.HINT
+
+
+def test_malformed_clicks_select_nothing():
+    assert crossfilter.heatmap_cell({"points": [{"x": "9", "y": "Someday"}]}) is None
+    assert crossfilter.heatmap_cell({"points": []}) is None
+    assert crossfilter.treemap_tile({"points": [{"label": None}]}) is None
+
+
+def test_visit_filters_only_name_known_columns():
+    snapshot = SimpleNamespace(facility_scope=None)
+    where, params = query._visit_where(
+        snapshot, ["A"], "2024-01-01", "2024-01-31", {"weekday": [2]}
+    )
+    assert "weekday IN (?)" in where
+    assert params[-1] == 2
+
+    with pytest.raises(ValueError):
+        query._visit_where(
+            snapshot, None, "2024-01-01", "2024-01-31", {"(SELECT 1) > 0": [True]}
+        )
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from components import datastore
+from components.ingest import ABSENT
+
+
+@pytest.fixture
+def deltas(tmp_path, monkeypatch):
+    """A delta directory, and no snapshot live yet."""
+    monkeypatch.setattr(datastore, "DELTA_DIR", str(tmp_path))
+    monkeypatch.setattr(datastore, "_snapshot", None)
+    return tmp_path
+
+
+def write_timecard(path, *rows):
+    """A timecard delta CSV of (employee, date, seconds) rows."""
+    employees, dates, seconds = zip(*rows)
+    pd.DataFrame(
+        {
+            "employee_id": list(employees),
+            "department": ["GSPHCDA"] * len(rows),
+            "date": [str(date) for date in dates],
+            "gender": ["Female"] * len(rows),
+            "department_code": [15] * len(rows),
+            "clockin_time": [
+                f"{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}" for s in seconds
+            ],
+        }
+    ).to_csv(path, index=False)
+
+
+def cell(clockins, employee, day):
+    row = int((np.datetime64(day) - clockins.first_date) // np.timedelta64(1, "D"))
+    return clockins.seconds[row, list(clockins.employee_ids).index(employee)]
+
+
+def test_refresh_bumps_the_version_only_on_new_data(deltas):
+    assert datastore.refresh()
+    first = datastore.current()
+    assert first.version == 1
+    assert not datastore.refresh()
+    assert datastore.current() is first
+
+    last = first.clockins.first_date + len(first.clockins.seconds) - 1
+    employee = first.clockins.employee_ids[0]
+    write_timecard(deltas / "timecard-1.csv", (employee, last + 1, 30000))
+
+    assert datastore.refresh()
+    second = datastore.current()
+    assert second.version == 2
+    assert second.deltas == first.deltas + (second.deltas[-1],)
+    assert second.deltas[-1][0] == "timecard-1.csv"
+    assert cell(second.clockins, employee, last + 1) == 30000
+    assert not datastore.refresh()
+    # Readers of the first snapshot still see it as it was
+    assert len(first.clockins.seconds) == len(second.clockins.seconds) - 1
+
+
+def test_the_earliest_clock_in_of_a_day_wins_across_deltas(deltas):
+    datastore.refresh()
+    clockins = datastore.current().clockins
+    row, column = np.argwhere(clockins.seconds != ABSENT)[0]
+    day = clockins.first_date + int(row)
+    employee = clockins.employee_ids[column]
+    seconds = int(clockins.seconds[row, column])
+
+    write_timecard(
+        deltas / "timecard-1.csv",
+        (employee, day, seconds + 60),
+        (employee, day, seconds - 60),
+    )
+    datastore.refresh()
+    assert cell(datastore.current().clockins, employee, day) == seconds - 60
+
+    write_timecard(deltas / "timecard-2.csv", (employee, day, seconds - 30))
+    datastore.refresh()
+    assert datastore.current().version == 3
+    assert cell(datastore.current().clockins, employee, day) == seconds - 60
+    # The first snapshot's matrix was not written
+    assert cell(clockins, employee, day) == seconds
@@ -0,0 +1,81 @@
+import base64
+
+import numpy as np
+
+from components import figures
+
+
+def values(array):
+    """A typed array of a filled trace, decoded."""
+    return np.frombuffer(base64.b64decode(array["bdata"]), array["dtype"]).tolist()
+
+
+def test_figure_fills_a_copy_of_the_skeleton():
+    built = figures.skeleton_of("visit-line")
+    figure = figures.figure(
+        "visit-line", {"x": [1, 2], "y": [3, 4]}, title={"text": "Visits"}
+    )
+
+    trace = figure["data"][0]
+    assert trace["y"] == [3, 4]
+    assert trace["type"] == built["data"][0]["type"]
+    # Layout dicts update the skeleton's, one level deep
+    assert figure["layout"]["title"]["text"] == "Visits"
+    assert figure["layout"]["title"]["font"] == built["layout"]["title"]["font"]
+    # The skeleton is shared, not filled in
+    assert built["data"][0]["y"] != [3, 4]
+    assert built["layout"]["title"]["text"] != "Visits"
+    assert figures.skeleton_of("visit-line") is built
+
+
+def test_category_bars_colour_one_trace_per_category():
+    mapped = figures.category_bars(
+        "hr-age-bar", ["20-29", "60+"], [5, 7], figures.HR_AGE_COLORS
+    )
+    cycled = figures.category_bars(
+        "marital-bar", ["a", "b", "c"], [1, 2, 3], ["x", "y"]
+    )
+
+    assert [trace["name"] for trace in mapped["data"]] == ["20-29", "60+"]
+    assert mapped["data"][1]["marker"]["color"] == figures.HR_AGE_COLORS["60+"]
+    assert [trace["marker"]["color"] for trace in cycled["data"]] == ["x", "y", "x"]
+    assert [values(trace["y"]) for trace in cycled["data"]] == [[1], [2], [3]]
+
+
+def operations(patch):
+    return {
+        tuple(operation["location"]): operation["params"]["value"]
+        for operation in patch.to_plotly_json()["operations"]
+    }
+
+
+def test_data_patch_carries_only_what_was_filled_in():
+    figure = figures.figure(
+        "visit-line", {"x": [1, 2], "y": [3, 4]}, {"y": [5]}, title={"text": "T"}
+    )
+    patched = operations(figures.data_patch("visit-line", figure))
+
+    assert patched[("data", 0)] == {"x": [1, 2], "y": [3, 4]}
+    assert patched[("data", 1)] == {"y": [5]}
+    assert list(patched[("layout",)]) == ["title"]
+    # Nothing of the layout changed: no layout update
+    unchanged = figures.figure("visit-line", {"y": [1]})
+    assert ("layout",) not in operations(figures.data_patch("visit-line", unchanged))
+
+
+def test_client_update_patches_only_a_graph_drawing_the_skeleton():
+    drawn = {}
+    one = figures.figure("visit-line", {"y": [1]})
+    two = figures.figure("visit-line", {"y": [1]}, {"y": [2]})
+
+    # First render, then data only
+    assert figures.client_update(drawn, "graph", "visit-line", one) is one
+    assert drawn == {"graph": ["visit-line", 1]}
+    assert operations(figures.client_update(drawn, "graph", "visit-line", one)) == {
+        ("data", 0): {"y": [1]}
+    }
+    # Another number of traces, or a placeholder, is sent whole
+    assert figures.client_update(drawn, "graph", "visit-line", two) is two
+    assert figures.client_update(drawn, "graph", None, one) is one
+    assert drawn["graph"] is None
+    assert figures.client_update(drawn, "graph", "visit-line", one) is one
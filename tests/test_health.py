@@ -0,0 +1,65 @@
+import pytest
+
+from components import datastore, health, warmup
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    """The background loads /readyz starts, recorded instead of run."""
+    loads = []
+    monkeypatch.setattr(health, "_load", lambda: loads.append("load"))
+    monkeypatch.setattr(warmup, "_finished", False)
+    return loads
+
+
+def test_healthz_answers_before_any_data(app, client, monkeypatch):
+    monkeypatch.setattr(datastore, "_snapshot", None)
+    # As on a worker's first request, which has Dash build the page layouts
+    monkeypatch.setitem(app._got_first_request, "pages", False)
+    response = client.get("/healthz")
+
+    assert response.status_code == 200
+    assert response.get_json()["status"] == "alive"
+    assert response.get_json()["version"] is None
+
+
+def test_readyz_is_503_while_loading(client, loads, monkeypatch):
+    monkeypatch.setattr(datastore, "_snapshot", None)
+    response = client.get("/readyz")
+
+    assert response.status_code == 503
+    assert response.get_json()["status"] == "loading"
+    assert loads == ["load"]
+
+
+def test_readyz_is_200_once_warmed_up(client, loads, monkeypatch):
+    datastore.current()
+    assert warmup.enabled()
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert response.get_json()["status"] == "warming up"
+
+    monkeypatch.setattr(warmup, "_finished", True)
+    response = client.get("/readyz")
+    assert response.status_code == 200
+    report = response.get_json()
+    assert report["status"] == "ready"
+    assert report["datasets"]["merged_hr_data"]["state"] == "loaded"
+    assert loads == ["load"]
+
+
+def test_a_failed_warm_up_leaves_the_worker_unready(client, monkeypatch):
+    def failing(app):
+        raise RuntimeError("no data")
+
+    started = []
+    monkeypatch.setattr(warmup, "_finished", False)
+    monkeypatch.setattr(warmup, "_progress", {"state": "idle"})
+    monkeypatch.setattr(warmup, "warm_up", failing)
+    warmup._run()
+    assert warmup.status()["state"] == "failed"
+
+    # A probe finding it unready tries again
+    monkeypatch.setattr(warmup, "start", lambda: started.append("start"))
+    assert client.get("/readyz").status_code == 503
+    assert started == ["start"]
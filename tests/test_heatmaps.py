@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from components import heatmaps
+
+
+@pytest.fixture
+def rows():
+    rng = np.random.default_rng(41)
+    n = 2000
+    return pd.DataFrame(
+        {
+            "weekday": rng.integers(0, 7, n),
+            "hour": rng.integers(0, 24, n),
+            "weight": rng.integers(1, 5, n),
+            "key": rng.integers(0, 30, n),
+            "group": rng.integers(-1, 3, n),
+        }
+    )
+
+
+def oracle(df, value):
+    """The 7 x 24 matrix of a groupby on weekday and hour."""
+    return (
+        value(df.groupby(["weekday", "hour"]))
+        .unstack(fill_value=0)
+        .reindex(index=range(7), columns=range(24), fill_value=0)
+        .to_numpy()
+    )
+
+
+def test_weekday_hour_counts_and_sums_like_a_groupby(rows):
+    counts = heatmaps.weekday_hour(rows["weekday"], rows["hour"])
+    sums = heatmaps.weekday_hour(rows["weekday"], rows["hour"], rows["weight"])
+
+    np.testing.assert_array_equal(counts, oracle(rows, lambda g: g.size()))
+    np.testing.assert_array_equal(sums, oracle(rows, lambda g: g["weight"].sum()))
+
+
+def test_distinct_weekday_hour_counts_each_key_once(rows):
+    distinct = heatmaps.distinct_weekday_hour(
+        rows["weekday"], rows["hour"], rows["key"], 30
+    )
+
+    np.testing.assert_array_equal(distinct, oracle(rows, lambda g: g["key"].nunique()))
+
+
+def test_groups_get_one_matrix_each_and_minus_one_is_left_out(rows):
+    counts = heatmaps.weekday_hour(
+        rows["weekday"], rows["hour"], groups=rows["group"], n_groups=3
+    )
+    distinct = heatmaps.distinct_weekday_hour(
+        rows["weekday"], rows["hour"], rows["key"], 30, rows["group"], 3
+    )
+
+    assert counts.shape == distinct.shape == (3, 7, 24)
+    for group in range(3):
+        df = rows[rows["group"] == group]
+        np.testing.assert_array_equal(counts[group], oracle(df, lambda g: g.size()))
+        np.testing.assert_array_equal(
+            distinct[group], oracle(df, lambda g: g["key"].nunique())
+        )
+    assert counts.sum() == (rows["group"] >= 0).sum()
+
+
+def test_as_frame_keeps_the_busy_hours_and_blanks_empty_cells():
+    matrix = np.zeros((7, 24), dtype=np.int64)
+    matrix[0, 8] = 3
+    matrix[6, 17] = 1
+    frame = heatmaps.as_frame(matrix)
+
+    assert frame.index.tolist() == heatmaps.WEEKDAYS
+    assert frame.columns.tolist() == [8, 17]
+    assert frame.loc["Monday", 8] == 3
+    assert np.isnan(frame.loc["Monday", 17])
@@ -0,0 +1,161 @@
+import numpy as np
+import pandas as pd
+
+from components.ingest import (
+    ABSENT,
+    VISIT_KEYS,
+    count_visits,
+    fold_timecard,
+    read_timecard_chunks,
+    stream_timecard,
+)
+
+
+def chunk(*rows):
+    """A normalized timecard chunk of (employee, day, seconds) rows."""
+    employees, days, seconds = zip(*rows)
+    return pd.DataFrame(
+        {
+            "employee_id": list(employees),
+            "department_code": ["D1"] * len(rows),
+            "day": pd.to_datetime(list(days)),
+            "seconds": np.array(seconds, dtype=np.int32),
+        }
+    )
+
+
+def cell(clockins, employee, day):
+    row = int((np.datetime64(day) - clockins.first_date) // np.timedelta64(1, "D"))
+    return clockins.seconds[row, list(clockins.employee_ids).index(employee)]
+
+
+def test_earliest_clock_in_of_a_day_wins():
+    clockins = fold_timecard(
+        [
+            chunk(("a", "2024-01-02", 30000), ("a", "2024-01-02", 29000)),
+            chunk(("a", "2024-01-02", 31000), ("b", "2024-01-02", 28000)),
+        ]
+    )
+
+    assert cell(clockins, "a", "2024-01-02") == 29000
+    assert cell(clockins, "b", "2024-01-02") == 28000
+
+
+def test_duplicate_rows_fold_once():
+    rows = [("a", "2024-01-02", 30000), ("b", "2024-01-03", 31000)]
+    once = fold_timecard([chunk(*rows)])
+    twice = fold_timecard([chunk(*rows)], fold_timecard([chunk(*rows)]))
+
+    assert list(twice.employee_ids) == ["a", "b"]
+    np.testing.assert_array_equal(twice.seconds, once.seconds)
+
+
+def test_an_earlier_day_shifts_the_rows_down():
+    later = fold_timecard([chunk(("a", "2024-01-05", 30000))])
+    clockins = fold_timecard([chunk(("b", "2024-01-02", 28000))], later)
+
+    assert clockins.first_date == np.datetime64("2024-01-02")
+    assert clockins.seconds.shape == (4, 2)
+    assert cell(clockins, "a", "2024-01-05") == 30000
+    assert cell(clockins, "b", "2024-01-02") == 28000
+    assert (clockins.seconds != ABSENT).sum() == 2
+    # The ClockIns folded into are left as they were
+    assert later.first_date == np.datetime64("2024-01-05")
+    assert later.seconds.tolist() == [[30000]]
+
+
+def test_new_days_and_employees_grow_into_spare_room():
+    base = fold_timecard([chunk(("a", "2024-01-01", 30000))])
+    first = fold_timecard([chunk(("a", "2024-01-02", 30500))], base)
+    second = fold_timecard(
+        [chunk(("a", "2024-01-03", 31000), ("b", "2024-01-03", 29000))], first
+    )
+
+    # Copied into a buffer with room once, then extended in it
+    assert first.buffer is not None
+    assert np.shares_memory(first.seconds, second.seconds)
+    assert first.seconds.tolist() == [[30000], [30500]]
+    assert second.seconds.tolist() == [
+        [30000, ABSENT],
+        [30500, ABSENT],
+        [31000, 29000],
+    ]
+
+
+def test_a_fold_never_writes_what_earlier_clock_ins_see():
+    base = fold_timecard([chunk(("a", "2024-01-01", 30000))])
+    first = fold_timecard([chunk(("a", "2024-01-02", 30500))], base)
+    # A day first already has
+    changed = fold_timecard([chunk(("a", "2024-01-02", 20000))], first)
+    # first's room was taken by changed's fold
+    other = fold_timecard([chunk(("a", "2024-01-03", 40000))], first)
+
+    assert first.seconds.tolist() == [[30000], [30500]]
+    assert changed.seconds.tolist() == [[30000], [20000]]
+    assert other.seconds.tolist() == [[30000], [30500], [40000]]
+    assert not np.shares_memory(changed.seconds, first.seconds)
+    assert not np.shares_memory(other.seconds, first.seconds)
+
+
+def test_chunked_streaming_matches_a_single_pass(tmp_path):
+    path = tmp_path / "timecard.csv"
+    pd.DataFrame(
+        {
+            "employee_id": ["a", "b", "a", "c", "b", "a", None],
+            "department": ["X"] * 7,
+            "date": [
+                "2024-01-02",
+                "2024-01-02",
+                "2024-01-02",
+                "2024-01-04",
+                "not a date",
+                "2024-01-03",
+                "2024-01-03",
+            ],
+            "gender": ["Female"] * 7,
+            "department_code": [15, 15, 15, 3, 15, 15, 15],
+            "clockin_time": [
+                "09:00:00",
+                "08:00:00",
+                "07:30:00",
+                "08:15:00",
+                "08:00:00",
+                "25:00:00",
+                "08:00:00",
+            ],
+        }
+    ).to_csv(path, index=False)
+
+    rows = pd.concat(read_timecard_chunks(path, chunksize=3))
+    # Rows without an employee, a date or a clock-in time are dropped
+    assert rows["employee_id"].tolist() == ["a", "b", "a", "c"]
+    assert rows["seconds"].tolist() == [32400, 28800, 27000, 29700]
+
+    chunked = stream_timecard(path, chunksize=3)
+    whole = stream_timecard(path)
+    assert list(chunked.employee_ids) == list(whole.employee_ids) == ["a", "b", "c"]
+    np.testing.assert_array_equal(chunked.seconds, whole.seconds)
+    assert cell(chunked, "a", "2024-01-02") == 27000
+
+
+def test_count_visits_collapses_partial_counts_to_the_same_totals():
+    visits = pd.DataFrame(
+        {
+            "start_date": pd.to_datetime(["2024-01-01"] * 4 + ["2024-01-02"] * 4),
+            "weekday": [0] * 4 + [1] * 4,
+            "hour": [8, 8, 9, 9] * 2,
+            "facility_name": ["F1", "F2"] * 4,
+            "gender": ["Female"] * 8,
+            "marital_status": [None, "Single"] * 4,
+            "age_group": ["20-29"] * 8,
+        }
+    )
+    chunks = [visits.iloc[i : i + 3] for i in range(0, len(visits), 3)]
+    bounded = count_visits(iter(chunks), limit=1)
+    whole = count_visits([visits])
+
+    pd.testing.assert_frame_equal(bounded, whole)
+    assert bounded["count"].sum() == len(visits)
+    # Missing attributes are counted, not dropped
+    assert bounded["marital_status"].isna().sum() == 4
+    assert count_visits([]).columns.tolist() == VISIT_KEYS + ["count"]
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from components import kpis
+
+
+@pytest.fixture
+def rows():
+    rng = np.random.default_rng(42)
+    n = 500
+    days = pd.Timestamp("2023-11-01") + pd.to_timedelta(rng.integers(0, 120, n), "D")
+    return pd.DataFrame(
+        {
+            "date": days,
+            "facility": rng.choice(["F1", "F2", "F3", "F4"], n),
+            "count": rng.integers(1, 10, n),
+        }
+    )
+
+
+RANGES = [
+    (None, None),
+    ("2023-11-01", "2023-11-01"),
+    ("2023-11-15", "2024-01-10"),
+    ("2023-12-31", None),
+    (None, "2023-12-01"),
+    ("2022-01-01", "2022-12-31"),
+    ("2024-02-01", "2025-01-01"),
+    ("2024-01-10", "2024-01-01"),
+]
+
+
+@pytest.mark.parametrize("start_date, end_date", RANGES)
+@pytest.mark.parametrize("facilities", [None, ["F2"], ["F1", "F3", "F9"]])
+def test_totals_match_direct_sums(rows, start_date, end_date, facilities):
+    sums = kpis.prefix_sums(rows["date"], rows["facility"], rows["count"])
+
+    selected = rows
+    if start_date:
+        selected = selected[selected["date"] >= start_date]
+    if end_date:
+        selected = selected[selected["date"] <= end_date]
+    if facilities:
+        selected = selected[selected["facility"].isin(facilities)]
+    assert sums.total(facilities, start_date, end_date) == selected["count"].sum()
+
+
+@pytest.mark.parametrize("start_date, end_date", RANGES)
+def test_active_days_are_the_days_with_any_count(rows, start_date, end_date):
+    sums = kpis.prefix_sums(rows["date"], rows["facility"], rows["count"])
+
+    days = rows["date"]
+    if start_date:
+        days = days[days >= start_date]
+    if end_date:
+        days = days[days <= end_date]
+    assert sums.active_days(start_date, end_date) == days.nunique()
+
+
+def test_a_year_replaces_the_date_range(rows):
+    sums = kpis.prefix_sums(rows["date"], rows["facility"], rows["count"])
+    in_2024 = rows[rows["date"].dt.year == 2024]
+
+    assert sums.total(year=2024, start_date="2023-11-01") == in_2024["count"].sum()
+    assert sums.active_days(year="2024") == in_2024["date"].nunique()
+    assert sums.total(year=2021) == 0
+
+
+def test_no_rows_total_zero():
+    sums = kpis.prefix_sums([], [], [])
+
+    assert sums.total() == 0
+    assert sums.active_days("2024-01-01", "2024-12-31") == 0
@@ -0,0 +1,100 @@
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from components import partitions
+
+
+@pytest.fixture
+def root(tmp_path):
+    """Timecard partitions of clock-ins in Dec 2023, Jan and Mar 2024."""
+    data_dir = tmp_path / "csv"
+    data_dir.mkdir()
+    pd.DataFrame(
+        {
+            "employee_id": ["a", "b", "a", "b", "a"],
+            "department": ["X"] * 5,
+            "date": [
+                "2023-12-29",
+                "2024-01-02",
+                "2024-01-31",
+                "2024-03-04",
+                "2024-03-05",
+            ],
+            "gender": ["Female"] * 5,
+            "department_code": [15, 15, 15, 3, 3],
+            "clockin_time": ["08:00:00"] * 5,
+        }
+    ).to_csv(data_dir / "cleaned_hrh_timecard_data.csv", index=False)
+    root = tmp_path / "partitions"
+    root.mkdir()
+    partitions.write_dataset(str(root), "timecard", str(data_dir))
+    return str(root)
+
+
+def months(entries):
+    return sorted((entry["year"], entry["month"]) for entry in entries)
+
+
+def test_prune_selects_the_year_and_month(root):
+    catalog = partitions.load_catalog(root, "timecard")
+
+    assert months(partitions.prune(catalog)) == [(2023, 12), (2024, 1), (2024, 3)]
+    assert months(partitions.prune(catalog, year=2024)) == [(2024, 1), (2024, 3)]
+    assert months(partitions.prune(catalog, year="2024", month=3)) == [(2024, 3)]
+    assert partitions.prune(catalog, year=2022) == []
+
+
+def test_prune_selects_the_months_a_date_range_overlaps(root):
+    catalog = partitions.load_catalog(root, "timecard")
+
+    # Pruned on the first and last day a partition holds, not its month's
+    assert months(
+        partitions.prune(catalog, start_date="2024-01-15", end_date="2024-03-04")
+    ) == [(2024, 1), (2024, 3)]
+    assert months(partitions.prune(catalog, start_date="2024-02-01")) == [(2024, 3)]
+    assert months(partitions.prune(catalog, end_date="2023-12-31")) == [(2023, 12)]
+    assert (
+        partitions.prune(catalog, start_date="2024-02-01", end_date="2024-02-29") == []
+    )
+
+
+def test_scan_opens_only_the_matching_partitions(root, monkeypatch):
+    opened = []
+    read_table = pq.read_table
+
+    def recording(path, **kwargs):
+        opened.append(path)
+        return read_table(path, **kwargs)
+
+    monkeypatch.setattr(pq, "read_table", recording)
+    rows = pd.concat(
+        partitions.scan(
+            root, "timecard", start_date="2024-03-01", end_date="2024-03-04"
+        )
+    )
+
+    assert len(opened) == 1
+    assert "year=2024/month=3/" in opened[0]
+    # Rows of the opened partition outside the range are filtered out
+    assert rows["day"].tolist() == [pd.Timestamp("2024-03-04")]
+    assert rows[["year", "month"]].drop_duplicates().values.tolist() == [[2024, 3]]
+
+
+def test_appended_rows_land_in_their_partition(root):
+    delta = pd.DataFrame(
+        {
+            "employee_id": ["c"],
+            "department_code": [3],
+            "day": [pd.Timestamp("2024-03-20")],
+            "seconds": [28800],
+        }
+    )
+    catalog = partitions.append(root, "timecard", [delta], "timecard-1")
+    # Once per name
+    partitions.append(root, "timecard", [delta], "timecard-1")
+
+    march = catalog["partitions"]["year=2024/month=3"]
+    assert march["rows"] == 3
+    assert march["last"] == "2024-03-20"
+    assert len(partitions.read(root, "timecard", year=2024, month=3)) == 3
@@ -0,0 +1,60 @@
+import pandas as pd
+import pytest
+
+from components import periods
+
+
+def days(*dates):
+    return tuple(pd.Timestamp(date) for date in dates)
+
+
+@pytest.mark.parametrize("mode", [None, "none", "sideways"])
+def test_no_prior_range_without_a_comparison(mode):
+    assert periods.ranges("2024-03-01 10:30", "2024-03-10", mode=mode) == (
+        days("2024-03-01", "2024-03-10"),
+        None,
+    )
+
+
+def test_previous_period_is_as_many_days_just_before():
+    current, prior = periods.ranges("2024-03-01", "2024-03-10", mode="period")
+
+    assert current == days("2024-03-01", "2024-03-10")
+    assert prior == days("2024-02-20", "2024-02-29")
+
+
+def test_previous_year_is_the_same_dates_a_year_earlier():
+    current, prior = periods.ranges("2024-02-29", "2024-03-10", mode="year")
+
+    assert current == days("2024-02-29", "2024-03-10")
+    assert prior == days("2023-02-28", "2023-03-10")
+
+
+def test_a_prior_year_never_overlaps_the_selection():
+    _, prior = periods.ranges("2023-06-01", "2024-12-31", mode="year")
+
+    assert prior == days("2022-06-01", "2023-05-31")
+
+
+def test_a_selected_year_replaces_the_dates():
+    current, prior = periods.ranges("2020-01-01", "2020-01-31", 2024, "period")
+
+    assert current == days("2024-01-01", "2024-12-31")
+    assert prior == days("2022-12-31", "2023-12-31")
+
+
+def test_an_open_range_is_not_compared():
+    assert periods.ranges(None, "2024-03-10", mode="period")[1] is None
+
+
+def test_codes_and_aligned_dates():
+    current, prior = periods.ranges("2024-03-01", "2024-03-02", mode="period")
+    dates = ["2024-02-27", "2024-02-28", "2024-02-29", "2024-03-01", "2024-03-03"]
+
+    assert periods.codes(dates, current, prior).tolist() == [-1, 1, 1, 0, -1]
+    assert periods.aligned(["2024-02-28"], current, prior, "period").tolist() == [
+        pd.Timestamp("2024-03-01")
+    ]
+    assert periods.aligned(["2023-03-01"], current, prior, "year").tolist() == [
+        pd.Timestamp("2024-03-01")
+    ]
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from components import punctuality
+from components.ingest import ABSENT
+
+EIGHT = 8 * 3600
+
+
+@pytest.fixture
+def employees():
+    # Days x employees: a is late twice, b once, c never, d never clocks in
+    seconds = np.array(
+        [
+            [EIGHT + 600, EIGHT - 300, EIGHT, ABSENT],
+            [EIGHT + 60, EIGHT + 1200, EIGHT - 60, ABSENT],
+            [ABSENT, EIGHT - 600, ABSENT, ABSENT],
+        ],
+        dtype=np.int32,
+    )
+    return punctuality.employee_punctuality(
+        seconds,
+        np.array(["a", "b", "c", "d"], dtype=object),
+        np.array(["15", "15", "3", "3"]),
+        "08:00",
+        0,
+    )
+
+
+def test_shift_seconds():
+    assert punctuality.shift_seconds("08:30") == 8 * 3600 + 30 * 60
+    assert punctuality.shift_seconds("07:15:30") == 7 * 3600 + 15 * 60 + 30
+    with pytest.raises(ValueError):
+        punctuality.shift_seconds("25:00")
+
+
+def test_employee_punctuality_counts_days_late_days_and_offsets(employees):
+    by_id = employees.set_index("employee_id")
+
+    # d never clocked in and is left out
+    assert list(by_id.index) == ["a", "b", "c"]
+    assert by_id["days_present"].tolist() == [2, 3, 2]
+    # On the dot is not late
+    assert by_id["late_days"].tolist() == [2, 1, 0]
+    assert by_id["offset_seconds"].tolist() == [660, 300, -60]
+
+
+def test_rank_orders_by_late_rate_then_mean_offset(employees):
+    ranked = punctuality.rank(employees)
+
+    assert ranked["employee_id"].tolist() == ["a", "b", "c"]
+    assert ranked["late_rate"].tolist() == pytest.approx([1, 1 / 3, 0])
+    assert ranked["mean_offset_minutes"].iloc[0] == pytest.approx(5.5)
+
+
+def test_rank_filters_and_limits(employees):
+    assert punctuality.rank(employees, min_days=3)["employee_id"].tolist() == ["b"]
+    assert punctuality.rank(employees, top=1)["employee_id"].tolist() == ["a"]
+
+
+def test_rank_groups_by_department_and_facility(employees):
+    departments = punctuality.rank(employees, "department").set_index("department_code")
+    assert departments.loc["15", "employees"] == 2
+    assert departments.loc["15", "late_rate"] == pytest.approx(3 / 5)
+    assert departments.loc["3", "late_rate"] == 0
+
+    roster = pd.DataFrame(
+        {"psn_number": ["a", "b", "b"], "facility_stationed": ["F1", "F2", "F9"]}
+    )
+    facilities = punctuality.rank(
+        employees, "facility", punctuality.facility_of(roster)
+    )
+    # Stationed at the first listed facility; c is off the roster
+    assert facilities["facility"].tolist() == ["F1", "F2", "Unknown"]
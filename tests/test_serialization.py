@@ -0,0 +1,21 @@
+import numpy as np
+import plotly.graph_objects as go
+
+from components.serialization import compact_figure, encode_typed_array
+
+
+def test_string_categories_round_trip_unchanged():
+    # Department codes of the punctuality ranking look like numbers
+    y = np.array(["15", "3", "120"], dtype=object)
+    figure = compact_figure(go.Figure(go.Bar(x=[0.5, 0.25, 0.1], y=y)))
+
+    trace = figure["data"][0]
+    assert list(trace["y"]) == ["15", "3", "120"]
+    assert "type" not in figure["layout"].get("yaxis", {})
+    assert encode_typed_array(y) is None
+
+
+def test_numeric_object_arrays_are_encoded():
+    encoded = encode_typed_array(np.array([1, 2.5, None], dtype=object))
+
+    assert encoded["dtype"] == "f8"
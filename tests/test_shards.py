@@ -0,0 +1,103 @@
+from dataclasses import replace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from components import shards
+from components.datastore import Snapshot
+from components.ingest import ClockIns
+
+
+@pytest.fixture
+def snapshot():
+    """Two states, A (facilities FA1, FA2) and B (FB1), with their facts
+    interleaved as they are read."""
+    return Snapshot(
+        version=1,
+        signature=(),
+        built_at=0.0,
+        states_df=pd.DataFrame({"id": [1, 2], "state_name": ["A", "b"]}),
+        lgas_df=pd.DataFrame({"id": [10, 20], "state_id": [1, 2]}),
+        wards_df=pd.DataFrame({"id": [100, 200], "lga_id": [10, 20]}),
+        facilities_df=pd.DataFrame(
+            {"name": ["FA1", "FB1", "FA2"], "ward_id": [100, 200, 100]}
+        ),
+        visit_counts_df=pd.DataFrame(
+            {"facility_name": ["FA1", "FB1", "FA2", "FB1"], "count": [1, 2, 3, 4]}
+        ),
+        patients_df=pd.DataFrame(
+            {"patient_id": [1, 2, 3], "facility_name": ["FB1", "FA2", "FA1"]}
+        ),
+        merged_hr_data=pd.DataFrame(
+            {
+                "psn_number": ["b1", "a1", "a2"],
+                "facility_stationed": ["FB1", "FA1", "FA2"],
+            }
+        ),
+        clockins=ClockIns(
+            np.datetime64("2024-01-01"),
+            np.array(["b1", "a1", "a2"], dtype=object),
+            np.array(["15", "15", "3"]),
+            np.array([[1, 2, 3], [4, 5, 6]], dtype=np.int32),
+        ),
+    )
+
+
+def ordered(snapshot):
+    frames = vars(snapshot)
+    return replace(snapshot, **shards.order_by_state(frames))
+
+
+def test_order_by_state_groups_the_facts_of_a_state(snapshot):
+    national = ordered(snapshot)
+
+    assert national.visit_counts_df["facility_name"].tolist() == [
+        "FA1",
+        "FA2",
+        "FB1",
+        "FB1",
+    ]
+    # Stable within a state
+    assert national.visit_counts_df["count"].tolist() == [1, 3, 2, 4]
+    assert national.clockins.employee_ids.tolist() == ["a1", "a2", "b1"]
+    assert national.clockins.seconds.tolist() == [[2, 3, 1], [5, 6, 4]]
+    # Nothing left to reorder
+    assert shards.order_by_state(vars(national)) == {}
+
+
+def test_a_shard_holds_only_its_states_facts(snapshot):
+    shard = shards.build_shard(snapshot, "A")
+
+    assert shard.state == "A"
+    assert shard.facility_scope == ("FA1", "FA2")
+    assert shard.visit_counts_df["count"].tolist() == [1, 3]
+    assert shard.patients_df["patient_id"].tolist() == [2, 3]
+    assert shard.merged_hr_data["psn_number"].tolist() == ["a1", "a2"]
+    assert shard.clockins.employee_ids.tolist() == ["a1", "a2"]
+    assert shard.clockins.seconds.tolist() == [[2, 3], [5, 6]]
+    other = shards.build_shard(snapshot, "B")
+    assert other.visit_counts_df["count"].tolist() == [2, 4]
+
+
+def test_shards_of_ordered_facts_are_views(snapshot):
+    national = ordered(snapshot)
+    shard = shards.build_shard(national, "B")
+
+    assert np.shares_memory(
+        shard.visit_counts_df["count"].to_numpy(),
+        national.visit_counts_df["count"].to_numpy(),
+    )
+    assert np.shares_memory(shard.clockins.seconds, national.clockins.seconds)
+    assert shard.clockins.seconds.tolist() == [[1], [4]]
+
+
+def test_shards_are_cut_once_per_snapshot(snapshot, monkeypatch):
+    monkeypatch.setattr(shards, "_shards", (None, {}))
+    shard = shards.shard(snapshot, "A")
+
+    assert shards.shard(snapshot, "A") is shard
+    assert shards.shard(replace(snapshot, version=2), "A") is not shard
+    # Unknown states are served every state, and not cached
+    assert shards.shard(snapshot, "C") is snapshot
+    assert shards.state_of("?state=b%20") == "B"
@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from components import coalesce, warmup
+
+FACILITY = "vs-facility-filter.value"
+
+
+@pytest.fixture
+def visitation(app):
+    return warmup.view_calls(app, {"path": "/visitation"})
+
+
+def test_view_calls_are_the_figure_callbacks_of_a_page(visitation, app):
+    assert visitation
+    assert all(name in coalesce.CALLBACKS for name, _ in visitation)
+    assert all(".register_visitation_page_callbacks." in name for name, _ in visitation)
+
+    narrowed = warmup.view_calls(
+        app, {"path": "/visitation", "search": "?x=1", "values": {FACILITY: ["F1"]}}
+    )
+    # The same calls, with the view's values in the inputs
+    assert [name for name, _ in narrowed] == [name for name, _ in visitation]
+    assert narrowed[0][1][0] == ["F1"]
+    assert all("?x=1" in args for _, args in narrowed)
+
+
+def test_plan_warms_each_call_once_defaults_first(
+    visitation, app, tmp_path, monkeypatch
+):
+    name, args = visitation[0]
+    logged = [name, ["F9" if arg is None else arg for arg in args]]
+    log = tmp_path / "access.log"
+    log.write_text(
+        "\n".join(
+            json.dumps(line)
+            for line in [
+                [name, args],
+                logged,
+                logged,
+                ["components.gone", []],
+                [name, args],
+                [name, args],
+            ]
+        )
+        + "\nnot json\n"
+    )
+    views = tmp_path / "views.json"
+    views.write_text(
+        json.dumps(
+            [
+                {"path": "/visitation"},
+                {"path": "/visitation", "values": {FACILITY: ["F1"]}},
+                {"path": "/nowhere"},
+            ]
+        )
+    )
+    monkeypatch.setattr(coalesce, "ACCESS_LOG", str(log))
+    monkeypatch.setattr(warmup, "WARMUP_VIEWS", str(views))
+
+    defaults = warmup._calls_of(app, warmup.default_views())
+    narrowed = warmup.view_calls(
+        app, {"path": "/visitation", "values": {FACILITY: ["F1"]}}
+    )
+    planned = warmup.plan(app, None)
+
+    keys = [coalesce.key_of(name, args) for name, args in planned]
+    assert len(keys) == len(set(keys))
+    assert planned[: len(defaults)] == defaults
+    # Then the logged calls, most requested first, then the configured views
+    # (the map does not take the facility filter: it is a default call)
+    assert planned[len(defaults) :] == [tuple(logged), *narrowed[:-1]]
+    assert narrowed[-1] in defaults
+    assert warmup.logged_calls(top=1) == [(name, args)]
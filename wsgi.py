@@ -0,0 +1,10 @@
+"""Production WSGI entry point, used by gunicorn.conf.py.
+
+Importing the app loads the pages; preload() then loads and finalizes the
+datasets in the gunicorn master so every forked worker shares them.
+"""
+
+from app import app, server  # noqa: F401
+from components import datastore
+
+datastore.preload()